@@ -6,8 +6,13 @@ import uuid
 import datetime as dt
 from typing import List, Dict, Any, Tuple
 
+from starlette.concurrency import run_in_threadpool
+
 from ..chat.retriever import retrieve
 from ..chat.gemini_client import have_gemini
+from .. import llm
+from ..config import settings
+from ..llm import packing
 from .artifact_loader import load_exercises_from_artifacts
 
 
@@ -78,9 +83,10 @@ def _normalize_items(raw: Any, n: int, fmt: str, difficulty: int) -> List[Dict[s
 
 
 def _build_generate_prompt(topic: str, n: int, difficulty: int, fmt: str, contexts: List[Dict[str, Any]]) -> str:
+    # Retrieved chunks packed into the context token budget, best score per token first
     ctx_lines: List[str] = []
-    for c in contexts:
-        ctx_lines.append(f"- ({c.get('chunk_index')}) {c.get('preview','')}")
+    for c in packing.pack(contexts, settings.llm_context_token_budget):
+        ctx_lines.append(f"- ({c.get('chunk_index')}) {packing.one_line(c['text'])}")
     ctx = "\n".join(ctx_lines) if ctx_lines else "(no context)"
     schema = (
         "Xuất ra JSON THUẦN (không có giải thích), là một mảng các object.\n"
@@ -101,25 +107,8 @@ def _build_generate_prompt(topic: str, n: int, difficulty: int, fmt: str, contex
     )
 
 
-def _call_gemini_json(prompt: str, model_name: str = "gemini-2.5-flash-lite") -> Any:
+def _parse_json_text(text: str) -> Any:
     try:
-        import google.generativeai as genai  # type: ignore
-    except Exception:
-        return None
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        return None
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(model_name)
-    try:
-        # Prefer JSON output if supported
-        resp = model.generate_content(
-            prompt,
-            generation_config={
-                "temperature": 0.3,
-            },
-        )
-        text = getattr(resp, "text", None) or ""
         block = _extract_json_block(text)
         if not block:
             # In case model returned pure JSON without fences
@@ -129,6 +118,29 @@ def _call_gemini_json(prompt: str, model_name: str = "gemini-2.5-flash-lite") ->
         return None
 
 
+def _call_gemini_json(prompt: str, model_name: str = "gemini-2.5-flash-lite", endpoint: str = "ai.generate",
+                      priority: str = "near_realtime") -> Any:
+    try:
+        text = llm.generate_sync(prompt, model=model_name, temperature=0.3, providers=("gemini",), endpoint=endpoint,
+                                 priority=priority)
+    except llm.LLMUnavailable as e:
+        print(f"LLM unavailable for JSON generation: {e}")
+        return None
+    return _parse_json_text(text)
+
+
+async def _call_gemini_json_async(prompt: str, model_name: str = "gemini-2.5-flash-lite", endpoint: str = "ai.generate",
+                                  priority: str = "near_realtime") -> Any:
+    """_call_gemini_json for async routes: waits on the LLM gateway without holding a thread."""
+    try:
+        text = await llm.generate(prompt, model=model_name, temperature=0.3, providers=("gemini",), endpoint=endpoint,
+                                  priority=priority)
+    except llm.LLMUnavailable as e:
+        print(f"LLM unavailable for JSON generation: {e}")
+        return None
+    return _parse_json_text(text)
+
+
 def generate_answer_for_question(question_data: Dict[str, Any]) -> Dict[str, Any] | None:
     """
     AI tự động tạo đáp án cho câu hỏi chưa có answer.
@@ -214,7 +226,7 @@ Lưu ý:
 """
     
     try:
-        result = _call_gemini_json(prompt, model_name="gemini-2.0-flash-exp")
+        result = _call_gemini_json(prompt, model_name="gemini-2.0-flash-exp", endpoint="ai.answer", priority="batch")
         
         # Validate result structure
         if result and isinstance(result, dict):
@@ -228,14 +240,14 @@ Lưu ý:
         return None
 
 
-def generate_exercises(topic: str, n: int, difficulty: int, fmt: str, top_k: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], str]:
-    contexts = retrieve(topic, top_k=top_k)
+async def generate_exercises(topic: str, n: int, difficulty: int, fmt: str, top_k: int, retrieval_mode: str = "lexical") -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], str]:
+    contexts = await run_in_threadpool(retrieve, topic, top_k=top_k, mode=retrieval_mode)
     model_used = "artifacts"
     items: List[Dict[str, Any]] = []
     
     # Priority 1: Try to load from artifacts first (real data!)
     print(f"🔍 Trying to load exercises from artifacts for topic: {topic}")
-    artifact_items = load_exercises_from_artifacts(topic, n, difficulty, fmt)
+    artifact_items = await run_in_threadpool(load_exercises_from_artifacts, topic, n, difficulty, fmt)
     if artifact_items:
         items = artifact_items
         model_used = "artifacts"
@@ -245,7 +257,7 @@ def generate_exercises(topic: str, n: int, difficulty: int, fmt: str, top_k: int
     if not items and have_gemini():
         print(f"🤖 No artifacts found, trying Gemini AI...")
         prompt = _build_generate_prompt(topic, n, difficulty, fmt, contexts)
-        raw = _call_gemini_json(prompt)
+        raw = await _call_gemini_json_async(prompt)
         if raw is not None:
             items = _normalize_items(raw, n, fmt, difficulty)
             model_used = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp")
@@ -254,6 +266,7 @@ def generate_exercises(topic: str, n: int, difficulty: int, fmt: str, top_k: int
     # Priority 3: Fallback deterministic items
     if not items:
         print(f"⚠️ Using fallback placeholder exercises")
+        llm.count_fallback("ai.generate")
         for i in range(n):
             items.append({
                 "question": f"[{topic}] Bài {i+1}: Hãy trình bày/giải một bài ngắn phù hợp độ khó {difficulty}.",
@@ -4,19 +4,14 @@ Generates personalized coaching messages and recommendations.
 """
 from __future__ import annotations
 from typing import List, Dict, Any, Optional
-import os
 
-# Try to import Gemini, fallback gracefully
-try:
-    import google.generativeai as genai
-    HAVE_GEMINI = bool(os.getenv("GOOGLE_API_KEY"))
-    if HAVE_GEMINI:
-        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-except ImportError:
-    HAVE_GEMINI = False
+from .. import llm
+
+# Gemini calls go through the shared LLM gateway; without a key we use the rule-based insights
+HAVE_GEMINI = "gemini" in llm.available()
 
 
-def generate_analysis_insights(
+async def generate_analysis_insights(
     topics: List[Dict[str, Any]],
     student_profile: Optional[Dict[str, Any]] = None
 ) -> Dict[str, Any]:
@@ -35,15 +30,17 @@ def generate_analysis_insights(
     
     if HAVE_GEMINI:
         try:
-            return _generate_with_gemini(topics, student_profile)
+            return await _generate_with_gemini(topics, student_profile)
         except Exception as e:
             print(f"Gemini insight generation failed: {e}")
+            llm.count_fallback("ai.insights")
             return _fallback_insights(topics, student_profile)
     else:
+        llm.count_fallback("ai.insights")
         return _fallback_insights(topics, student_profile)
 
 
-def _generate_with_gemini(
+async def _generate_with_gemini(
     topics: List[Dict[str, Any]],
     student_profile: Optional[Dict[str, Any]]
 ) -> Dict[str, Any]:
@@ -88,9 +85,8 @@ Format as JSON:
 
 Keep tone friendly, encouraging, and specific. Use Vietnamese context when relevant."""
 
-    model = genai.GenerativeModel('gemini-2.0-flash-exp')
-    response = model.generate_content(prompt)
-    text = response.text.strip()
+    text = (await llm.generate(prompt, model="gemini-2.0-flash-exp", providers=("gemini",), endpoint="ai.insights",
+                               priority="near_realtime")).strip()
     
     # Extract JSON from response
     import json
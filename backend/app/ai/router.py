@@ -1,11 +1,17 @@
 from __future__ import annotations
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 import json
 
-from ..dependencies import get_current_student, get_db
-from ..models import Student, PlacementTestResult
+from ..database import get_async_db
+from ..dependencies import get_current_student
+from ..mastery import MASTERY, rebuild_mastery_async
+from ..principals import StudentPrincipal
+from ..models import PlacementTestResult
+from ..ratelimit import Lease, ai_quota
 from .schemas import (
     GenerateExercisesRequest,
     GenerateExercisesResponse,
@@ -23,19 +29,22 @@ router = APIRouter(prefix="/ai", tags=["ai"])
 
 
 @router.post("/generate-exercises", response_model=GenerateExercisesResponse)
-def api_generate_exercises(req: GenerateExercisesRequest, current: Student = Depends(get_current_student)):
+async def api_generate_exercises(req: GenerateExercisesRequest, current: StudentPrincipal = Depends(get_current_student),
+                                 _quota: Lease | None = Depends(ai_quota("generate"))):
     try:
-        items_raw, contexts, model_used = generate_exercises(
+        items_raw, contexts, model_used = await generate_exercises(
             topic=req.topic,
             n=req.n,
             difficulty=req.difficulty,
             fmt=req.format,
             top_k=req.top_k,
+            retrieval_mode=req.retrieval_mode,
         )
         # Convert to schema
         items: List[ExerciseItem] = [ExerciseItem(**it) for it in items_raw]
         # Save to JSON store
-        path, doc = save_exercise_set(
+        path, doc = await run_in_threadpool(
+            save_exercise_set,
             user_id=current.id,
             topic=req.topic,
             difficulty=req.difficulty,
@@ -62,12 +71,12 @@ def api_generate_exercises(req: GenerateExercisesRequest, current: Student = Dep
 
 
 @router.get("/exercises")
-def api_list_sets(current: Student = Depends(get_current_student)):
+def api_list_sets(current: StudentPrincipal = Depends(get_current_student)):
     return list_user_sets(current.id)
 
 
 @router.get("/exercises/{set_id}")
-def api_get_set(set_id: str, current: Student = Depends(get_current_student)):
+def api_get_set(set_id: str, current: StudentPrincipal = Depends(get_current_student)):
     doc = load_user_set(current.id, set_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Not found")
@@ -83,7 +92,7 @@ _placement_tests = {}
 @router.post("/placement-test/generate", response_model=PlacementTest)
 def api_generate_placement_test(
     questions_per_chapter: int = 4,
-    current: Student = Depends(get_current_student)
+    current: StudentPrincipal = Depends(get_current_student)
 ):
     """
     Generate initial placement test for student.
@@ -116,9 +125,9 @@ def api_generate_placement_test(
 
 
 @router.get("/placement-test/status")
-def api_check_placement_test_status(
-    current: Student = Depends(get_current_student),
-    db: Session = Depends(get_db)
+async def api_check_placement_test_status(
+    current: StudentPrincipal = Depends(get_current_student),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Check if student has taken placement test.
@@ -128,10 +137,11 @@ def api_check_placement_test_status(
     """
     from ..models import PlacementTestResult as DBPlacementTestResult
     
-    result = db.query(DBPlacementTestResult)\
-        .filter(DBPlacementTestResult.student_id == current.id)\
-        .order_by(DBPlacementTestResult.taken_at.desc())\
-        .first()
+    result = (await db.execute(
+        select(DBPlacementTestResult)
+        .where(DBPlacementTestResult.student_id == current.id)
+        .order_by(DBPlacementTestResult.taken_at.desc())
+    )).scalars().first()
     
     if not result:
         raise HTTPException(status_code=404, detail="No placement test found")
@@ -146,10 +156,10 @@ def api_check_placement_test_status(
 
 
 @router.post("/placement-test/submit", response_model=PlacementTestResult)
-def api_submit_placement_test(
+async def api_submit_placement_test(
     submission: PlacementTestSubmission,
-    current: Student = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    current: StudentPrincipal = Depends(get_current_student),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Submit placement test answers and get evaluation.
@@ -201,10 +211,10 @@ def api_submit_placement_test(
             chapter_id = chapter_result["chapter_id"]
             
             # Check if diagnostic result already exists for this chapter
-            existing = db.query(DiagnosticResult).filter(
+            existing = (await db.execute(select(DiagnosticResult).where(
                 DiagnosticResult.student_id == current.id,
                 DiagnosticResult.topic_id == chapter_id
-            ).first()
+            ))).scalars().first()
             
             if existing:
                 # Update existing
@@ -227,8 +237,11 @@ def api_submit_placement_test(
                 db.add(diagnostic)
                 print(f"✅ Created diagnostic result for chapter {chapter_id}: {chapter_result['percent']}%")
         
-        db.commit()
-        db.refresh(db_result)
+        # 3. Re-derive the mastery snapshot read by analysis/progress/learning path
+        mastery = await rebuild_mastery_async(db, current.id)
+        await db.commit()
+        MASTERY.put(current.id, mastery)
+        await db.refresh(db_result)
         
         print(f"✅ Saved placement test result for student {current.id}, level: {result['level']}")
         print(f"✅ Saved {len(result.get('chapter_results', []))} diagnostic results")
@@ -243,5 +256,5 @@ def api_submit_placement_test(
         raise
     except Exception as e:
         print(f"Error evaluating placement test: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to evaluate placement test: {str(e)}")
@@ -23,6 +23,7 @@ class GenerateExercisesRequest(BaseModel):
     difficulty: int = Field(3, ge=1, le=5)
     format: Literal["open", "mcq", "mixed"] = "mcq"  # ✅ Default to MCQ for speed
     top_k: int = Field(4, ge=1, le=8, description="How many context chunks to retrieve from artifacts")
+    retrieval_mode: Literal["lexical", "semantic"] = Field("lexical", description="lexical (token overlap) or semantic (TF-IDF/LSA)")
 
 
 class ContextDoc(BaseModel):
@@ -0,0 +1,175 @@
+from __future__ import annotations
+import os
+import sys
+import json
+import mmap
+import struct
+import hashlib
+from array import array
+from typing import Any, Dict, List, Tuple, Sequence
+
+# Persisted retriever index snapshot (single file).
+#
+# Layout:
+#   header  : magic (8s) | format version (I) | sha256(body) (32s) | body length (Q)
+#   body    : meta length (Q) | meta JSON (utf-8) | pad to 4 bytes | doc ids (uint32[]) | term freqs (uint32[])
+#             | positions (uint32[])
+#
+# The meta JSON holds the artifacts root, the source file fingerprint ({relpath: [size,
+# mtime_ns, sha1]}), the doc table (removed docs are null) and a term -> (offset, count,
+# position offset, position count) directory into the postings arrays. Within a term, the
+# posting with term frequency tf owns the next tf entries of the positions array (its token
+# positions in the doc, ascending). On load, the postings arrays are exposed as memoryviews
+# over an mmap of the file, so workers share the pages via the OS page cache instead of each
+# holding a private copy.
+
+SNAPSHOT_MAGIC = b"AICIDX\x00\x00"
+FORMAT_VERSION = 3
+
+_HEADER = struct.Struct("<8sI32sQ")
+_META_LEN = struct.Struct("<Q")
+
+# token -> (doc numbers, term frequencies, concatenated positions)
+Postings = Dict[str, Tuple[Sequence[int], Sequence[int], Sequence[int]]]
+
+
+def _uint32_typecode() -> str:
+    for code in ("I", "L"):
+        if array(code).itemsize == 4:
+            return code
+    raise RuntimeError("No 4-byte unsigned array typecode on this platform")
+
+
+UINT32 = _uint32_typecode()
+
+
+def default_snapshot_path() -> str:
+    # Prefer env RETRIEVER_SNAPSHOT; else backend/artifacts/retriever_index.snap
+    app_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))  # backend/app
+    backend_dir = os.path.abspath(os.path.join(app_dir, os.pardir))               # backend
+    path = os.getenv("RETRIEVER_SNAPSHOT") or os.path.join(backend_dir, "artifacts", "retriever_index.snap")
+    return os.path.abspath(path)
+
+
+def source_stats(root: str) -> Dict[str, List[int]]:
+    """Return {relative chunks.json path: [size, mtime_ns]} for every source file under root.
+    Only stats files, never reads them, so it is cheap enough to run on every startup or scan.
+    """
+    out: Dict[str, List[int]] = {}
+    for dirpath, _, filenames in os.walk(root):
+        for fn in filenames:
+            if fn != "chunks.json":
+                continue
+            path = os.path.join(dirpath, fn)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            out[os.path.relpath(path, root)] = [st.st_size, st.st_mtime_ns]
+    return out
+
+
+def write_snapshot(
+    path: str,
+    root: str,
+    files: Dict[str, List[Any]],
+    docs: List[Dict[str, Any] | None],
+    postings: Postings,
+) -> str:
+    """Serialize an index to ``path`` atomically (write temp file, then rename)."""
+    doc_ids = array(UINT32)
+    tfs = array(UINT32)
+    positions = array(UINT32)
+    terms: Dict[str, List[int]] = {}
+    for tok in sorted(postings):
+        ds, fs, ps = postings[tok]
+        terms[tok] = [len(doc_ids), len(ds), len(positions), len(ps)]
+        doc_ids.extend(ds)
+        tfs.extend(fs)
+        positions.extend(ps)
+
+    meta = {
+        "root": root,
+        "files": files,
+        "docs": docs,
+        "terms": terms,
+        "byteorder": sys.byteorder,
+    }
+    meta_bytes = json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    pad = (-(_HEADER.size + _META_LEN.size + len(meta_bytes))) % 4
+    body = b"".join(
+        [_META_LEN.pack(len(meta_bytes)), meta_bytes, b"\x00" * pad, doc_ids.tobytes(), tfs.tobytes(), positions.tobytes()]
+    )
+    header = _HEADER.pack(SNAPSHOT_MAGIC, FORMAT_VERSION, hashlib.sha256(body).digest(), len(body))
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def read_snapshot(path: str, verify: bool = True) -> Dict[str, Any] | None:
+    """Load a snapshot written by ``write_snapshot``.
+
+    Returns {"root", "files", "docs", "postings", "mapped"} or None when the file is missing,
+    has another format version or fails the checksum.
+    """
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return None
+    with f:
+        try:
+            buf: Any = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            mapped = True
+        except (OSError, ValueError):
+            buf = f.read()
+            mapped = False
+
+    if len(buf) < _HEADER.size:
+        return None
+    magic, version, digest, body_len = _HEADER.unpack_from(buf, 0)
+    if magic != SNAPSHOT_MAGIC or version != FORMAT_VERSION:
+        return None
+    if len(buf) != _HEADER.size + body_len:
+        return None
+    view = memoryview(buf)
+    if verify and hashlib.sha256(view[_HEADER.size:]).digest() != digest:
+        return None
+
+    pos = _HEADER.size
+    (meta_len,) = _META_LEN.unpack_from(buf, pos)
+    pos += _META_LEN.size
+    meta = json.loads(bytes(view[pos:pos + meta_len]).decode("utf-8"))
+    pos += meta_len
+    pos += (-pos) % 4
+
+    terms: Dict[str, List[int]] = meta["terms"]
+    width = sum(t[1] for t in terms.values()) * 4
+    spans = [(pos, pos + width), (pos + width, pos + 2 * width), (pos + 2 * width, len(buf))]
+    if meta.get("byteorder") == sys.byteorder:
+        doc_ids, tfs, positions = (view[a:b].cast(UINT32) for a, b in spans)
+    else:
+        # Foreign byte order: fall back to private, byte-swapped copies
+        doc_ids, tfs, positions = array(UINT32), array(UINT32), array(UINT32)
+        for arr, (a, b) in zip((doc_ids, tfs, positions), spans):
+            arr.frombytes(view[a:b])
+            arr.byteswap()
+        mapped = False
+
+    postings: Postings = {
+        tok: (doc_ids[off:off + n], tfs[off:off + n], positions[p_off:p_off + p_n])
+        for tok, (off, n, p_off, p_n) in terms.items()
+    }
+    return {
+        "root": meta["root"],
+        "files": meta["files"],
+        "docs": meta["docs"],
+        "postings": postings,
+        "mapped": mapped,
+    }
@@ -2,15 +2,62 @@ from __future__ import annotations
 import os
 import json
 import re
+import time
+import heapq
+import bisect
+import hashlib
 import threading
-from typing import List, Dict, Any, Tuple
+from array import array
+from collections import Counter
+from typing import List, Dict, Any, Tuple, Set, Sequence
+
+from . import index_snapshot, semantic
 
 # Simple file-based retriever over artifacts json/**/chunks.json
-# No DB, no vector index: we token-match and score by overlap frequency + phrase bonus.
+# No DB: a positional inverted index (token -> postings of (doc, tf, positions)) scored by
+# overlap frequency + phrase/proximity bonus. The index can be persisted to a snapshot file (scripts/build_retriever_index.py)
+# and loaded at startup so no request pays for the build.
+# Optional "semantic" mode answers from a TF-IDF/LSA model (semantic.py) built lazily per index.
+
+RETRIEVAL_MODES = ("lexical", "semantic")
 
+# Readers never lock: an _Index is never mutated after it is published, and _INDEX is replaced
+# by a single reference assignment (atomic in CPython). _LOCK only serializes writers (builds,
+# snapshot loads, reloads) so two threads don't build the same index twice.
 _LOCK = threading.Lock()
-_INDEX: List[Dict[str, Any]] | None = None
-_INDEX_ROOT: str | None = None
+_DENSE_LOCK = threading.Lock()
+_INDEX: "_Index | None" = None
+_REFRESHER: threading.Thread | None = None
+
+# Compact (full rebuild) once removed-doc tombstones exceed this share of the doc table
+MAX_TOMBSTONE_RATIO = 0.25
+
+# Exact phrase (query tokens at consecutive positions) bonus; otherwise up to NEAR_BONUS for
+# the share of adjacent query-token pairs that occur in order within NEAR_WINDOW tokens
+PHRASE_BONUS = 5.0
+NEAR_BONUS = 2.0
+NEAR_WINDOW = 3
+
+
+class _Index:
+    """Immutable inverted index over chunk documents.
+
+    ``docs`` is the doc table (id/source/file/chunk_index/text/preview/norm), addressed by
+    position; removed docs are None. ``postings`` maps a token to three uint32 sequences: doc
+    numbers, term frequencies, and the docs' token positions concatenated (tf entries per
+    posting, in posting order). ``files`` maps each source chunks.json (relative to root)
+    to [size, mtime_ns, sha1] as of indexing.
+    """
+
+    def __init__(self, root: str, files: Dict[str, List[Any]], docs: List[Dict[str, Any] | None],
+                 postings: index_snapshot.Postings, origin: str):
+        self.root = root
+        self.files = files
+        self.docs = docs
+        self.postings = postings
+        self.origin = origin  # built|snapshot|incremental
+        # Derived, write-once cache (see _dense_model); the index itself is never mutated
+        self.dense: semantic.DenseModel | None = None
 
 
 def _default_artifacts_root() -> str:
@@ -28,30 +75,99 @@ def _tokenize(s: str) -> List[str]:
     return [t for t in toks if t]
 
 
-def _score(query: str, text: str) -> float:
-    if not query or not text:
-        return 0.0
-    q = query.strip().lower()
-    t = text.lower()
-    q_toks = _tokenize(q)
-    if not q_toks:
-        return 0.0
-    score = 0.0
-    # token overlap
-    t_toks = _tokenize(t)
-    if not t_toks:
-        return 0.0
-    tf: Dict[str, int] = {}
-    for tok in t_toks:
-        tf[tok] = tf.get(tok, 0) + 1
-    for tok in q_toks:
-        score += tf.get(tok, 0)
-    # phrase bonus for contiguous substring
-    if q in t:
-        score += 5.0
+def _norm(text: str) -> float:
     # shortness prior: prefer shorter chunks (normalize by sqrt length)
-    norm = max(1.0, (len(t) ** 0.5) / 20.0)
-    return score / norm
+    return max(1.0, (len(text.lower()) ** 0.5) / 20.0)
+
+
+# token -> {doc number: (positions array, offset, tf)}, collected while walking the postings
+_PosRefs = Dict[str, Dict[int, Tuple[Sequence[int], int, int]]]
+
+
+def _positions(refs: _PosRefs, tok: str, d: int) -> Sequence[int] | None:
+    ref = refs.get(tok)
+    ref = ref.get(d) if ref is not None else None
+    if ref is None:
+        return None
+    poss, off, tf = ref
+    return poss[off:off + tf]
+
+
+def _phrase_bonus(toks: List[str], refs: _PosRefs, d: int) -> float:
+    """Phrase/proximity bonus for doc ``d`` (a candidate for a multi-token query).
+
+    Only the position lists of the query tokens in this doc are touched, so the cost does not
+    grow with the corpus.
+    """
+    plists = {tok: _positions(refs, tok, d) for tok in set(toks)}
+    if all(pl is not None for pl in plists.values()):
+        # intersect candidate phrase starts token by token
+        starts = set(plists[toks[0]])
+        for i in range(1, len(toks)):
+            starts.intersection_update([p - i for p in plists[toks[i]]])
+            if not starts:
+                break
+        else:
+            return PHRASE_BONUS
+    near = 0
+    for a, b in zip(toks, toks[1:]):
+        pa, pb = plists[a], plists[b]
+        if pa is None or pb is None:
+            continue
+        for p in pa:
+            j = bisect.bisect_right(pb, p)
+            if j < len(pb) and pb[j] - p <= NEAR_WINDOW:
+                near += 1
+                break
+    return NEAR_BONUS * near / (len(toks) - 1)
+
+
+def _score_many(index: _Index, queries: List[str]) -> List[List[Tuple[float, int]]]:
+    """Score candidate docs for several queries in one pass over the postings.
+
+    Each distinct token's posting list is walked once and credited to every query containing it.
+    Phrase and proximity bonuses come from intersecting the position lists of candidate docs.
+    Returns, per query, (score, doc number) for docs scoring > 0.
+    """
+    qtoks = [_tokenize(q.strip()) if q else [] for q in queries]
+    # token -> [(query number, count in that query)]
+    wanted: Dict[str, List[Tuple[int, int]]] = {}
+    for qi, toks in enumerate(qtoks):
+        for tok, q_count in Counter(toks).items():
+            wanted.setdefault(tok, []).append((qi, q_count))
+    # token overlap, accumulated from postings of the query tokens only
+    accs: List[Dict[int, float]] = [{} for _ in qtoks]
+    refs: _PosRefs = {}
+    for tok, users in wanted.items():
+        post = index.postings.get(tok)
+        if post is None:
+            continue
+        ds, tfs, poss = post
+        tok_refs = refs[tok] = {}
+        off = 0
+        for d, tf in zip(ds, tfs):
+            tok_refs[d] = (poss, off, tf)
+            off += tf
+            for qi, q_count in users:
+                acc = accs[qi]
+                acc[d] = acc.get(d, 0.0) + tf * q_count
+    out: List[List[Tuple[float, int]]] = []
+    for toks, acc in zip(qtoks, accs):
+        scored: List[Tuple[float, int]] = []
+        if len(toks) == 1:
+            # a lone token is its own phrase and every candidate contains it
+            scored = [((s + PHRASE_BONUS) / index.docs[d]["norm"], d) for d, s in acc.items()]
+        else:
+            for d, s in acc.items():
+                s += _phrase_bonus(toks, refs, d)
+                scored.append((s / index.docs[d]["norm"], d))
+        out.append(scored)
+    return out
+
+
+def _score(index: _Index, query: str) -> List[Tuple[float, int]]:
+    """Score candidate docs for a query; returns (score, doc number) for docs scoring > 0."""
+    return _score_many(index, [query])[0]
 
 
 def _iter_chunk_files(root: str):
@@ -61,55 +177,361 @@ def _iter_chunk_files(root: str):
                 yield os.path.join(dirpath, fn)
 
 
-def _load_index(root: str) -> List[Dict[str, Any]]:
-    items: List[Dict[str, Any]] = []
+def _file_digest(path: str) -> str | None:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _read_source(root: str, rel: str) -> Tuple[List[Any], List[Dict[str, Any]]] | None:
+    """Parse one chunks.json. Returns ([size, mtime_ns, sha1], docs) or None if unreadable."""
+    path = os.path.join(root, rel)
+    try:
+        st = os.stat(path)
+        with open(path, "rb") as f:
+            raw = f.read()
+        arr = json.loads(raw.decode("utf-8"))
+    except Exception:
+        return None
+    docs: List[Dict[str, Any]] = []
+    for obj in arr:
+        # expected keys: {chunk_index, text}
+        chunk_index = obj.get("chunk_index")
+        text = obj.get("text", "")
+        if not text:
+            continue
+        docs.append(
+            {
+                "id": f"{path}#c{chunk_index}",
+                "source": path,
+                "file": rel,
+                "chunk_index": chunk_index,
+                "text": text,
+                "preview": text[:280].strip().replace("\n", " ")
+                .replace("  ", " "),
+                "norm": _norm(text),
+            }
+        )
+    return [st.st_size, st.st_mtime_ns, hashlib.sha1(raw).hexdigest()], docs
+
+
+def _add_postings(postings: Dict[str, Tuple[array, array, array]], d: int, text: str) -> None:
+    positions: Dict[str, List[int]] = {}
+    for p, tok in enumerate(_tokenize(text)):
+        positions.setdefault(tok, []).append(p)
+    for tok, ps in positions.items():
+        post = postings.get(tok)
+        if post is None:
+            post = postings[tok] = (array(index_snapshot.UINT32), array(index_snapshot.UINT32), array(index_snapshot.UINT32))
+        post[0].append(d)
+        post[1].append(len(ps))
+        post[2].extend(ps)
+
+
+def _build_index(root: str) -> _Index:
+    files: Dict[str, List[Any]] = {}
+    docs: List[Dict[str, Any] | None] = []
+    postings: Dict[str, Tuple[array, array, array]] = {}
     for path in _iter_chunk_files(root):
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                arr = json.load(f)
-            for obj in arr:
-                # expected keys: {chunk_index, text}
-                chunk_index = obj.get("chunk_index")
-                text = obj.get("text", "")
-                if text:
-                    items.append(
-                        {
-                            "id": f"{path}#c{chunk_index}",
-                            "source": path,
-                            "chunk_index": chunk_index,
-                            "text": text,
-                            "preview": text[:280].strip().replace("\n", " ")
-                            .replace("  ", " "),
-                        }
-                    )
-        except Exception:
+        rel = os.path.relpath(path, root)
+        src = _read_source(root, rel)
+        if src is None:
+            continue
+        files[rel], file_docs = src
+        for doc in file_docs:
+            _add_postings(postings, len(docs), doc["text"])
+            docs.append(doc)
+    return _Index(root, files, docs, postings, origin="built")
+
+
+def _diff_sources(files: Dict[str, List[Any]], root: str) -> Tuple[List[str], List[str], Dict[str, List[Any]]]:
+    """Compare the fingerprint an index was built from with the files on disk.
+
+    Returns (changed, removed, touched): new or modified files, deleted files, and files whose
+    mtime moved but whose content hash is unchanged (only their fingerprint needs updating).
+    Content is only hashed when size/mtime differ.
+    """
+    stats = index_snapshot.source_stats(root)
+    changed: List[str] = []
+    touched: Dict[str, List[Any]] = {}
+    for rel, (size, mtime_ns) in stats.items():
+        old = files.get(rel)
+        if old is not None and old[0] == size and old[1] == mtime_ns:
+            continue
+        if old is not None and old[0] == size:
+            digest = _file_digest(os.path.join(root, rel))
+            if digest == old[2]:
+                touched[rel] = [size, mtime_ns, digest]
+                continue
+        changed.append(rel)
+    removed = [rel for rel in files if rel not in stats]
+    return changed, removed, touched
+
+
+def _apply_changes(index: _Index, changed: List[str], removed: List[str], touched: Dict[str, List[Any]]) -> _Index:
+    """Copy-on-write update: only the postings of terms in dropped/added docs are rebuilt.
+
+    Dropped docs leave a None tombstone in the doc table so other doc numbers stay valid.
+    """
+    docs = list(index.docs)
+    files = dict(index.files)
+    files.update(touched)
+    stale = set(changed) | set(removed)
+    drop: Set[int] = set()
+    dirty: Set[str] = set()
+    if stale:
+        for d, doc in enumerate(docs):
+            if doc is not None and doc["file"] in stale:
+                drop.add(d)
+                dirty.update(_tokenize(doc["text"]))
+                docs[d] = None
+    for rel in stale:
+        files.pop(rel, None)
+
+    added: Dict[str, Tuple[array, array, array]] = {}
+    for rel in changed:
+        src = _read_source(index.root, rel)
+        if src is None:
             continue
-    return items
+        files[rel], file_docs = src
+        for doc in file_docs:
+            _add_postings(added, len(docs), doc["text"])
+            docs.append(doc)
 
+    postings = dict(index.postings)
+    for tok in dirty | set(added):
+        old_ds, old_tfs, old_poss = postings.get(tok, ((), (), ()))
+        ds, tfs, poss = array(index_snapshot.UINT32), array(index_snapshot.UINT32), array(index_snapshot.UINT32)
+        off = 0
+        for d, tf in zip(old_ds, old_tfs):
+            if d not in drop:
+                ds.append(d)
+                tfs.append(tf)
+                poss.extend(old_poss[off:off + tf])
+            off += tf
+        if tok in added:
+            for part, new in zip((ds, tfs, poss), added[tok]):
+                part.extend(new)
+        if ds:
+            postings[tok] = (ds, tfs, poss)
+        else:
+            postings.pop(tok, None)
+    return _Index(index.root, files, docs, postings, origin="incremental")
 
-def ensure_index(root: str | None = None) -> None:
-    global _INDEX, _INDEX_ROOT
+
+def _resolve_root(root: str | None) -> str:
+    return os.path.abspath(root or _default_artifacts_root())
+
+
+def ensure_index(root: str | None = None) -> _Index:
+    """Return the published index for ``root``, building it only on a cold start.
+
+    The warm path is a plain reference read: no lock is taken once an index is published.
+    """
+    global _INDEX
+    r = _resolve_root(root)
+    index = _INDEX
+    if index is not None and index.root == r:
+        return index
+    with _LOCK:
+        index = _INDEX
+        if index is None or index.root != r:
+            index = _build_index(r)
+            _INDEX = index
+        return index
+
+
+def _publish(index: _Index, previous: _Index | None) -> None:
+    global _INDEX
+    # Carry the semantic model over by rebuilding it before the swap, so readers of the new
+    # index never wait on a cold dense build.
+    if previous is not None and previous.dense is not None:
+        _dense_model(index)
+    _INDEX = index
+
+
+def _write_snapshot(index: _Index, path: str | None = None) -> None:
+    path = path or index_snapshot.default_snapshot_path()
+    try:
+        index_snapshot.write_snapshot(path, index.root, index.files, index.docs, index.postings)
+    except OSError as e:
+        print(f"Retriever snapshot not written ({path}): {e}")
+
+
+def reload_index(root: str | None = None, background: bool = True) -> threading.Thread | None:
+    """Rebuild the index from source and atomically swap it in.
+
+    With ``background`` the build runs in a daemon thread and readers keep using the current
+    index until the swap; returns the thread (join it to wait). Otherwise builds inline.
+    """
+    r = _resolve_root(root)
+
+    def _run():
+        with _LOCK:
+            _publish(_build_index(r), _INDEX)
+
+    if not background:
+        _run()
+        return None
+    t = threading.Thread(target=_run, name="retriever-reload", daemon=True)
+    t.start()
+    return t
+
+
+def _refresh_locked(index: _Index, persist: bool, snapshot_path: str | None = None) -> Dict[str, Any]:
+    changed, removed, touched = _diff_sources(index.files, index.root)
+    result: Dict[str, Any] = {"changed": len(changed), "removed": len(removed), "touched": len(touched), "full_rebuild": False}
+    if not (changed or removed or touched):
+        if index is not _INDEX:
+            _publish(index, _INDEX)
+        return result
+    new = _apply_changes(index, changed, removed, touched)
+    tombstones = sum(1 for doc in new.docs if doc is None)
+    if tombstones > MAX_TOMBSTONE_RATIO * len(new.docs):
+        # Too many dead doc slots: compact with a full rebuild
+        new = _build_index(index.root)
+        result["full_rebuild"] = True
+    _publish(new, _INDEX)
+    if persist:
+        _write_snapshot(new, snapshot_path)
+    return result
+
+
+def refresh_index(root: str | None = None, persist: bool = True) -> Dict[str, Any]:
+    """Pick up new, changed or removed chunks.json files without a full rebuild.
+
+    Only the affected documents' postings are replaced (see _apply_changes); the result is
+    swapped in atomically and, with ``persist``, written back to the snapshot file.
+    Returns counts of changed/removed/touched files.
+    """
+    r = _resolve_root(root)
     with _LOCK:
-        r = root or _default_artifacts_root()
-        r = os.path.abspath(r)
-        if _INDEX is not None and _INDEX_ROOT == r:
-            return
-        _INDEX = _load_index(r)
-        _INDEX_ROOT = r
+        index = _INDEX
+        if index is None or index.root != r:
+            index = _build_index(r)
+            _publish(index, _INDEX)
+            if persist:
+                _write_snapshot(index)
+            return {"changed": len(index.files), "removed": 0, "touched": 0, "full_rebuild": True}
+        return _refresh_locked(index, persist)
 
 
-def retrieve(query: str, top_k: int = 4, root: str | None = None) -> List[Dict[str, Any]]:
-    ensure_index(root)
-    if not _INDEX:
+def start_auto_refresh(interval: float | None = None) -> threading.Thread | None:
+    """Run refresh_index() periodically in a daemon thread.
+
+    Interval defaults to env RETRIEVER_REFRESH_SECONDS; 0 (the default) disables the scanner.
+    """
+    global _REFRESHER
+    if interval is None:
+        interval = float(os.getenv("RETRIEVER_REFRESH_SECONDS", "0") or 0)
+    if interval <= 0 or _REFRESHER is not None:
+        return _REFRESHER
+
+    def _loop():
+        while True:
+            time.sleep(interval)
+            try:
+                result = refresh_index()
+                if result["changed"] or result["removed"]:
+                    print(f"Retriever index refreshed: {result}")
+            except Exception as e:
+                print(f"Retriever refresh failed: {e}")
+
+    _REFRESHER = threading.Thread(target=_loop, name="retriever-refresh", daemon=True)
+    _REFRESHER.start()
+    return _REFRESHER
+
+
+def save_snapshot(path: str | None = None, root: str | None = None) -> str:
+    """Build the index from source files and persist it as a snapshot file."""
+    index = _build_index(_resolve_root(root))
+    return index_snapshot.write_snapshot(
+        path or index_snapshot.default_snapshot_path(), index.root, index.files, index.docs, index.postings
+    )
+
+
+def load_snapshot(path: str | None = None, root: str | None = None, rebuild_if_stale: bool = True) -> bool:
+    """Install the persisted index snapshot (called at startup).
+
+    A snapshot for the same root is installed and then brought up to date incrementally if
+    source files changed since it was written. When the snapshot is missing or corrupt and
+    ``rebuild_if_stale`` is set, the index is rebuilt from source and the snapshot rewritten.
+    Returns True when an index is installed.
+    """
+    path = path or index_snapshot.default_snapshot_path()
+    r = _resolve_root(root)
+    with _LOCK:
+        snap = index_snapshot.read_snapshot(path)
+        if snap is not None and snap["root"] == r:
+            index = _Index(r, snap["files"], snap["docs"], snap["postings"], origin="snapshot")
+            if not rebuild_if_stale:
+                _publish(index, _INDEX)
+                return True
+            _refresh_locked(index, persist=True, snapshot_path=path)
+            return True
+        if not rebuild_if_stale:
+            return False
+        index = _build_index(r)
+        _write_snapshot(index, path)
+        _publish(index, _INDEX)
+        return True
+
+
+def _dense_model(index: _Index) -> semantic.DenseModel | None:
+    if index.dense is None and semantic.HAVE_NUMPY:
+        with _DENSE_LOCK:
+            if index.dense is None:
+                index.dense = semantic.build(
+                    [(d, _tokenize(doc["text"])) for d, doc in enumerate(index.docs) if doc is not None]
+                )
+    return index.dense
+
+
+def _hits(index: _Index, best: List[Tuple[float, int]]) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    for score, d in best:
+        doc = index.docs[d]
+        hit = {k: doc[k] for k in ("id", "source", "chunk_index", "text", "preview")}
+        hit["score"] = float(score)  # used to rank contexts when packing prompts
+        out.append(hit)
+    return out
+
+
+def retrieve_many(queries: List[str], top_k: int = 4, root: str | None = None, mode: str = "lexical") -> List[List[Dict[str, Any]]]:
+    """Retrieve contexts for several queries at once (same order as ``queries``).
+
+    Lexical mode tokenizes every query up front and walks each posting list once; semantic mode
+    scores all queries with a single matrix-matrix product.
+    """
+    index = ensure_index(root)
+    if not queries:
         return []
-    scored: List[Tuple[float, Dict[str, Any]]] = []
-    for item in _INDEX:
-        s = _score(query, item.get("text", ""))
-        if s > 0:
-            scored.append((s, item))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [it for _, it in scored[:top_k]]
+    if not index.postings:
+        return [[] for _ in queries]
+    model = _dense_model(index) if mode == "semantic" else None
+    if model is not None:
+        bests = model.search_many([_tokenize(q or "") for q in queries], top_k)
+    else:
+        # Highest score first; ties keep corpus order
+        bests = [heapq.nsmallest(top_k, scored, key=lambda x: (-x[0], x[1])) for scored in _score_many(index, queries)]
+    return [_hits(index, best) for best in bests]
+
+
+def retrieve(query: str, top_k: int = 4, root: str | None = None, mode: str = "lexical") -> List[Dict[str, Any]]:
+    return retrieve_many([query], top_k=top_k, root=root, mode=mode)[0]
 
 
 def index_stats() -> Dict[str, Any]:
-    return {"root": _INDEX_ROOT, "chunks": 0 if _INDEX is None else len(_INDEX)}
+    index = _INDEX
+    if index is None:
+        return {"root": None, "chunks": 0}
+    return {
+        "root": index.root,
+        "chunks": sum(1 for doc in index.docs if doc is not None),
+        "files": len(index.files),
+        "terms": len(index.postings),
+        "origin": index.origin,
+        "semantic": semantic.stats(index.dense),
+    }
@@ -1,12 +1,17 @@
 from __future__ import annotations
-from typing import List
+from typing import Any, Dict, List, Tuple
 from fastapi import APIRouter, Depends
+from starlette.concurrency import run_in_threadpool
 
-from ..dependencies import get_current_student
-from ..models import Student
+from ..dependencies import get_current_student, get_current_admin
+from ..principals import StudentPrincipal
+from ..models import Admin
+from ..ratelimit import Lease, ai_quota, release_after
 from .schemas import ChatExplainRequest, ChatExplainResponse, ContextDoc
 from . import retriever
-from .gemini_client import have_gemini, call_gemini_explain
+from .gemini_client import call_gemini_explain, stream_gemini_explain
+from .. import llm
+from ..llm import sse
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
@@ -16,22 +21,31 @@ def index_stats():
     return retriever.index_stats()
 
 
-@router.post("/explain", response_model=ChatExplainResponse)
-def chat_explain(req: ChatExplainRequest, current: Student = Depends(get_current_student)):
-    # 1) Retrieve top-K chunks from artifacts
-    items = retriever.retrieve(req.problem, top_k=req.top_k)
+@router.post("/index/refresh")
+def refresh_index(full: bool = False, _admin: Admin = Depends(get_current_admin)):
+    """Pick up re-ingested chunks.json files (admin only).
+    Incremental by default; full=true rebuilds the whole index. Both swap in atomically.
+    """
+    if full:
+        retriever.reload_index(background=False)
+        return {"full_rebuild": True, **retriever.index_stats()}
+    return {**retriever.refresh_index(), **retriever.index_stats()}
+
+
+async def _contexts(req: ChatExplainRequest) -> Tuple[List[Dict[str, Any]], List[ContextDoc]]:
+    # Retrieve top-K chunks from artifacts (CPU-bound: keep it off the event loop)
+    items = await run_in_threadpool(retriever.retrieve, req.problem, top_k=req.top_k, mode=req.retrieval_mode)
     ctxs: List[ContextDoc] = [
         ContextDoc(id=it["id"], source=it["source"], chunk_index=it["chunk_index"], preview=it["preview"]) for it in items
     ]
+    return items, ctxs
 
-    # 2) If Gemini key present, call it. Else fallback to simple stitched response.
-    if have_gemini():
-        text = call_gemini_explain(req.problem, items)
-        return ChatExplainResponse(text=text, contexts=ctxs)
 
-    # Fallback: deterministic stitched answer with context previews
+def _fallback_text(ctxs: List[ContextDoc]) -> str:
+    # Deterministic stitched answer with context previews
+    note = "Gemini tạm thời không khả dụng" if llm.available() else "Không có GOOGLE_API_KEY"
     lines = [
-        "[Mô phỏng Gemini] Không có GOOGLE_API_KEY. Dưới đây là vài đoạn liên quan và gợi ý cách giải:",
+        f"[Mô phỏng Gemini] {note}. Dưới đây là vài đoạn liên quan và gợi ý cách giải:",
         "\nTóm tắt ngữ cảnh:",
     ]
     for c in ctxs:
@@ -45,4 +59,37 @@ def chat_explain(req: ChatExplainRequest, current: Student = Depends(get_current
             "4) Viết kết luận rõ ràng và kiểm tra điều kiện.",
         ]
     )
-    return ChatExplainResponse(text="\n".join(lines), contexts=ctxs)
+    return "\n".join(lines)
+
+
+@router.post("/explain", response_model=ChatExplainResponse)
+async def chat_explain(req: ChatExplainRequest, current: StudentPrincipal = Depends(get_current_student),
+                       _quota: Lease | None = Depends(ai_quota("explain"))):
+    # 1) Retrieve top-K chunks from artifacts
+    items, ctxs = await _contexts(req)
+
+    # 2) Ask the LLM gateway. If no provider is configured or it is degraded, fall back to a stitched response.
+    try:
+        text = await call_gemini_explain(req.problem, items)
+        return ChatExplainResponse(text=text, contexts=ctxs)
+    except llm.LLMUnavailable as e:
+        if llm.available():
+            print(f"Chat explain fell back: {e}")
+    llm.count_fallback("chat.explain")
+    return ChatExplainResponse(text=_fallback_text(ctxs), contexts=ctxs)
+
+
+@router.post("/explain/stream")
+async def chat_explain_stream(req: ChatExplainRequest, current: StudentPrincipal = Depends(get_current_student),
+                              quota: Lease | None = Depends(ai_quota("explain"))):
+    """Server-sent events variant of /explain.
+    The retrieved contexts are the first event ("contexts"), then "token" events as the model writes, then "done".
+    """
+    items, ctxs = await _contexts(req)
+
+    async def events():
+        yield sse.event("contexts", [c.model_dump() for c in ctxs])
+        async for ev in sse.token_events(stream_gemini_explain(req.problem, items), lambda: _fallback_text(ctxs), "chat.explain_stream"):
+            yield ev
+
+    return sse.response(release_after(events(), quota))
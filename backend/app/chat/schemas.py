@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from pydantic import BaseModel, Field
 
 
@@ -13,6 +13,7 @@ class ContextDoc(BaseModel):
 class ChatExplainRequest(BaseModel):
     problem: str = Field(..., description="User's math problem (Vietnamese)")
     top_k: int = Field(4, ge=1, le=8)
+    retrieval_mode: Literal["lexical", "semantic"] = Field("lexical", description="lexical (token overlap) or semantic (TF-IDF/LSA)")
 
 
 class ChatExplainResponse(BaseModel):
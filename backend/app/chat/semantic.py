@@ -0,0 +1,180 @@
+from __future__ import annotations
+import math
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+# Dense retrieval mode: TF-IDF over chunks reduced with truncated SVD (LSA).
+# Offline and CPU-only. A query is answered with one normalized matrix-vector product
+# over the reduced doc matrix plus argpartition for top-k.
+#
+# Features are diacritic-folded tokens plus character trigrams of those tokens, so that
+# spelling variants ("định lý" / "định lí", "cos" / "côsin") land close to each other
+# before the SVD groups co-occurring terms.
+
+try:
+    import numpy as np  # type: ignore
+    HAVE_NUMPY = True
+except ImportError:  # semantic mode is optional; retriever falls back to lexical
+    np = None  # type: ignore
+    HAVE_NUMPY = False
+
+TRIGRAM_WEIGHT = 0.5
+DEFAULT_RANK = 128
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip Vietnamese diacritics (đ -> d)."""
+    text = text.lower().replace("đ", "d")
+    return "".join(ch for ch in unicodedata.normalize("NFD", text) if not unicodedata.combining(ch))
+
+
+def features(tokens: List[str]) -> Dict[str, float]:
+    feats: Dict[str, float] = {}
+    for tok, n in Counter(fold(t) for t in tokens).items():
+        feats[tok] = feats.get(tok, 0.0) + n
+        padded = f"#{tok}#"
+        if len(padded) > 4:
+            for i in range(len(padded) - 2):
+                g = "~" + padded[i:i + 3]
+                feats[g] = feats.get(g, 0.0) + n * TRIGRAM_WEIGHT
+    return feats
+
+
+class DenseModel:
+    """Reduced LSA space for one retriever index.
+
+    ``doc_vectors`` (docs x k) has L2-normalized rows; ``term_vectors`` (features x k) projects a
+    TF-IDF query vector into the same space; ``doc_numbers`` maps matrix rows back to index docs.
+    """
+
+    def __init__(self, vocab: Dict[str, int], idf, term_vectors, doc_vectors, doc_numbers: List[int]):
+        self.vocab = vocab
+        self.idf = idf
+        self.term_vectors = term_vectors
+        self.doc_vectors = doc_vectors
+        self.doc_numbers = doc_numbers
+
+    def query_vector(self, tokens: List[str]):
+        """Project a tokenized query; returns a normalized k-vector or None if nothing matches."""
+        cols: List[int] = []
+        weights: List[float] = []
+        for f, tf in features(tokens).items():
+            c = self.vocab.get(f)
+            if c is not None:
+                cols.append(c)
+                weights.append((1.0 + math.log(tf)) * float(self.idf[c]))
+        if not cols:
+            return None
+        w = np.asarray(weights, dtype=np.float32)
+        w /= np.linalg.norm(w)
+        v = w @ self.term_vectors[cols]
+        n = float(np.linalg.norm(v))
+        return v / n if n > 0 else None
+
+    def search(self, tokens: List[str], top_k: int) -> List[Tuple[float, int]]:
+        return self.search_many([tokens], top_k)[0]
+
+    def search_many(self, token_lists: List[List[str]], top_k: int) -> List[List[Tuple[float, int]]]:
+        """Score all queries with one (queries x k) @ (k x docs) product."""
+        vecs = [self.query_vector(tokens) for tokens in token_lists]
+        live = [i for i, v in enumerate(vecs) if v is not None]
+        out: List[List[Tuple[float, int]]] = [[] for _ in token_lists]
+        if not live or not self.doc_numbers:
+            return out
+        sims = np.stack([vecs[i] for i in live]) @ self.doc_vectors.T
+        for row, i in enumerate(live):
+            out[i] = self.top_k(sims[row], top_k)
+        return out
+
+    def top_k(self, sims, top_k: int) -> List[Tuple[float, int]]:
+        k = min(top_k, sims.shape[0])
+        part = np.argpartition(-sims, k - 1)[:k]
+        part = part[np.lexsort((part, -sims[part]))]
+        return [(float(sims[i]), self.doc_numbers[i]) for i in part if sims[i] > 0]
+
+
+def _csr_matmul(indptr, indices, data, m, n_rows: int, block_nnz: int = 1 << 16):
+    """(sparse CSR n_rows x V) @ (dense V x c) -> dense n_rows x c, in row blocks of ~block_nnz."""
+    out = np.zeros((n_rows, m.shape[1]), dtype=np.float32)
+    start = 0
+    while start < n_rows:
+        # extend the block until it holds ~block_nnz stored values (at least one row)
+        stop = int(np.searchsorted(indptr, indptr[start] + block_nnz, side="right")) - 1
+        stop = min(max(stop, start + 1), n_rows)
+        lo, hi = int(indptr[start]), int(indptr[stop])
+        if hi > lo:
+            ptr = indptr[start:stop + 1] - lo
+            nonempty = np.flatnonzero(np.diff(ptr))
+            prod = data[lo:hi, None] * m[indices[lo:hi]]
+            out[start + nonempty] = np.add.reduceat(prod, ptr[nonempty], axis=0)
+        start = stop
+    return out
+
+
+def build(docs: List[Tuple[int, List[str]]], rank: int = DEFAULT_RANK, seed: int = 0) -> DenseModel | None:
+    """Build a DenseModel from (doc number, tokens) pairs. Returns None without numpy or docs."""
+    if not HAVE_NUMPY or not docs:
+        return None
+
+    vocab: Dict[str, int] = {}
+    indptr = [0]
+    indices: List[int] = []
+    raw: List[float] = []
+    for _, tokens in docs:
+        for f, tf in features(tokens).items():
+            c = vocab.setdefault(f, len(vocab))
+            indices.append(c)
+            raw.append(1.0 + math.log(tf))  # sublinear tf
+        indptr.append(len(indices))
+    n_docs, n_feats = len(docs), len(vocab)
+    if not n_feats:
+        return None
+
+    indptr_a = np.asarray(indptr, dtype=np.int64)
+    indices_a = np.asarray(indices, dtype=np.int64)
+    df = np.bincount(indices_a, minlength=n_feats)
+    idf = (np.log((1.0 + n_docs) / (1.0 + df)) + 1.0).astype(np.float32)
+    data = np.asarray(raw, dtype=np.float32) * idf[indices_a]
+    # L2-normalize rows
+    rows = np.repeat(np.arange(n_docs), np.diff(indptr_a))
+    row_norms = np.sqrt(np.bincount(rows, weights=data.astype(np.float64) ** 2, minlength=n_docs))
+    data /= np.maximum(row_norms[rows], 1e-12).astype(np.float32)
+
+    # Transposed copy (CSC of X) for X^T @ M products
+    order = np.argsort(indices_a, kind="stable")
+    t_indptr = np.concatenate(([0], np.cumsum(df))).astype(np.int64)
+    t_indices, t_data = rows[order], data[order]
+
+    def x_mul(m):
+        return _csr_matmul(indptr_a, indices_a, data, m, n_docs)
+
+    def xt_mul(m):
+        return _csr_matmul(t_indptr, t_indices, t_data, m, n_feats)
+
+    # Randomized truncated SVD (Halko et al.) with two power iterations
+    k = max(1, min(rank, n_docs - 1, n_feats - 1)) if min(n_docs, n_feats) > 1 else 1
+    width = min(k + 10, n_docs, n_feats)
+    rng = np.random.default_rng(seed)
+    q, _ = np.linalg.qr(x_mul(rng.standard_normal((n_feats, width)).astype(np.float32)))
+    for _ in range(2):
+        z, _ = np.linalg.qr(xt_mul(q))
+        q, _ = np.linalg.qr(x_mul(z))
+    b = xt_mul(q).T  # width x features
+    _, s, vt = np.linalg.svd(b, full_matrices=False)
+    term_vectors = np.ascontiguousarray(vt[:k].T, dtype=np.float32)  # features x k
+
+    doc_vectors = x_mul(term_vectors)
+    doc_vectors /= np.maximum(np.linalg.norm(doc_vectors, axis=1, keepdims=True), 1e-12)
+    return DenseModel(vocab, idf, term_vectors, doc_vectors, [d for d, _ in docs])
+
+
+def stats(model: DenseModel | None) -> Dict[str, Any]:
+    if model is None:
+        return {"available": HAVE_NUMPY, "built": False}
+    return {
+        "available": True,
+        "built": True,
+        "features": len(model.vocab),
+        "rank": int(model.term_vectors.shape[1]),
+    }
@@ -1,7 +1,16 @@
 from __future__ import annotations
+import random
+import sqlite3
+import time
+from typing import Dict
+
 from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from .config import settings
+from . import metrics
 
 # Engine setup supports SQLite (dev) and SQL Server via pyodbc when DATABASE_URL is provided.
 connect_args = {}
@@ -15,6 +24,91 @@ engine = create_engine(
     future=True,
 )
 
+# SQLite profile: WAL lets readers run alongside the single writer, synchronous=NORMAL fsyncs at
+# checkpoints instead of every commit (safe under WAL; a power cut can lose the last commits but
+# not corrupt the file), busy_timeout makes a writer wait for the lock instead of failing at once.
+# A statement still refused with "database is locked" (busy_timeout exhausted) is retried with
+# jittered exponential backoff only when it opened its transaction: the implicit BEGIN is rolled
+# back and the retry starts over with a fresh snapshot. Inside a transaction that already ran
+# statements nothing is retried: under WAL the busy error can come from a stale read snapshot,
+# which waiting never fixes, so the error goes straight to the caller (rollback, then redo the
+# unit of work).
+LOCK_RETRY_BASE_SECONDS = 0.05
+
+DB_LOCK_RETRIES = metrics.Counter("db_lock_retries_total", "SQLite statements retried after 'database is locked'")
+
+
+def sqlite_pragmas() -> Dict[str, str]:
+    """The configured profile, pragma -> value; unset values are left out."""
+    pragmas = {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        "cache_size": settings.sqlite_cache_size,
+        "mmap_size": settings.sqlite_mmap_size,
+        "temp_store": settings.sqlite_temp_store,
+    }
+    return {k: str(v).strip() for k, v in pragmas.items() if str(v).strip()}
+
+
+def _is_locked(exc: BaseException) -> bool:
+    msg = str(exc).lower()
+    return isinstance(exc, sqlite3.OperationalError) and ("database is locked" in msg or "database is busy" in msg)
+
+
+def _with_lock_retries(cursor, run, retries: int) -> None:
+    connection = cursor.connection
+    if connection.in_transaction:
+        run()
+        return
+    for attempt in range(retries + 1):
+        try:
+            run()
+            return
+        except sqlite3.OperationalError as e:
+            if attempt == retries or not _is_locked(e):
+                raise
+            if connection.in_transaction:
+                connection.rollback()  # only the implicit BEGIN of the failed statement
+            DB_LOCK_RETRIES.inc()
+            time.sleep(LOCK_RETRY_BASE_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+def install_sqlite_profile(target: Engine, pragmas: Dict[str, str], lock_retries: int = 0) -> None:
+    """Apply ``pragmas`` to every new connection of ``target`` and retry locked statements that
+    start a transaction (see above)."""
+
+    @event.listens_for(target, "connect")
+    def set_pragmas(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    if lock_retries <= 0:
+        return
+
+    @event.listens_for(target, "do_execute")
+    def execute(cursor, statement, parameters, _context):
+        _with_lock_retries(cursor, lambda: cursor.execute(statement, parameters), lock_retries)
+        return True
+
+    @event.listens_for(target, "do_executemany")
+    def executemany(cursor, statement, parameters, _context):
+        _with_lock_retries(cursor, lambda: cursor.executemany(statement, parameters), lock_retries)
+        return True
+
+    @event.listens_for(target, "do_execute_no_params")
+    def execute_no_params(cursor, statement, _context):
+        _with_lock_retries(cursor, lambda: cursor.execute(statement), lock_retries)
+        return True
+
+
+if settings.database_url.startswith("sqlite"):
+    install_sqlite_profile(engine, sqlite_pragmas(), settings.db_lock_retries)
+
 # Optional fast_executemany optimization for pyodbc on SQL Server
 if settings.database_url.lower().startswith("mssql+pyodbc"):
     try:
@@ -29,7 +123,34 @@ if settings.database_url.lower().startswith("mssql+pyodbc"):
         # Safe fallback if event registration fails
         pass
 
+
+def _read_pragmas() -> Dict[str, str]:
+    # journal_mode is the writer's business; query_only turns a stray write into an error
+    pragmas = {k: v for k, v in sqlite_pragmas().items() if k != "journal_mode"}
+    pragmas["query_only"] = "ON"
+    return pragmas
+
+
+def _read_engine() -> Engine:
+    """Engine for get_read_db: the replica, a query-only pool on the primary SQLite file, or ``engine``."""
+    url = settings.read_database_url
+    if not url:
+        if not (settings.sqlite_read_pool and settings.database_url.startswith("sqlite")):
+            return engine
+        if engine.url.database in (None, "", ":memory:"):
+            return engine  # a second pool would open a different, empty database
+        url = settings.database_url
+    if not url.startswith("sqlite"):
+        return create_engine(url, pool_pre_ping=True, future=True)
+    read_engine = create_engine(url, connect_args={"check_same_thread": False}, pool_pre_ping=True, future=True)
+    install_sqlite_profile(read_engine, _read_pragmas(), settings.db_lock_retries)
+    return read_engine
+
+
+read_engine = _read_engine()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine, future=True)
 
 Base = declarative_base()
 
@@ -40,3 +161,103 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """Session for read-only routes. May lag the primary when READ_DATABASE_URL is a replica."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Async engines for the async routers (get_async_db / get_async_read_db), built at startup by
+# init_async_engines (scripts build them on first use) from the sync URLs with an async driver
+# swapped in (aiosqlite for dev SQLite, aioodbc for SQL Server) or from ASYNC_DATABASE_URL.
+# Same SQLite profile, but locked statements are left to busy_timeout (it waits on the driver's
+# thread): a sleeping retry would stall the event loop.
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "mssql": "mssql+aioodbc",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+# pip package of each async driver; only aiosqlite is in requirements.txt
+ASYNC_DRIVER_PACKAGES = {
+    "aiosqlite": "aiosqlite",
+    "aioodbc": "aioodbc",
+    "asyncpg": "asyncpg",
+    "aiomysql": "aiomysql",
+}
+
+_async_sessions: Dict[str, async_sessionmaker] = {}
+
+
+def async_url(url: URL | str) -> URL:
+    """``url`` with the async driver of its backend."""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver known for {url.get_backend_name()}; set ASYNC_DATABASE_URL")
+    return url.set(drivername=driver)
+
+
+def _async_engine(url: URL, pragmas: Dict[str, str]) -> AsyncEngine:
+    kwargs = {"pool_pre_ping": True}
+    if not (url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")):
+        # (in-memory SQLite keeps the dialect's single-connection pool.) Explicit class: aiosqlite
+        # defaults to NullPool, i.e. a new connection and thread per session
+        kwargs.update(poolclass=AsyncAdaptedQueuePool, pool_size=settings.async_db_pool_size,
+                      max_overflow=settings.async_db_max_overflow)
+    try:
+        async_engine = create_async_engine(url, **kwargs)
+    except ImportError as e:
+        package = ASYNC_DRIVER_PACKAGES.get(url.get_driver_name(), url.get_driver_name())
+        raise RuntimeError(
+            f"The async routers need the '{package}' package for {url.drivername} "
+            f"(pip install {package}), or set ASYNC_DATABASE_URL to a driver that is installed"
+        ) from e
+    if url.get_backend_name() == "sqlite":
+        install_sqlite_profile(async_engine.sync_engine, pragmas)
+    return async_engine
+
+
+def _async_session(kind: str) -> async_sessionmaker:
+    maker = _async_sessions.get(kind)
+    if maker is None:
+        if kind == "read" and read_engine is not engine:
+            async_engine = _async_engine(async_url(read_engine.url), _read_pragmas())
+        elif kind == "read":
+            async_engine = _async_session("write").kw["bind"]
+        else:
+            url = make_url(settings.async_database_url) if settings.async_database_url else async_url(engine.url)
+            async_engine = _async_engine(url, sqlite_pragmas())
+        # expire_on_commit=False: attributes stay readable after commit without an implicit
+        # (and in async, impossible) lazy load
+        maker = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+        _async_sessions[kind] = maker
+    return maker
+
+
+def init_async_engines() -> None:
+    """Build both async engines now, so a missing driver fails startup instead of a request."""
+    _async_session("write")
+    _async_session("read")
+
+
+async def get_async_db():
+    async with _async_session("write")() as db:
+        yield db
+
+
+async def get_async_read_db():
+    """AsyncSession for read-only routes; same engine choice as get_read_db."""
+    async with _async_session("read")() as db:
+        yield db
+
+
+async def dispose_async_engines() -> None:
+    for maker in _async_sessions.values():
+        await maker.kw["bind"].dispose()
+    _async_sessions.clear()
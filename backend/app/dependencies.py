@@ -3,34 +3,73 @@ from typing import Optional
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from .database import get_db
+from .config import settings
+from .database import get_async_db, get_db
 from .models import Student, Admin
-from .security import decode_access_token
+from .principals import PRINCIPALS, StudentPrincipal
+from .security import decode_access_claims, token_subject
 
 
 # Single OAuth2 scheme - both student and admin use same Authorization header
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def get_current_student(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-) -> Student:
-    """Get current authenticated student"""
-    result = decode_access_token(token)
-    if not result:
+def _claims(token: str) -> dict:
+    claims = decode_access_claims(token)
+    if not claims:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    
-    email, user_type = result
-    if user_type != "student":
+    return claims
+
+
+def _check_version(claims: dict, token_version: Optional[int]) -> None:
+    """Tokens are valid until the user's token_version moves past theirs. Tokens issued before
+    versions existed carry none and count as version 0, so the first logout-all revokes them too."""
+    if claims.get("ver", 0) != (token_version or 0):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token revoked")
+
+
+def _subject(claims: dict) -> tuple[Optional[int], Optional[str]]:
+    user_id, email = token_subject(claims)
+    if user_id is None and not settings.accept_email_tokens:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    return user_id, email
+
+
+async def get_current_student(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+) -> StudentPrincipal:
+    """Get current authenticated student (a cached snapshot; see app/principals.py).
+
+    Async so that a cache hit costs no threadpool hop; a miss is one query on the async engine.
+    """
+    principal = PRINCIPALS.get(token)
+    if principal is not None:
+        return principal
+
+    claims = _claims(token)
+    if claims.get("user_type", "student") != "student":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Student access required")
     
-    student: Optional[Student] = db.query(Student).filter(Student.email == email).first()
-    if not student:
+    student_id, email = _subject(claims)
+    if student_id is not None:
+        # Same version as a snapshot this process already holds: no query needed
+        principal = PRINCIPALS.for_student(student_id)
+        if principal is None or principal.token_version != claims.get("ver"):
+            student: Optional[Student] = await db.get(Student, student_id)
+            principal = StudentPrincipal.from_student(student) if student else None
+    else:
+        student = (await db.execute(select(Student).where(Student.email == email))).scalars().first()
+        principal = StudentPrincipal.from_student(student) if student else None
+    if principal is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Student not found")
-    return student
+    _check_version(claims, principal.token_version)
+    PRINCIPALS.put(token, principal, claims.get("exp"))
+    return principal
 
 
 def get_current_admin(
@@ -38,15 +77,16 @@ def get_current_admin(
     db: Session = Depends(get_db),
 ) -> Admin:
     """Get current authenticated admin"""
-    result = decode_access_token(token)
-    if not result:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    
-    email, user_type = result
-    if user_type != "admin":
+    claims = _claims(token)
+    if claims.get("user_type", "student") != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     
-    admin: Optional[Admin] = db.query(Admin).filter(Admin.email == email).first()
+    admin_id, email = _subject(claims)
+    if admin_id is not None:
+        admin: Optional[Admin] = db.get(Admin, admin_id)
+    else:
+        admin = db.query(Admin).filter(Admin.email == email).first()
     if not admin:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Admin not found")
+    _check_version(claims, admin.token_version)
     return admin
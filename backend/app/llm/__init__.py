@@ -0,0 +1 @@
+from .gateway import LLMUnavailable, available, count_fallback, generate, generate_sync, stream, shutdown  # re-export for call sites
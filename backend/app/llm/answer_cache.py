@@ -0,0 +1,201 @@
+from __future__ import annotations
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Set, Tuple
+
+from ..config import settings
+from .. import metrics
+
+# Near-duplicate answer cache for explain requests.
+#
+# Problems are normalized (Unicode NFKC, superscripts -> ^n, math symbol variants, case and
+# whitespace), then described by a MinHash signature over character shingles. An LSH index
+# (bands of signature rows) finds candidate entries in O(bands); a candidate is a hit when its
+# estimated Jaccard similarity reaches the threshold AND its "math skeleton" (the sequence of
+# digits and operators) is identical: rewording or re-spacing a problem reuses the answer,
+# changing a number or a sign does not.
+#
+# Memory is bounded by max_entries (LRU eviction); entries also expire after ttl seconds.
+
+SHINGLE = 4
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows: candidates from ~0.5 similarity, hits decided by the threshold
+_ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 61) - 1
+
+_SUPERSCRIPTS = str.maketrans({
+    "⁰": "^0", "¹": "^1", "²": "^2", "³": "^3", "⁴": "^4", "⁵": "^5", "⁶": "^6", "⁷": "^7", "⁸": "^8", "⁹": "^9",
+    "⁺": "^+", "⁻": "^-", "ⁿ": "^n",
+})
+_SYMBOLS = [
+    ("×", "*"), ("·", "*"), ("∙", "*"), ("÷", "/"), ("−", "-"), ("–", "-"), ("—", "-"),
+    ("≤", "<="), ("≥", ">="), ("≠", "!="), ("√", "sqrt"), ("π", "pi"), ("∞", "inf"),
+    ("**", "^"),
+]
+_OPS = r"+\-*/^=<>!(),;:|\[\]{}"
+_SPACE_AROUND_OPS = re.compile(rf"\s*([{_OPS}])\s*")
+_SKELETON = re.compile(r"[0-9+\-*/^=<>!]|sqrt|pi|inf")
+
+
+def normalize(problem: str) -> str:
+    """Canonical text for a problem: ``x²  +  2x = 0`` and ``X^2+2x=0`` normalize alike."""
+    s = (problem or "").translate(_SUPERSCRIPTS)
+    s = unicodedata.normalize("NFKC", s).lower()
+    for a, b in _SYMBOLS:
+        s = s.replace(a, b)
+    s = re.sub(r"\s+", " ", s).strip()
+    return _SPACE_AROUND_OPS.sub(r"\1", s)
+
+
+def skeleton(normalized: str) -> str:
+    """Digits and operators in order; must match exactly for a near-duplicate hit."""
+    return "".join(_SKELETON.findall(normalized))
+
+
+def _hash64(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+# Universal hash family ((a*h + b) mod p) standing in for NUM_PERM random permutations
+_PERMS: List[Tuple[int, int]] = [
+    (_hash64(f"a{i}") % (_PRIME - 1) + 1, _hash64(f"b{i}") % _PRIME) for i in range(NUM_PERM)
+]
+
+
+def signature(normalized: str) -> Tuple[int, ...]:
+    """MinHash signature over character shingles of a normalized problem."""
+    text = normalized if len(normalized) >= SHINGLE else normalized.ljust(SHINGLE)
+    hashes = {_hash64(text[i:i + SHINGLE]) for i in range(len(text) - SHINGLE + 1)}
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS)
+
+
+def similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def _bands(sig: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+    return [(i, sig[i * _ROWS:(i + 1) * _ROWS]) for i in range(BANDS)]
+
+
+class _Entry:
+    __slots__ = ("answer", "skeleton", "signature", "expires_at")
+
+    def __init__(self, answer: str, skel: str, sig: Tuple[int, ...], expires_at: float):
+        self.answer = answer
+        self.skeleton = skel
+        self.signature = sig
+        self.expires_at = expires_at
+
+
+class AnswerCache:
+    """Bounded (LRU + TTL) cache of answers keyed by near-duplicate problem text."""
+
+    def __init__(self, max_entries: int = 2000, ttl: float = 86400.0, threshold: float = 0.9):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()  # normalized text -> entry, LRU order
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band in _bands(entry.signature):
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+    def get(self, problem: str) -> str | None:
+        norm = normalize(problem)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(norm)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(norm)
+                self.hits += 1
+                return entry.answer
+            if entry is not None:
+                self._drop(norm)
+        # MinHash outside the lock; it is the only non-trivial work
+        sig, skel = signature(norm), skeleton(norm)
+        with self._lock:
+            best: Tuple[float, str] | None = None
+            for band in _bands(sig):
+                for key in self._buckets.get(band, ()):
+                    cand = self._entries.get(key)
+                    if cand is None or cand.skeleton != skel:
+                        continue
+                    sim = similarity(sig, cand.signature)
+                    if sim >= self.threshold and (best is None or sim > best[0]):
+                        best = (sim, key)
+            if best is not None:
+                cand = self._entries[best[1]]
+                if cand.expires_at > now:
+                    self._entries.move_to_end(best[1])
+                    self.hits += 1
+                    self.near_hits += 1
+                    return cand.answer
+                self._drop(best[1])
+            self.misses += 1
+            return None
+
+    def put(self, problem: str, answer: str) -> None:
+        norm = normalize(problem)
+        entry = _Entry(answer, skeleton(norm), signature(norm), time.monotonic() + self.ttl)
+        with self._lock:
+            self._drop(norm)
+            self._entries[norm] = entry
+            for band in _bands(entry.signature):
+                self._buckets.setdefault(band, set()).add(norm)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+            }
+
+
+# Shared cache for /assistant/explain answers (streaming and non-streaming)
+EXPLAIN_CACHE = AnswerCache(
+    max_entries=settings.answer_cache_max_entries,
+    ttl=settings.answer_cache_ttl_seconds,
+    threshold=settings.answer_cache_threshold,
+)
+
+
+def _cache_counts() -> Dict[Tuple[str, ...], float]:
+    st = EXPLAIN_CACHE.stats()
+    return {
+        ("explain", "hit"): st["hits"] - st["near_hits"],
+        ("explain", "near_hit"): st["near_hits"],
+        ("explain", "miss"): st["misses"],
+    }
+
+
+metrics.Collector("llm_answer_cache_requests_total", "Answer cache lookups by result", "counter", ("cache", "result"), _cache_counts)
+metrics.Collector(
+    "llm_answer_cache_entries", "Answers currently cached", "gauge", ("cache",),
+    lambda: {("explain",): float(EXPLAIN_CACHE.stats()["entries"])},
+)
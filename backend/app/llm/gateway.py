@@ -0,0 +1,675 @@
+from __future__ import annotations
+import os
+import re
+import json
+import time
+import hashlib
+import unicodedata
+import random
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Sequence
+
+from ..config import settings
+from .. import metrics
+from .scheduler import SCHEDULER, Preempted
+
+# Single entry point for every LLM call (assistant, chat, exercise generator, insights).
+#
+# Provider clients are created once and kept for the life of the process: Gemini is configured
+# once and its GenerativeModel objects are cached per (model, system prompt); OpenAI uses one
+# AsyncOpenAI client over a bounded httpx connection pool. Both live on a dedicated event-loop
+# thread so async handlers (generate) and sync code paths (generate_sync) share the same pools.
+#
+# Each call has an overall deadline, retries transient errors (timeouts, 429, 5xx) with jittered
+# exponential backoff, and goes through a per-provider circuit breaker. stream() forwards text
+# chunks as they arrive; it only retries before the first chunk. When no provider can
+# answer, LLMUnavailable is raised and callers use their rule-based fallback.
+#
+# Identical concurrent requests are coalesced (single-flight): the first caller starts the
+# upstream call, later callers with the same normalized prompt/system/model/parameters await the
+# same task (or, for streams, replay the chunks so far and follow the rest). The upstream call is
+# cancelled only when every waiter has gone.
+#
+# Every upstream attempt is admitted by the shared scheduler (app/llm/scheduler.py), which
+# puts interactive requests ahead of near-realtime and batch work.
+#
+# With LLM_FAKE_URL set, both providers talk to a local fake server (scripts/fake_llm_server.py)
+# instead of the real APIs. With LLM_RECORD_PATH set, every completed answer is appended to a
+# JSONL file that the fake server can replay.
+
+DEFAULT_GEMINI_MODEL = "gemini-2.0-flash-exp"
+DEFAULT_OPENAI_MODEL = "gpt-4o-mini"
+
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 4.0
+
+
+class LLMUnavailable(Exception):
+    """No provider answered: none configured, circuit open, deadline hit or retries exhausted."""
+
+
+class _StreamBroken(Exception):
+    """A stream failed after emitting text; it cannot be retried transparently."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker.
+
+    closed -> open after ``failures`` transient failures in a row; while open, calls fail fast.
+    After ``reset_after`` seconds one probe call is let through (half-open): success closes the
+    breaker, failure re-opens it.
+    """
+
+    def __init__(self, failures: int, reset_after: float):
+        self.threshold = max(1, failures)
+        self.reset_after = reset_after
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probe_at: float | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.reset_after:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at < self.reset_after:
+                return False
+            # half-open: a single probe at a time (a probe abandoned mid-call expires)
+            if self._probe_at is not None and now - self._probe_at < self.reset_after:
+                return False
+            self._probe_at = now
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_at = None
+            if self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+
+_BLOCKING_POOL: ThreadPoolExecutor | None = None
+
+
+async def _blocking(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking SDK call in a pool sized like the HTTP pool (the default executor is smaller)."""
+    global _BLOCKING_POOL
+    if _BLOCKING_POOL is None:
+        _BLOCKING_POOL = ThreadPoolExecutor(max_workers=settings.llm_max_connections, thread_name_prefix="llm-blocking")
+    return await asyncio.get_running_loop().run_in_executor(_BLOCKING_POOL, functools.partial(fn, *args, **kwargs))
+
+
+async def _iterate_in_thread(items: Any) -> AsyncIterator[Any]:
+    """Async view of a blocking iterator; each next() runs in a worker thread."""
+    it = iter(items)
+    done = object()
+    while (item := await _blocking(next, it, done)) is not done:
+        yield item
+
+
+class _Gemini:
+    name = "gemini"
+
+    def __init__(self):
+        self._genai: Any = None
+        self._models: Dict[tuple, Any] = {}
+
+    def configured(self) -> bool:
+        return bool(settings.llm_fake_url or os.getenv("GOOGLE_API_KEY"))
+
+    def _model(self, model: str, system: str | None):
+        if self._genai is None:
+            import google.generativeai as genai  # type: ignore
+            if settings.llm_fake_url:
+                # The fake server speaks REST only (the SDK's default transport is gRPC)
+                genai.configure(api_key=os.getenv("GOOGLE_API_KEY") or "fake", transport="rest",
+                                client_options={"api_endpoint": settings.llm_fake_url})
+            else:
+                genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+            self._genai = genai
+        key = (model, system)
+        m = self._models.get(key)
+        if m is None:
+            m = self._models[key] = self._genai.GenerativeModel(model, system_instruction=system)
+        return m
+
+    def model_label(self, model: str | None) -> str:
+        return model or DEFAULT_GEMINI_MODEL
+
+    @staticmethod
+    def _usage(resp: Any, usage: Dict[str, int]) -> None:
+        meta = getattr(resp, "usage_metadata", None)
+        if meta is not None:
+            usage["prompt"] = getattr(meta, "prompt_token_count", 0) or 0
+            usage["output"] = getattr(meta, "candidates_token_count", 0) or 0
+
+    async def complete(self, prompt: str, system: str | None, model: str | None, temperature: float | None,
+                       timeout: float, usage: Dict[str, int]) -> str:
+        m = self._model(self.model_label(model), system)
+        config = {"temperature": temperature} if temperature is not None else None
+        if settings.llm_fake_url:
+            # The SDK's async methods do not support the REST transport; use the sync client in a thread
+            resp = await _blocking(m.generate_content, prompt, generation_config=config, request_options={"timeout": timeout})
+        else:
+            resp = await m.generate_content_async(prompt, generation_config=config, request_options={"timeout": timeout})
+        self._usage(resp, usage)
+        return getattr(resp, "text", None) or ""
+
+    async def stream(self, prompt: str, system: str | None, model: str | None, temperature: float | None,
+                     timeout: float, usage: Dict[str, int]) -> AsyncIterator[str]:
+        m = self._model(self.model_label(model), system)
+        config = {"temperature": temperature} if temperature is not None else None
+        if settings.llm_fake_url:
+            resp = _iterate_in_thread(await _blocking(
+                m.generate_content, prompt, generation_config=config, stream=True, request_options={"timeout": timeout}
+            ))
+        else:
+            resp = await m.generate_content_async(prompt, generation_config=config, stream=True, request_options={"timeout": timeout})
+        async for chunk in resp:
+            self._usage(chunk, usage)  # running totals; the last chunk has the final counts
+            try:
+                text = chunk.text
+            except ValueError:  # chunk without text parts (e.g. final finish-reason chunk)
+                continue
+            if text:
+                yield text
+
+    def retryable(self, exc: BaseException) -> bool:
+        try:
+            from google.api_core import exceptions as gexc  # type: ignore
+        except ImportError:
+            return False
+        return isinstance(exc, (gexc.TooManyRequests, gexc.ServerError, gexc.DeadlineExceeded))
+
+    async def aclose(self) -> None:
+        self._models.clear()
+
+
+class _OpenAI:
+    name = "openai"
+
+    def __init__(self):
+        self._client: Any = None
+
+    def configured(self) -> bool:
+        return bool(settings.llm_fake_url or os.getenv("OPENAI_API_KEY"))
+
+    def _get(self):
+        if self._client is None:
+            import httpx
+            from openai import AsyncOpenAI  # type: ignore
+            limits = httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_connections,
+            )
+            fake: Dict[str, Any] = {}
+            if settings.llm_fake_url:
+                fake = {"base_url": settings.llm_fake_url.rstrip("/") + "/v1", "api_key": os.getenv("OPENAI_API_KEY") or "fake"}
+            # Retries are handled by the gateway, not the SDK
+            self._client = AsyncOpenAI(
+                **fake,
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=limits, timeout=settings.llm_timeout_seconds),
+            )
+        return self._client
+
+    def _create(self, prompt: str, system: str | None, temperature: float | None, timeout: float, **kwargs: Any):
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": prompt})
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        return self._get().chat.completions.create(
+            model=self.model_label(None),
+            messages=messages,
+            timeout=timeout,
+            **kwargs,
+        )
+
+    def model_label(self, model: str | None) -> str:
+        return os.getenv("OPENAI_MODEL", DEFAULT_OPENAI_MODEL)
+
+    @staticmethod
+    def _usage(resp: Any, usage: Dict[str, int]) -> None:
+        u = getattr(resp, "usage", None)
+        if u is not None:
+            usage["prompt"] = getattr(u, "prompt_tokens", 0) or 0
+            usage["output"] = getattr(u, "completion_tokens", 0) or 0
+
+    async def complete(self, prompt: str, system: str | None, model: str | None, temperature: float | None,
+                       timeout: float, usage: Dict[str, int]) -> str:
+        chat = await self._create(prompt, system, temperature, timeout)
+        self._usage(chat, usage)
+        return chat.choices[0].message.content or ""
+
+    async def stream(self, prompt: str, system: str | None, model: str | None, temperature: float | None,
+                     timeout: float, usage: Dict[str, int]) -> AsyncIterator[str]:
+        # include_usage: a final event without choices carries the token counts
+        events = await self._create(prompt, system, temperature, timeout, stream=True, stream_options={"include_usage": True})
+        try:
+            async for ev in events:
+                self._usage(ev, usage)
+                text = ev.choices[0].delta.content if ev.choices else None
+                if text:
+                    yield text
+        finally:
+            await events.close()
+
+    def retryable(self, exc: BaseException) -> bool:
+        try:
+            import openai  # type: ignore
+        except ImportError:
+            return False
+        if isinstance(exc, (openai.APIConnectionError, openai.RateLimitError)):
+            return True
+        return isinstance(exc, openai.APIStatusError) and exc.status_code >= 500
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+# Preference order: Gemini first, then OpenAI (as the call sites did before)
+_PROVIDERS: Dict[str, Any] = {p.name: p for p in (_Gemini(), _OpenAI())}
+_BREAKERS: Dict[str, CircuitBreaker] = {
+    name: CircuitBreaker(settings.llm_breaker_failures, settings.llm_breaker_reset_seconds) for name in _PROVIDERS
+}
+
+_LOCK = threading.Lock()
+_LOOP: asyncio.AbstractEventLoop | None = None
+_THREAD: threading.Thread | None = None
+
+
+def _gateway_loop() -> asyncio.AbstractEventLoop:
+    """Start (once) and return the event loop that owns the provider clients."""
+    global _LOOP, _THREAD
+    loop = _LOOP
+    if loop is not None:
+        return loop
+    with _LOCK:
+        if _LOOP is None:
+            loop = asyncio.new_event_loop()
+            _THREAD = threading.Thread(target=loop.run_forever, name="llm-gateway", daemon=True)
+            _THREAD.start()
+            _LOOP = loop
+        return _LOOP
+
+
+class _Flight:
+    """One in-flight upstream call shared by every concurrent identical request."""
+
+    def __init__(self, task: "asyncio.Task | None" = None):
+        self.task = task
+        self.waiters = 0
+
+
+class _StreamFlight(_Flight):
+    """In-flight stream: chunks so far are replayed to late joiners, then fanned out live."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks: List[str] = []
+        self.subscribers: List[Callable[[str], None]] = []
+
+    def publish(self, text: str) -> None:
+        self.chunks.append(text)
+        for emit in list(self.subscribers):
+            emit(text)
+
+
+# Owned by the gateway loop thread; never touched from other threads
+_INFLIGHT: Dict[str, _Flight] = {}
+_FLIGHT_STATS = {"upstream": 0, "coalesced": 0}
+
+
+class _Request:
+    """Parameters of one generate/stream call. ``endpoint`` only labels metrics."""
+
+    def __init__(self, prompt: str, system: str | None, model: str | None, temperature: float | None,
+                 providers: Sequence[str] | None, timeout: float | None, endpoint: str, priority: str):
+        self.prompt = prompt
+        self.system = system
+        self.model = model
+        self.temperature = temperature
+        self.providers = providers
+        self.timeout = timeout
+        self.endpoint = endpoint
+        self.priority = priority
+
+    def flight_key(self, kind: str) -> str:
+        # Whitespace and Unicode-form differences don't change the request
+        norm = re.sub(r"\s+", " ", unicodedata.normalize("NFKC", self.prompt)).strip()
+        raw = json.dumps([kind, norm, self.system, self.model, self.temperature, list(self.providers or ()), self.priority],
+                         ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _join(key: str, start: Callable[[], _Flight]) -> _Flight:
+    flight = _INFLIGHT.get(key)
+    if flight is None:
+        flight = _INFLIGHT[key] = start()
+        _FLIGHT_STATS["upstream"] += 1
+
+        def _forget(_task, flight=flight):
+            if _INFLIGHT.get(key) is flight:
+                del _INFLIGHT[key]
+
+        flight.task.add_done_callback(_forget)
+    else:
+        _FLIGHT_STATS["coalesced"] += 1
+    flight.waiters += 1
+    return flight
+
+
+def _leave(flight: _Flight) -> None:
+    flight.waiters -= 1
+    if flight.waiters == 0 and not flight.task.done():
+        flight.task.cancel()
+
+
+def available() -> List[str]:
+    """Names of providers with an API key configured, in preference order."""
+    return [name for name, p in _PROVIDERS.items() if p.configured()]
+
+
+def count_fallback(endpoint: str) -> None:
+    """Record that ``endpoint`` answered with its rule-based fallback instead of an LLM."""
+    metrics.LLM_FALLBACKS.inc(endpoint=endpoint, reason="unavailable" if available() else "unconfigured")
+
+
+def breaker_states() -> Dict[str, str]:
+    return {name: b.state for name, b in _BREAKERS.items()}
+
+
+def flight_stats() -> Dict[str, int]:
+    """Upstream calls started vs. requests that joined an identical in-flight call."""
+    return dict(_FLIGHT_STATS)
+
+
+metrics.Collector(
+    "llm_circuit_open", "1 while the provider's circuit breaker rejects calls", "gauge", ("provider",),
+    lambda: {(name,): 1.0 if state == "open" else 0.0 for name, state in breaker_states().items()},
+)
+metrics.Collector(
+    "llm_flights_total", "LLM requests by single-flight role (upstream call started or coalesced)", "counter", ("role",),
+    lambda: {(role,): float(n) for role, n in flight_stats().items()},
+)
+
+
+async def _with_retries(req: _Request, attempt_fn: Callable[[Any, float, Dict[str, int]], Awaitable[Any]]) -> Any:
+    """Run ``attempt_fn(provider, deadline, usage)`` under retries, breakers and the overall deadline.
+
+    Providers are tried in preference order; a provider is skipped while its breaker is open.
+    Each attempt first waits for a scheduler slot; interactive requests wait at most until their
+    deadline, other classes do not spend their deadline while queued. A preempted batch attempt
+    is queued again without counting as a retry. Every attempt is timed, and token usage
+    reported by the provider is counted.
+    """
+    deadline = time.monotonic() + (req.timeout or settings.llm_timeout_seconds)
+    names = [n for n in (req.providers or _PROVIDERS) if n in _PROVIDERS and _PROVIDERS[n].configured()]
+    if not names:
+        raise LLMUnavailable("no LLM provider configured")
+    last: BaseException | None = None
+    for name in names:
+        provider, breaker = _PROVIDERS[name], _BREAKERS[name]
+        labels = {"provider": name, "model": provider.model_label(req.model), "endpoint": req.endpoint}
+        attempt = 0
+        while attempt <= settings.llm_max_retries:
+            if not breaker.allow():
+                last = LLMUnavailable(f"{name}: circuit open")
+                break
+            if deadline - time.monotonic() <= 0:
+                raise LLMUnavailable("LLM deadline exceeded") from last
+            interactive = req.priority == "interactive"
+            try:
+                ticket = await SCHEDULER.admit(req.priority, deadline - time.monotonic() if interactive else None)
+            except asyncio.TimeoutError:
+                raise LLMUnavailable("LLM queue wait exceeded") from last
+            if not interactive:
+                deadline += ticket.waited
+            usage: Dict[str, int] = {}
+            outcome = "error"
+            t0 = time.perf_counter()
+            try:
+                try:
+                    result = await ticket.run(attempt_fn(provider, deadline, usage))
+                finally:
+                    ticket.release()
+                outcome = "ok"
+            except Preempted:
+                outcome = "preempted"
+                continue
+            except _StreamBroken as e:
+                breaker.record_failure()
+                raise LLMUnavailable(f"{name}: stream interrupted: {e.__cause__}") from e.__cause__
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                raise
+            except Exception as e:
+                last = e
+                if isinstance(e, asyncio.TimeoutError):
+                    outcome = "timeout"
+                if not (isinstance(e, asyncio.TimeoutError) or provider.retryable(e)):
+                    # The provider answered (bad request, blocked prompt, ...): not a health signal
+                    breaker.record_success()
+                    break
+                breaker.record_failure()
+                if attempt < settings.llm_max_retries:
+                    # Full jitter keeps retries from many requests from arriving in lockstep
+                    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+                    if time.monotonic() + delay >= deadline:
+                        break
+                    await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            finally:
+                metrics.LLM_LATENCY.observe(time.perf_counter() - t0, outcome=outcome, **labels)
+                if usage:
+                    metrics.LLM_PROMPT_TOKENS.inc(usage.get("prompt", 0), **labels)
+                    metrics.LLM_OUTPUT_TOKENS.inc(usage.get("output", 0), **labels)
+            breaker.record_success()
+            return result
+    raise LLMUnavailable(f"{type(last).__name__}: {last}".rstrip(": ")) from last
+
+
+_RECORD_LOCK = threading.Lock()
+
+
+def _record(req: _Request, provider: Any, text: str, seconds: float) -> None:
+    """Append a completed answer to LLM_RECORD_PATH (replayed by scripts/fake_llm_server.py --replay)."""
+    line = json.dumps({
+        "provider": provider.name,
+        "model": provider.model_label(req.model),
+        "endpoint": req.endpoint,
+        "system": req.system,
+        "prompt": req.prompt,
+        "text": text,
+        "seconds": round(seconds, 3),
+    }, ensure_ascii=False)
+    try:
+        with _RECORD_LOCK, open(settings.llm_record_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        print(f"LLM record failed: {e}")
+
+
+async def _call(req: _Request) -> str:
+    async def attempt(provider, deadline: float, usage: Dict[str, int]) -> str:
+        remaining = deadline - time.monotonic()
+        t0 = time.monotonic()
+        text = await asyncio.wait_for(
+            provider.complete(req.prompt, req.system, req.model, req.temperature, remaining, usage), remaining
+        )
+        if settings.llm_record_path:
+            _record(req, provider, text, time.monotonic() - t0)
+        return text
+
+    return await _with_retries(req, attempt)
+
+
+async def _stream_call(req: _Request, emit: Callable[[str], None]) -> None:
+    async def attempt(provider, deadline: float, usage: Dict[str, int]) -> None:
+        # The overall deadline bounds time-to-first-token; after that each chunk may take up to
+        # LLM_TIMEOUT_SECONDS, so long answers are not cut off. Retries only happen before the
+        # first chunk was emitted.
+        chunks = provider.stream(req.prompt, req.system, req.model, req.temperature, deadline - time.monotonic(), usage)
+        started = False
+        parts: List[str] = []
+        t0 = time.monotonic()
+        try:
+            while True:
+                wait = settings.llm_timeout_seconds if started else deadline - time.monotonic()
+                try:
+                    text = await asyncio.wait_for(chunks.__anext__(), wait)
+                except StopAsyncIteration:
+                    if settings.llm_record_path:
+                        _record(req, provider, "".join(parts), time.monotonic() - t0)
+                    return
+                started = True
+                if settings.llm_record_path:
+                    parts.append(text)
+                emit(text)
+        except Exception as e:
+            if started:
+                raise _StreamBroken() from e
+            raise
+        finally:
+            await chunks.aclose()
+
+    await _with_retries(req, attempt)
+
+
+async def _coalesced_call(req: _Request) -> str:
+    flight = _join(req.flight_key("call"), lambda: _Flight(asyncio.ensure_future(_call(req))))
+    try:
+        # shield: one waiter going away must not cancel the call for the others
+        return await asyncio.shield(flight.task)
+    finally:
+        _leave(flight)
+
+
+async def _coalesced_stream(req: _Request, emit: Callable[[str], None]) -> None:
+    def start() -> _StreamFlight:
+        flight = _StreamFlight()
+        flight.task = asyncio.ensure_future(_stream_call(req, flight.publish))
+        return flight
+
+    flight = _join(req.flight_key("stream"), start)
+    assert isinstance(flight, _StreamFlight)
+    for text in flight.chunks:
+        emit(text)
+    flight.subscribers.append(emit)
+    try:
+        await asyncio.shield(flight.task)
+    finally:
+        flight.subscribers.remove(emit)
+        _leave(flight)
+
+
+async def generate(prompt: str, *, system: str | None = None, model: str | None = None, temperature: float | None = None,
+                   providers: Sequence[str] | None = None, timeout: float | None = None, endpoint: str = "other",
+                   priority: str = "interactive") -> str:
+    """Complete ``prompt`` with the first configured provider that answers.
+
+    ``model`` is the Gemini model name (OpenAI uses env OPENAI_MODEL); ``providers`` restricts
+    the providers tried; ``timeout`` overrides the overall deadline (LLM_TIMEOUT_SECONDS);
+    ``endpoint`` labels the call in /metrics; ``priority`` is the scheduler class ("interactive",
+    "near_realtime" or "batch"). Raises LLMUnavailable when no provider answered.
+    """
+    req = _Request(prompt, system, model, temperature, providers, timeout, endpoint, priority)
+    fut = asyncio.run_coroutine_threadsafe(_coalesced_call(req), _gateway_loop())
+    return await asyncio.wrap_future(fut)
+
+
+def generate_sync(prompt: str, *, system: str | None = None, model: str | None = None, temperature: float | None = None,
+                  providers: Sequence[str] | None = None, timeout: float | None = None, endpoint: str = "other",
+                  priority: str = "interactive") -> str:
+    """Blocking generate() for sync code paths (threadpool handlers, scripts)."""
+    loop = _gateway_loop()
+    if threading.current_thread() is _THREAD:
+        raise RuntimeError("generate_sync() called from the LLM gateway loop; await generate() instead")
+    req = _Request(prompt, system, model, temperature, providers, timeout, endpoint, priority)
+    return asyncio.run_coroutine_threadsafe(_coalesced_call(req), loop).result()
+
+
+async def stream(prompt: str, *, system: str | None = None, model: str | None = None, temperature: float | None = None,
+                 providers: Sequence[str] | None = None, timeout: float | None = None, endpoint: str = "other",
+                 priority: str = "interactive") -> AsyncIterator[str]:
+    """Yield text chunks as the provider produces them (same arguments as generate()).
+
+    Raises LLMUnavailable before the first chunk when no provider answered, or mid-stream when
+    the provider failed after emitting text. Closing the iterator cancels the upstream call.
+    """
+    req = _Request(prompt, system, model, temperature, providers, timeout, endpoint, priority)
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    end = object()
+
+    def emit(item: Any) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:  # caller's loop already closed
+            pass
+
+    async def produce() -> None:
+        try:
+            await _coalesced_stream(req, emit)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            emit(e)
+        else:
+            emit(end)
+
+    fut = asyncio.run_coroutine_threadsafe(produce(), _gateway_loop())
+    try:
+        while True:
+            item = await queue.get()
+            if item is end:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        fut.cancel()
+
+
+def shutdown() -> None:
+    """Close provider clients and stop the gateway loop (app shutdown)."""
+    global _LOOP, _THREAD
+    with _LOCK:
+        loop, thread = _LOOP, _THREAD
+        if loop is None:
+            return
+
+        async def _close():
+            for p in _PROVIDERS.values():
+                try:
+                    await p.aclose()
+                except Exception as e:
+                    print(f"LLM client close failed ({p.name}): {e}")
+
+        asyncio.run_coroutine_threadsafe(_close(), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join(timeout=5)
+        loop.close()
+        _LOOP, _THREAD = None, None
@@ -0,0 +1,104 @@
+from __future__ import annotations
+import math
+from typing import Any, Dict, List, Sequence
+
+# Prompt assembly under a token budget.
+#
+# Retrieved chunks are deduplicated (exact repeats, and the lines adjacent chunks share because
+# ingest windows overlap by ~150 characters), then chosen by retrieval score per estimated token
+# until the budget is spent; a chunk that does not fit whole is cut at a word boundary. Prompt
+# size, and so upstream latency, stays bounded whatever top_k the caller asked for.
+
+BYTES_PER_TOKEN = 4
+PER_CONTEXT_SHARE = 0.5  # no single chunk takes more than half the budget
+MIN_SNIPPET_TOKENS = 24  # smaller leftovers are not worth a truncated snippet
+ELLIPSIS = "…"
+
+
+def estimate_tokens(text: str) -> int:
+    """Tokenizer-free estimate: ~4 UTF-8 bytes per token.
+
+    Vietnamese letters with diacritics take 2-3 bytes, which tracks their higher token cost.
+    """
+    return math.ceil(len(text.encode("utf-8")) / BYTES_PER_TOKEN) if text else 0
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    """Cut ``text`` to about ``max_tokens`` at a word boundary."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    raw = text.encode("utf-8")[:max(0, max_tokens * BYTES_PER_TOKEN - len(ELLIPSIS.encode("utf-8")))]
+    cut = raw.decode("utf-8", errors="ignore")
+    space = cut.rfind(" ")
+    if space > len(cut) // 2:
+        cut = cut[:space]
+    return cut.rstrip() + ELLIPSIS
+
+
+def _lines(text: str) -> List[str]:
+    return [line.strip() for line in (text or "").splitlines() if line.strip()]
+
+
+def _overlap(head: Sequence[str], tail: Sequence[str]) -> int:
+    """Number of lines at the end of ``head`` that ``tail`` starts with."""
+    for k in range(min(len(head), len(tail)), 0, -1):
+        if list(head[-k:]) == list(tail[:k]):
+            return k
+    return 0
+
+
+def dedupe(contexts: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copies of ``contexts`` without repeated chunks or the overlap between neighbouring chunks.
+
+    When chunks i and i+1 of the same source are both present, the shared lines are kept once
+    (in chunk i). Order is preserved; chunks left empty are dropped.
+    """
+    originals: Dict[tuple, List[str]] = {}
+    for c in contexts:
+        originals.setdefault((c.get("source"), c.get("chunk_index")), _lines(c.get("text") or c.get("preview") or ""))
+    out: List[Dict[str, Any]] = []
+    seen: set = set()
+    for c in contexts:
+        src, idx = c.get("source"), c.get("chunk_index")
+        lines = originals[(src, idx)]
+        key = "\n".join(lines).lower()
+        if not lines or key in seen:
+            continue
+        seen.add(key)
+        if isinstance(idx, int) and (src, idx - 1) in originals:
+            lines = lines[_overlap(originals[(src, idx - 1)], lines):]
+        if lines:
+            out.append({**c, "text": "\n".join(lines)})
+    return out
+
+
+def pack(contexts: Sequence[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+    """Contexts to put in a prompt, within ``budget`` estimated tokens.
+
+    Each context may carry a retrieval "score" (higher is better; missing counts as 1). Returns
+    copies whose "text" is what was packed, in the original (relevance) order.
+    """
+    if budget <= 0:
+        return []
+    cap = max(MIN_SNIPPET_TOKENS, int(budget * PER_CONTEXT_SHARE))
+    items = []
+    for pos, c in enumerate(dedupe(contexts)):
+        text = truncate(c["text"], cap)
+        tokens = max(1, estimate_tokens(text))
+        items.append((float(c.get("score", 1.0)) / tokens, pos, tokens, {**c, "text": text}))
+
+    chosen = []
+    left = budget
+    for _, pos, tokens, c in sorted(items, key=lambda x: (-x[0], x[1])):
+        if tokens > left:
+            if left < MIN_SNIPPET_TOKENS:
+                continue
+            c = {**c, "text": truncate(c["text"], left)}
+            tokens = estimate_tokens(c["text"])
+        chosen.append((pos, c))
+        left -= tokens
+    return [c for _, c in sorted(chosen, key=lambda x: x[0])]
+
+
+def one_line(text: str) -> str:
+    return " ".join(text.split())
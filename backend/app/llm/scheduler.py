@@ -0,0 +1,204 @@
+from __future__ import annotations
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Deque, Dict, Set
+
+from ..config import settings
+from .. import metrics
+
+# Admission control for upstream LLM attempts, shared by every caller of the gateway.
+#
+# Each attempt waits for a slot before it reaches a provider. There are three priority classes:
+#   interactive    a student is watching (explain, chat, assistant generate)
+#   near_realtime  a page waits for it, but not token by token (exercise sets, insights)
+#   batch          background work (answer enrichment, nightly refreshes)
+# Slots are bounded by LLM_MAX_INFLIGHT concurrent calls and, optionally, a global LLM_GLOBAL_RPM
+# budget. Queued classes share free slots by weighted fair queuing (virtual finish times, weights
+# 8:3:1), so near_realtime cannot starve batch forever, but batch is further restricted:
+# it is deferred while any other class is queued, never holds more than LLM_BATCH_SHARE of the
+# slots, and leaves a reserve of the rate budget unspent. When an interactive request
+# is queued and every slot is busy, the newest running batch call is preempted: cancelled and
+# queued again without counting as a failed attempt.
+#
+# Runs entirely on the gateway event loop thread; no locks.
+
+PRIORITIES = ("interactive", "near_realtime", "batch")
+WEIGHTS = {"interactive": 8.0, "near_realtime": 3.0, "batch": 1.0}
+BURST_SECONDS = 10.0  # rate bucket holds this many seconds of LLM_GLOBAL_RPM
+BATCH_RATE_RESERVE = 0.3  # batch is not admitted below this fraction of a full rate bucket
+
+QUEUE_WAIT = metrics.Histogram(
+    "llm_queue_wait_seconds", "Time LLM attempts waited for a scheduler slot", ("priority",),
+    (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+PREEMPTIONS = metrics.Counter("llm_preemptions_total", "Batch LLM calls cancelled to make room for interactive ones")
+
+
+class Preempted(Exception):
+    """The attempt was cancelled by the scheduler; queue it again."""
+
+
+class Ticket:
+    __slots__ = ("priority", "future", "enqueued", "waited", "task", "preempted", "_scheduler")
+
+    def __init__(self, scheduler: "Scheduler", priority: str):
+        self._scheduler = scheduler
+        self.priority = priority
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued = time.monotonic()
+        self.waited = 0.0
+        self.task: asyncio.Task | None = None
+        self.preempted = False
+
+    async def run(self, coro: Awaitable[Any]) -> Any:
+        """Await ``coro`` in this slot. Batch work runs as its own task so it can be preempted."""
+        if self.priority != "batch":
+            return await coro
+        self.task = asyncio.ensure_future(coro)
+        # wait() rather than awaiting the task: the caller being cancelled then raises here
+        # without touching the task, so it is told apart from a preemption (the scheduler
+        # sets ``preempted`` before cancelling the task) without Task.cancelling() (3.11+)
+        try:
+            await asyncio.wait((self.task,))
+        except asyncio.CancelledError:
+            self.task.cancel()
+            raise
+        if self.task.cancelled() and self.preempted:
+            raise Preempted()
+        return self.task.result()
+
+    def release(self) -> None:
+        self._scheduler._release(self)
+
+
+class Scheduler:
+    def __init__(self, max_inflight: int, rpm: float, batch_share: float):
+        self.max_inflight = max(1, max_inflight)
+        self.rate = rpm / 60.0
+        self.capacity = max(1.0, self.rate * BURST_SECONDS)
+        self.batch_slots = max(1, int(self.max_inflight * batch_share))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._queues: Dict[str, Deque[Ticket]] = {p: deque() for p in PRIORITIES}
+        self._running: Dict[str, Set[Ticket]] = {p: set() for p in PRIORITIES}
+        self._finish: Dict[str, float] = {p: 0.0 for p in PRIORITIES}
+        self._virtual = 0.0
+        self._wake: asyncio.TimerHandle | None = None
+
+    async def admit(self, priority: str, max_wait: float | None = None) -> Ticket:
+        """Wait for a slot; raises asyncio.TimeoutError after ``max_wait`` seconds."""
+        if priority not in WEIGHTS:
+            raise ValueError(f"unknown LLM priority {priority!r}")
+        ticket = Ticket(self, priority)
+        self._queues[priority].append(ticket)
+        self._dispatch()
+        try:
+            if max_wait is None:
+                await ticket.future
+            else:
+                await asyncio.wait_for(ticket.future, max(0.0, max_wait))
+        except BaseException:
+            # Dispatched just as the waiter gave up: hand the slot back
+            if ticket.future.done() and not ticket.future.cancelled():
+                self._release(ticket)
+            raise
+        return ticket
+
+    def _inflight(self) -> int:
+        return sum(len(s) for s in self._running.values())
+
+    def _refill(self) -> None:
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _eligible(self, priority: str) -> bool:
+        if priority != "batch":
+            return True
+        if self._queues["interactive"] or self._queues["near_realtime"]:
+            return False
+        if len(self._running["batch"]) >= self.batch_slots:
+            return False
+        return self.rate <= 0 or self._tokens >= 1.0 + self.capacity * BATCH_RATE_RESERVE
+
+    def _dispatch(self) -> None:
+        for q in self._queues.values():
+            while q and q[0].future.done():  # waiter gave up
+                q.popleft()
+        while self._inflight() < self.max_inflight:
+            self._refill()
+            if self.rate > 0 and self._tokens < 1.0:
+                self._schedule_wake((1.0 - self._tokens) / self.rate)
+                break
+            ready = [p for p in PRIORITIES if self._queues[p] and self._eligible(p)]
+            if not ready:
+                if self.rate > 0 and self._queues["batch"] and not self._queues["interactive"] and not self._queues["near_realtime"]:
+                    # batch held back by the rate reserve: look again once it refills
+                    self._schedule_wake((1.0 + self.capacity * BATCH_RATE_RESERVE - self._tokens) / self.rate)
+                break
+            # Weighted fair queuing: smallest virtual finish time goes next
+            p = min(ready, key=lambda c: max(self._finish[c], self._virtual) + 1.0 / WEIGHTS[c])
+            ticket = self._queues[p].popleft()
+            if ticket.future.done():
+                continue
+            start = max(self._finish[p], self._virtual)
+            self._finish[p] = start + 1.0 / WEIGHTS[p]
+            self._virtual = start
+            if self.rate > 0:
+                self._tokens -= 1.0
+            self._running[p].add(ticket)
+            ticket.waited = time.monotonic() - ticket.enqueued
+            QUEUE_WAIT.observe(ticket.waited, priority=p)
+            ticket.future.set_result(None)
+        self._preempt_for_interactive()
+
+    def _preempt_for_interactive(self) -> None:
+        waiting = sum(1 for t in self._queues["interactive"] if not t.future.done())
+        if not waiting or self._inflight() < self.max_inflight:
+            return
+        victims = sorted(
+            (t for t in self._running["batch"] if not t.preempted and t.task is not None),
+            key=lambda t: t.enqueued, reverse=True,
+        )
+        for t in victims[:waiting]:
+            t.preempted = True
+            t.task.cancel()
+            PREEMPTIONS.inc()
+
+    def _schedule_wake(self, delay: float) -> None:
+        if self._wake is not None:
+            return
+
+        def wake() -> None:
+            self._wake = None
+            self._dispatch()
+
+        self._wake = asyncio.get_running_loop().call_later(max(0.01, delay), wake)
+
+    def _release(self, ticket: Ticket) -> None:
+        running = self._running[ticket.priority]
+        if ticket in running:
+            running.remove(ticket)
+            self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": {p: len(q) for p, q in self._queues.items()},
+            "running": {p: len(s) for p, s in self._running.items()},
+            "rate_tokens": round(self._tokens, 2) if self.rate > 0 else None,
+        }
+
+
+SCHEDULER = Scheduler(settings.llm_max_inflight, settings.llm_global_rpm, settings.llm_batch_share)
+
+metrics.Collector(
+    "llm_scheduler_queued", "LLM attempts waiting for a scheduler slot", "gauge", ("priority",),
+    lambda: {(p,): float(n) for p, n in SCHEDULER.stats()["queued"].items()},
+)
+metrics.Collector(
+    "llm_scheduler_running", "LLM attempts holding a scheduler slot", "gauge", ("priority",),
+    lambda: {(p,): float(n) for p, n in SCHEDULER.stats()["running"].items()},
+)
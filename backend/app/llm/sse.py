@@ -0,0 +1,45 @@
+from __future__ import annotations
+import json
+from typing import Any, AsyncIterator, Callable
+
+from fastapi.responses import StreamingResponse
+
+from .gateway import LLMUnavailable, count_fallback
+
+# Server-sent events framing for the streaming explain endpoints.
+# Event sequence: optional "contexts" (chat only, sent first), "token" {"text": ...} repeated as
+# the model produces text, then "done" — or "error" {"detail": ...} if the stream broke midway.
+
+
+def event(name: str, data: Any) -> str:
+    return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def response(events: AsyncIterator[str]) -> StreamingResponse:
+    # no-cache / no proxy buffering, so each event reaches the client as soon as it is written
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def token_events(chunks: AsyncIterator[str], fallback: Callable[[], str], endpoint: str) -> AsyncIterator[str]:
+    """Forward LLM text chunks as "token" events (``endpoint`` labels fallbacks in /metrics).
+
+    If no provider answered before the first chunk, the rule-based ``fallback()`` text is sent as a
+    single token (marked "fallback": true) so the client renders the same answer as the
+    non-streaming endpoint.
+    """
+    sent = False
+    try:
+        async for text in chunks:
+            sent = True
+            yield event("token", {"text": text})
+    except LLMUnavailable as e:
+        if sent:
+            yield event("error", {"detail": str(e)})
+            return
+        count_fallback(endpoint)
+        yield event("token", {"text": fallback(), "fallback": True})
+    yield event("done", {})
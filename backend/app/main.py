@@ -1,16 +1,20 @@
 from __future__ import annotations
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 
-from .database import Base, engine, SessionLocal
+from .database import Base, engine, SessionLocal, dispose_async_engines, init_async_engines
 from .seed import ensure_seed
+from .upgrade import upgrade_sqlite
 
 from .routers import auth, profile, catalog, diagnostic, analysis, learning_path, sessions, progress, questions, assistant
 # Admin routers commented out (not in MVP scope)
 # from .routers import admin, admin_auth
 from .chat import router as chat_router
+from .chat import retriever
 from .ai import router as ai_router
+from . import llm, metrics
 
 app = FastAPI(title="AI Learning Coach Backend", version="0.1.0")
 
@@ -22,17 +26,35 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Request latency per route for GET /metrics
+app.add_middleware(metrics.HTTPMetricsMiddleware)
 
 
 @app.on_event("startup")
 def on_startup():
-    # Create tables (SQLite) and seed basic data for demo
+    # Create tables (SQLite) and seed basic data for demo (a single lookup once the seed is current)
     Base.metadata.create_all(bind=engine)
+    # Columns and indexes that create_all does not add to an existing SQLite database
+    upgrade_sqlite(engine)
     db: Session = SessionLocal()
     try:
         ensure_seed(db)
     finally:
         db.close()
+    # Async engines for the async routers (fails here if the async driver is not installed)
+    init_async_engines()
+    # Load (or rebuild if stale) the retriever index snapshot so the first request is not the one building it
+    retriever.load_snapshot()
+    # Optional periodic scan for re-ingested artifacts (RETRIEVER_REFRESH_SECONDS > 0)
+    retriever.start_auto_refresh()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    # Close pooled LLM provider connections
+    llm.shutdown()
+    # Close the async routers' DB connections (aiosqlite keeps a thread per connection)
+    await dispose_async_engines()
 
 
 @app.get("/")
@@ -40,6 +62,12 @@ def root():
     return {"message": "AI Learning Coach Backend is running"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    # Prometheus scrape endpoint: LLM latency/tokens/fallbacks, breaker and cache state, HTTP latency
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 # Routers
 app.include_router(auth.router)
 
@@ -0,0 +1,204 @@
+from __future__ import annotations
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import DiagnosticResult, StudentMastery
+from . import metrics
+
+# Per-student mastery snapshot shared by /analysis/strength-weakness, /analysis/insights,
+# /learning-path/generate and /progress/overview.
+#
+# Chapter percents, mastery levels, classification, priority order and the mastered/weak
+# counts are derived from diagnostic_results once, when they are written (diagnostic submit,
+# placement test submit), and stored as one student_mastery row. Readers get it with a
+# primary-key lookup, and each worker keeps recently read snapshots for
+# MASTERY_CACHE_TTL_SECONDS so the dashboard's parallel calls share one read. Students without
+# a stored row (results written before the snapshot existed) get it computed from
+# diagnostic_results on read; it is stored on their next submit.
+
+CHAPTER_NAMES = {
+    1: "Chương I: Mệnh đề và Tập hợp",
+    2: "Chương II: Bất phương trình",
+    3: "Chương III: Góc lượng giác và Hệ thức lượng",
+    4: "Chương IV: Vectơ",
+    5: "Chương V: Phương trình đường thẳng và đường tròn",
+}
+
+CACHE_REQUESTS = metrics.Counter(
+    "mastery_cache_requests_total", "Mastery snapshot reads by source (cache, stored, computed)", ("result",)
+)
+
+
+def classify(percent: float) -> tuple[int, str]:
+    # Map percent to mastery level 1..5 and label
+    if percent < 40:
+        return 1, "weak"
+    if percent < 60:
+        return 2, "weak"
+    if percent < 75:
+        return 3, "average"
+    if percent < 90:
+        return 4, "strong"
+    return 5, "strong"
+
+
+class Mastery:
+    """One student's snapshot. ``chapters`` is in priority order (weakest first)."""
+
+    __slots__ = ("student_id", "chapters", "priority", "topics_mastered", "weak_topics")
+
+    def __init__(self, student_id: int, chapters: List[Dict[str, Any]]):
+        self.student_id = student_id
+        self.chapters = chapters
+        self.priority = [c["topic_id"] for c in chapters]
+        self.topics_mastered = sum(1 for c in chapters if c["percent"] >= 75)
+        self.weak_topics = sum(1 for c in chapters if c["percent"] < 60)
+
+    @classmethod
+    def from_results(cls, student_id: int, results: Iterable[Tuple[int, float]]) -> "Mastery":
+        """Build from (topic_id, percent) pairs; topic_id holds the chapter id 1-5."""
+        chapters = []
+        for topic_id, percent in results:
+            level, classification = classify(percent)
+            chapters.append({
+                "topic_id": topic_id,
+                "topic_name": CHAPTER_NAMES.get(topic_id, f"Chương {topic_id}"),
+                "percent": percent,
+                "mastery_level": level,
+                "classification": classification,
+                # Lower percent = higher priority (study the weakest first)
+                "priority_score": 100.0 - percent,
+            })
+        chapters.sort(key=lambda c: c["priority_score"], reverse=True)
+        return cls(student_id, chapters)
+
+    @classmethod
+    def from_json(cls, student_id: int, data: str) -> "Mastery":
+        return cls(student_id, json.loads(data)["chapters"])
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "chapters": self.chapters,
+            "priority": self.priority,
+            "topics_mastered": self.topics_mastered,
+            "weak_topics": self.weak_topics,
+        }, ensure_ascii=False)
+
+    @property
+    def has_diagnostic(self) -> bool:
+        return bool(self.chapters)
+
+
+class MasteryCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Tuple[Mastery, float]]" = OrderedDict()
+
+    def get(self, student_id: int) -> Optional[Mastery]:
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[student_id]
+                return None
+            self._entries.move_to_end(student_id)
+            return entry[0]
+
+    def put(self, student_id: int, mastery: Mastery) -> None:
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[student_id] = (mastery, time.monotonic() + self.ttl)
+            self._entries.move_to_end(student_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, student_id: int) -> None:
+        with self._lock:
+            self._entries.pop(student_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+MASTERY = MasteryCache(settings.mastery_cache_max_entries, settings.mastery_cache_ttl_seconds)
+
+metrics.Collector(
+    "mastery_cache_entries", "Students with a cached mastery snapshot", "gauge", (),
+    lambda: {(): float(len(MASTERY))},
+)
+
+
+def _results(student_id: int):
+    # Row order breaks priority ties, as it did when each endpoint sorted the rows itself
+    return (
+        select(DiagnosticResult.topic_id, DiagnosticResult.percent)
+        .where(DiagnosticResult.student_id == student_id)
+        .order_by(DiagnosticResult.id)
+    )
+
+
+def get_mastery(db: Session, student_id: int) -> Mastery:
+    """The student's snapshot: from this worker's cache, else one keyed read."""
+    mastery = MASTERY.get(student_id)
+    if mastery is not None:
+        CACHE_REQUESTS.inc(result="cache")
+        return mastery
+    row = db.get(StudentMastery, student_id)
+    if row is not None:
+        CACHE_REQUESTS.inc(result="stored")
+        mastery = Mastery.from_json(student_id, row.data)
+    else:
+        CACHE_REQUESTS.inc(result="computed")
+        mastery = Mastery.from_results(student_id, db.execute(_results(student_id)).all())
+    MASTERY.put(student_id, mastery)
+    return mastery
+
+
+async def get_mastery_async(db: AsyncSession, student_id: int) -> Mastery:
+    """get_mastery for the async routers."""
+    mastery = MASTERY.get(student_id)
+    if mastery is not None:
+        CACHE_REQUESTS.inc(result="cache")
+        return mastery
+    row = await db.get(StudentMastery, student_id)
+    if row is not None:
+        CACHE_REQUESTS.inc(result="stored")
+        mastery = Mastery.from_json(student_id, row.data)
+    else:
+        CACHE_REQUESTS.inc(result="computed")
+        mastery = Mastery.from_results(student_id, (await db.execute(_results(student_id))).all())
+    MASTERY.put(student_id, mastery)
+    return mastery
+
+
+async def rebuild_mastery_async(db: AsyncSession, student_id: int) -> Mastery:
+    """Recompute the snapshot from diagnostic_results and stage its row in ``db``.
+
+    Call after adding the new diagnostic rows and before commit, so the snapshot is written
+    in the same transaction; after the commit, ``MASTERY.put`` the returned snapshot.
+    """
+    await db.flush()  # the sessions don't autoflush; the query below must see the new rows
+    mastery = Mastery.from_results(student_id, (await db.execute(_results(student_id))).all())
+    row = await db.get(StudentMastery, student_id)
+    if row is None:
+        db.add(StudentMastery(student_id=student_id, data=mastery.to_json(), version=1))
+    else:
+        row.data = mastery.to_json()
+        row.version = (row.version or 0) + 1
+    return mastery
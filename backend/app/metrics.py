@@ -0,0 +1,182 @@
+from __future__ import annotations
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Minimal in-process metrics with Prometheus text exposition (served at GET /metrics).
+#
+# Counter and Histogram are updated inline; Collector reads a value table from a callback at
+# scrape time (breaker state, cache counters kept elsewhere). Values are per process: with
+# several workers, each one exposes its own series.
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+_REGISTRY: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, k)} {_num(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (non-cumulative, + overflow), sum]
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][i] += 1
+            entry[1][0] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s[0])) for k, (c, s) in self._values.items())
+        out: List[str] = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_num(bound)}"'
+                out.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            out.append(f"{self.name}_sum{_labels(self.label_names, key)} {_num(total)}")
+            out.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return out
+
+
+class Collector(_Metric):
+    """Metric whose values come from ``fn() -> {label values: value}`` at scrape time."""
+
+    def __init__(self, name: str, help: str, type: str, labels: Sequence[str], fn: Callable[[], Dict[LabelValues, float]]):
+        super().__init__(name, help, labels)
+        self.type = type
+        self.fn = fn
+
+    def samples(self) -> List[str]:
+        try:
+            values = self.fn()
+        except Exception as e:  # a broken collector must not break the scrape
+            print(f"Metrics collector {self.name} failed: {e}")
+            return []
+        return [f"{self.name}{_labels(self.label_names, k)} {_num(v)}" for k, v in sorted(values.items())]
+
+
+def render() -> str:
+    """All registered metrics in Prometheus text format (version 0.0.4)."""
+    return "\n".join(m.render() for m in _REGISTRY) + "\n"
+
+
+class HTTPMetricsMiddleware:
+    """ASGI middleware observing HTTP_LATENCY per route template (``/ai/sets/{set_id}``, not the raw path).
+
+    Timed until the last body chunk is sent, so streaming responses count their full duration.
+    Requests that match no route are labelled "unmatched" to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        t0 = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_LATENCY.observe(
+                time.perf_counter() - t0,
+                method=scope.get("method", ""),
+                route=getattr(route, "path", "unmatched"),
+                status=str(status[0]),
+            )
+
+
+# ---- Application metrics ----
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"), HTTP_BUCKETS
+)
+LLM_LATENCY = Histogram(
+    "llm_request_duration_seconds", "Latency of each upstream LLM attempt", ("provider", "model", "endpoint", "outcome")
+)
+LLM_PROMPT_TOKENS = Counter("llm_prompt_tokens_total", "Prompt tokens sent to LLM providers", ("provider", "model", "endpoint"))
+LLM_OUTPUT_TOKENS = Counter("llm_output_tokens_total", "Output tokens received from LLM providers", ("provider", "model", "endpoint"))
+LLM_FALLBACKS = Counter("llm_fallbacks_total", "Requests answered by a rule-based fallback instead of an LLM", ("endpoint", "reason"))
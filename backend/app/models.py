@@ -12,15 +12,32 @@ from sqlalchemy import (
     Boolean,
     Float,
     ForeignKey,
+    Index,
     UniqueConstraint,
     Text,
     JSON,
+    case,
+    event,
+    func,
+    insert,
+    select,
+    update,
 )
-from sqlalchemy.orm import relationship, Mapped
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import relationship, Mapped, Session
 
 from .database import Base
 
 
+class AppMeta(Base):
+    """Small key/value store for app bookkeeping (e.g. which seed version is loaded)."""
+    __tablename__ = "app_meta"
+
+    key: Mapped[str] = Column(String(100), primary_key=True)
+    value: Mapped[str] = Column(String(255), nullable=False)
+    updated_at: Mapped[datetime] = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
 class Admin(Base):
     """
     Admin users - separate from students with their own authentication.
@@ -33,6 +50,8 @@ class Admin(Base):
     full_name: Mapped[Optional[str]] = Column(String(255), nullable=True)
     created_at: Mapped[datetime] = Column(DateTime, default=datetime.utcnow, nullable=False)
     last_login: Mapped[Optional[datetime]] = Column(DateTime, nullable=True)
+    # Bumped by logout-all; tokens carrying an older version are rejected
+    token_version: Mapped[int] = Column(Integer, default=0, server_default="0", nullable=False)
 
 
 class Student(Base):
@@ -48,6 +67,8 @@ class Student(Base):
     goal_score: Mapped[Optional[int]] = Column(Integer, nullable=True)
 
     created_at: Mapped[datetime] = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Bumped by logout-all; tokens carrying an older version are rejected
+    token_version: Mapped[int] = Column(Integer, default=0, server_default="0", nullable=False)
 
     availability: Mapped[List["Availability"]] = relationship(
         "Availability", back_populates="student", cascade="all, delete-orphan"
@@ -122,9 +143,21 @@ class DiagnosticResult(Base):
 
     __table_args__ = (
         UniqueConstraint("student_id", "topic_id", name="uq_diagnostic_once_per_topic"),
+        Index("ix_diagnostic_results_student_created", "student_id", "created_at"),
     )
 
 
+class StudentMastery(Base):
+    """Per-student mastery snapshot derived from diagnostic_results (see app/mastery.py)."""
+    __tablename__ = "student_mastery"
+
+    student_id: Mapped[int] = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), primary_key=True)
+    # JSON: chapters (percent, level, classification, priority), priority order, counts
+    data: Mapped[str] = Column(Text, nullable=False)
+    version: Mapped[int] = Column(Integer, nullable=False, default=1)
+    updated_at: Mapped[datetime] = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
 class Performance(Base):
     __tablename__ = "performances"
 
@@ -138,6 +171,26 @@ class Performance(Base):
     student: Mapped[Student] = relationship("Student")
     topic: Mapped[Topic] = relationship("Topic")
 
+    __table_args__ = (
+        # Per-student history (newest first) and the "score >= 70" counts
+        Index("ix_performances_student_taken", "student_id", "taken_at"),
+        Index("ix_performances_student_score", "student_id", "score"),
+    )
+
+
+# Performance.score at or above this counts as a correct exercise (progress overview, admin stats)
+PASSING_SCORE = 70.0
+
+
+class StudentProgress(Base):
+    """Per-student Performance counters, kept current by the after_insert hook below."""
+    __tablename__ = "student_progress"
+
+    student_id: Mapped[int] = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), primary_key=True)
+    total_exercises: Mapped[int] = Column(Integer, nullable=False, default=0)
+    correct_exercises: Mapped[int] = Column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
 
 class LearningPathItem(Base):
     __tablename__ = "learning_path_items"
@@ -151,6 +204,10 @@ class LearningPathItem(Base):
     student: Mapped[Student] = relationship("Student", back_populates="learning_path")
     topic: Mapped[Topic] = relationship("Topic")
 
+    __table_args__ = (
+        Index("ix_learning_path_items_student_rank", "student_id", "priority_rank"),
+    )
+
 
 class Schedule(Base):
     __tablename__ = "schedules"
@@ -168,6 +225,10 @@ class Schedule(Base):
     topic: Mapped[Optional[Topic]] = relationship("Topic")
     learning_unit: Mapped[Optional[LearningUnit]] = relationship("LearningUnit")
 
+    __table_args__ = (
+        Index("ix_schedules_student_date_start", "student_id", "date", "start_time"),
+    )
+
 
 class SessionLog(Base):
     __tablename__ = "session_logs"
@@ -230,4 +291,70 @@ class PlacementTestResult(Base):
     __table_args__ = (
         # Allow multiple tests per student (for retakes), but unique test_id
         UniqueConstraint("test_id", name="uq_placement_test_id"),
+        Index("ix_placement_test_results_student_taken", "student_id", "taken_at"),
     )
+
+
+def performance_counts(student_id: int):
+    """SELECT (total, correct) Performance counts of one student, straight from the table."""
+    return select(
+        func.count(Performance.id),
+        func.coalesce(func.sum(case((Performance.score >= PASSING_SCORE, 1), else_=0)), 0),
+    ).where(Performance.student_id == student_id)
+
+
+def create_progress_counters(connection, student_id: int) -> tuple[int, int] | None:
+    """Insert the student's counters row from the performances table (counting rows already
+    flushed in this transaction); returns the stored (total, correct), or None if a row exists.
+    """
+    total, correct = connection.execute(performance_counts(student_id)).one()
+    try:
+        with connection.begin_nested():
+            connection.execute(insert(StudentProgress.__table__).values(
+                student_id=student_id, total_exercises=total, correct_exercises=correct,
+                updated_at=datetime.utcnow(),
+            ))
+    except IntegrityError:
+        return None
+    return total, correct
+
+
+@event.listens_for(Student, "after_insert")
+def _create_student_counters(mapper, connection, target: Student) -> None:
+    # New students start with a counters row, so /progress/overview never has to count for them
+    connection.execute(insert(StudentProgress.__table__).values(
+        student_id=target.id, total_exercises=0, correct_exercises=0, updated_at=datetime.utcnow(),
+    ))
+
+
+@event.listens_for(Session, "after_flush")
+def _count_performances(session: Session, flush_context) -> None:
+    # Bump the counters by this flush's new Performance rows (one UPDATE per student), in the
+    # flush's transaction so both commit or roll back together. Core/bulk inserts bypass this;
+    # scripts/rebuild_progress_counters.py repairs.
+    deltas: dict[int, list[int]] = {}
+    for obj in session.new:
+        if isinstance(obj, Performance):
+            delta = deltas.setdefault(obj.student_id, [0, 0])
+            delta[0] += 1
+            delta[1] += 1 if (obj.score or 0.0) >= PASSING_SCORE else 0
+    if not deltas:
+        return
+    progress = StudentProgress.__table__
+    connection = session.connection()
+    for student_id, (total, correct) in deltas.items():
+        bump = (
+            update(progress)
+            .where(progress.c.student_id == student_id)
+            .values(
+                total_exercises=progress.c.total_exercises + total,
+                correct_exercises=progress.c.correct_exercises + correct,
+                updated_at=datetime.utcnow(),
+            )
+        )
+        if connection.execute(bump).rowcount:
+            continue
+        # No row yet (student created around the ORM, or before the counters existed): the
+        # table count already includes this flush's rows
+        if create_progress_counters(connection, student_id) is None:
+            connection.execute(bump)  # another transaction created it first
@@ -0,0 +1,134 @@
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+from .config import settings
+from .models import Student
+from . import metrics
+
+# Authenticated-principal cache for get_current_student.
+#
+# Maps an access token to a detached snapshot of the student it belongs to (id, email, profile
+# fields and token_version), so a repeat request with the same token skips both the JWT
+# verification and the students lookup. A new token whose version matches a snapshot already
+# cached for its student id reuses that snapshot without a query too. Entries expire after
+# PRINCIPAL_CACHE_TTL_SECONDS or when the token does, whichever is first; memory is bounded by
+# PRINCIPAL_CACHE_MAX_ENTRIES (LRU eviction).
+#
+# Per process: invalidate() after changing a student's row drops that student's entries here;
+# other workers see the change once their entries expire, or as soon as they cache a snapshot
+# with a newer token_version (older-version entries of that student are dropped then).
+
+CACHE_REQUESTS = metrics.Counter("principal_cache_requests_total", "Principal cache lookups by result", ("result",))
+
+
+class StudentPrincipal:
+    """What request handlers get as ``current``: the Student columns except the password hash.
+
+    Not attached to any session; load the Student row when it has to be changed.
+    """
+
+    __slots__ = ("id", "email", "full_name", "school", "grade", "goal_score", "created_at", "token_version")
+
+    def __init__(self, id: int, email: str, full_name: Optional[str] = None, school: Optional[str] = None,
+                 grade: Optional[str] = None, goal_score: Optional[int] = None, created_at: Optional[datetime] = None,
+                 token_version: int = 0):
+        self.id = id
+        self.email = email
+        self.full_name = full_name
+        self.school = school
+        self.grade = grade
+        self.goal_score = goal_score
+        self.created_at = created_at
+        self.token_version = token_version
+
+    @classmethod
+    def from_student(cls, student: Student) -> "StudentPrincipal":
+        return cls(student.id, student.email, student.full_name, student.school,
+                   student.grade, student.goal_score, student.created_at, student.token_version or 0)
+
+
+class PrincipalCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[StudentPrincipal, float]]" = OrderedDict()
+        self._by_student: Dict[int, Set[str]] = {}
+
+    def get(self, token: str) -> Optional[StudentPrincipal]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[1] <= now:
+                self._drop(token)
+                entry = None
+            if entry is None:
+                CACHE_REQUESTS.inc(result="miss")
+                return None
+            self._entries.move_to_end(token)
+        CACHE_REQUESTS.inc(result="hit")
+        return entry[0]
+
+    def for_student(self, student_id: int) -> Optional[StudentPrincipal]:
+        """A live snapshot cached for ``student_id`` under any token (the newest token_version)."""
+        now = time.monotonic()
+        with self._lock:
+            live = [self._entries[t] for t in self._by_student.get(student_id, ()) if self._entries[t][1] > now]
+        if not live:
+            return None
+        return max(live, key=lambda e: e[0].token_version)[0]
+
+    def put(self, token: str, principal: StudentPrincipal, token_expires: Optional[float] = None) -> None:
+        """Cache ``principal`` for ``token``; ``token_expires`` is the token's ``exp`` (Unix time)."""
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        ttl = self.ttl
+        if token_expires is not None:
+            ttl = min(ttl, token_expires - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._drop(token)
+            for other in list(self._by_student.get(principal.id, ())):
+                if self._entries[other][0].token_version < principal.token_version:
+                    self._drop(other)  # revoked by a logout-all elsewhere
+            self._entries[token] = (principal, time.monotonic() + ttl)
+            self._by_student.setdefault(principal.id, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, student_id: int) -> None:
+        """Forget every cached token of ``student_id``."""
+        with self._lock:
+            for token in list(self._by_student.get(student_id, ())):
+                self._drop(token)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_student.clear()
+
+    def _drop(self, token: str) -> None:
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._by_student.get(entry[0].id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_student[entry[0].id]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+PRINCIPALS = PrincipalCache(settings.principal_cache_max_entries, settings.principal_cache_ttl_seconds)
+
+metrics.Collector(
+    "principal_cache_entries", "Access tokens with a cached principal", "gauge", (),
+    lambda: {(): float(len(PRINCIPALS))},
+)
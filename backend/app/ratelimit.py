@@ -0,0 +1,251 @@
+from __future__ import annotations
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Dict, Iterator, Tuple
+
+from fastapi import Depends, HTTPException, status
+
+from .config import settings
+from .dependencies import get_current_student
+from .principals import StudentPrincipal
+from . import metrics
+
+# Per-student quotas for the AI endpoints, so one student cannot spend the whole cohort's
+# upstream LLM budget.
+#
+# Each (student, endpoint class) has a token bucket: ``capacity`` requests of burst, refilled at
+# capacity/period per second. On top of that a student may only have ``concurrency`` AI requests
+# in flight at once (across classes). Rejections are 429 with Retry-After.
+#
+# State lives in memory by default (per worker process). With RATE_LIMIT_DB set, buckets and
+# in-flight leases live in a small SQLite file shared by every worker on the host; each
+# check is one short IMMEDIATE transaction. Leases expire after LEASE_TTL_SECONDS so a
+# crashed worker cannot hold a student's slots forever.
+
+LEASE_TTL_SECONDS = 300.0
+
+REJECTIONS = metrics.Counter("rate_limit_rejections_total", "AI requests rejected by per-student quotas", ("endpoint_class", "reason"))
+
+
+def _parse_rate(spec: str) -> Tuple[float, float]:
+    """``"20/60"`` -> (capacity 20, refill 20/60 per second)."""
+    count, _, period = spec.partition("/")
+    capacity = float(count)
+    return capacity, capacity / float(period or 60)
+
+
+def _limits() -> Dict[str, Tuple[float, float]]:
+    return {
+        "explain": _parse_rate(settings.rate_limit_explain),
+        "generate": _parse_rate(settings.rate_limit_generate),
+        "insights": _parse_rate(settings.rate_limit_insights),
+    }
+
+
+class RateLimited(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class MemoryBackend:
+    """Buckets and leases in this process only."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # key -> (tokens, updated at)
+        self._leases: Dict[str, Dict[str, float]] = {}  # student key -> {lease id: expires at}
+
+    def take(self, key: str, capacity: float, rate: float) -> float:
+        """Take one token; returns 0 on success, else seconds until a token is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens < 1.0:
+                self._buckets[key] = (tokens, now)
+                return (1.0 - tokens) / rate if rate > 0 else LEASE_TTL_SECONDS
+            self._buckets[key] = (tokens - 1.0, now)
+            return 0.0
+
+    def acquire(self, key: str, limit: int) -> str | None:
+        now = time.monotonic()
+        with self._lock:
+            leases = {k: exp for k, exp in self._leases.get(key, {}).items() if exp > now}
+            if len(leases) >= limit:
+                self._leases[key] = leases
+                return None
+            lease_id = uuid.uuid4().hex
+            leases[lease_id] = now + LEASE_TTL_SECONDS
+            self._leases[key] = leases
+            return lease_id
+
+    def release(self, key: str, lease_id: str) -> None:
+        with self._lock:
+            leases = self._leases.get(key)
+            if leases is not None:
+                leases.pop(lease_id, None)
+                if not leases:
+                    del self._leases[key]
+
+
+class SQLiteBackend:
+    """Buckets and leases in a SQLite file shared by all workers on one host."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS rate_leases (id TEXT PRIMARY KEY, key TEXT NOT NULL, expires REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_rate_leases_key ON rate_leases (key)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _immediate(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def take(self, key: str, capacity: float, rate: float) -> float:
+        now = time.time()  # wall clock: shared between processes
+        conn = self._immediate()
+        try:
+            row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0
+            if tokens < 1.0:
+                wait = (1.0 - tokens) / rate if rate > 0 else LEASE_TTL_SECONDS
+            else:
+                tokens -= 1.0
+            conn.execute("INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+            conn.execute("COMMIT")
+            return wait
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def acquire(self, key: str, limit: int) -> str | None:
+        now = time.time()
+        conn = self._immediate()
+        try:
+            conn.execute("DELETE FROM rate_leases WHERE key = ? AND expires <= ?", (key, now))
+            (held,) = conn.execute("SELECT COUNT(*) FROM rate_leases WHERE key = ?", (key,)).fetchone()
+            lease_id = None
+            if held < limit:
+                lease_id = uuid.uuid4().hex
+                conn.execute("INSERT INTO rate_leases (id, key, expires) VALUES (?, ?, ?)", (lease_id, key, now + LEASE_TTL_SECONDS))
+            conn.execute("COMMIT")
+            return lease_id
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def release(self, key: str, lease_id: str) -> None:
+        self._conn().execute("DELETE FROM rate_leases WHERE id = ?", (lease_id,))
+
+
+class Lease:
+    """One in-flight AI request slot. ``release`` is idempotent."""
+
+    def __init__(self, backend, key: str, lease_id: str):
+        self._backend = backend
+        self._key = key
+        self._id: str | None = lease_id
+        self.held_by_response = False
+
+    def release(self) -> None:
+        lease_id, self._id = self._id, None
+        if lease_id is not None:
+            self._backend.release(self._key, lease_id)
+
+
+class Limiter:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def acquire(self, student_id: int, endpoint_class: str) -> Lease:
+        """Charge one request to the student's bucket and take a concurrency slot, or raise RateLimited."""
+        capacity, rate = _limits()[endpoint_class]
+        key = f"{student_id}:inflight"
+        lease_id = self.backend.acquire(key, settings.rate_limit_concurrency)
+        if lease_id is None:
+            # No way to know when a running request ends; retry shortly
+            raise RateLimited("concurrency", 1.0)
+        lease = Lease(self.backend, key, lease_id)
+        wait = self.backend.take(f"{student_id}:{endpoint_class}", capacity, rate)
+        if wait > 0:
+            lease.release()
+            raise RateLimited("rate", wait)
+        return lease
+
+
+def _backend():
+    if settings.rate_limit_db:
+        os.makedirs(os.path.dirname(os.path.abspath(settings.rate_limit_db)), exist_ok=True)
+        return SQLiteBackend(settings.rate_limit_db)
+    return MemoryBackend()
+
+
+LIMITER = Limiter(_backend())
+
+
+def ai_quota(endpoint_class: str):
+    """Dependency enforcing the per-student quota of ``endpoint_class`` ("explain", "generate", "insights").
+
+    Yields the Lease. Streaming endpoints pass it to ``release_after`` so the slot is held until the
+    stream ends; otherwise it is released when the request finishes. Sync, so the SQLite backend
+    runs in the threadpool rather than on the event loop.
+    """
+    def dependency(current: StudentPrincipal = Depends(get_current_student)) -> Iterator[Lease | None]:
+        if not settings.rate_limit_enabled:
+            yield None
+            return
+        try:
+            lease = LIMITER.acquire(current.id, endpoint_class)
+        except RateLimited as e:
+            REJECTIONS.inc(endpoint_class=endpoint_class, reason=e.reason)
+            detail = ("Bạn gửi yêu cầu quá nhanh, vui lòng thử lại sau ít phút." if e.reason == "rate"
+                      else "Bạn đang có quá nhiều yêu cầu AI chưa hoàn tất, vui lòng đợi.")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=detail,
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+            )
+        try:
+            yield lease
+        finally:
+            if not lease.held_by_response:
+                lease.release()
+
+    return dependency
+
+
+def release_after(events: AsyncIterator[str], lease: Lease | None) -> AsyncIterator[str]:
+    """Hand ``lease`` to a streaming body: released when the stream ends or the client leaves,
+    not when the endpoint returns."""
+    if lease is None:
+        return events
+    lease.held_by_response = True
+    return _released_at_end(events, lease)
+
+
+async def _released_at_end(events: AsyncIterator[str], lease: Lease) -> AsyncIterator[str]:
+    try:
+        async for ev in events:
+            yield ev
+    finally:
+        lease.release()
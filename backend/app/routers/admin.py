@@ -7,7 +7,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_
 
-from ..database import get_db
+from ..database import get_read_db
 from ..models import Admin, Student, DiagnosticResult, Performance, LearningPathItem
 from ..schemas import (
     AdminStudentListItem, 
@@ -30,7 +30,7 @@ CHAPTER_NAMES = {
 
 @router.get("/stats", response_model=AdminStatsResponse)
 def get_platform_stats(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     _admin: Admin = Depends(get_current_admin)
 ):
     """Get overall platform statistics"""
@@ -74,7 +74,7 @@ def get_all_students(
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
     search: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     _admin: Admin = Depends(get_current_admin)
 ):
     """Get list of all students with pagination and search"""
@@ -100,7 +100,7 @@ def get_all_students(
 @router.get("/students/{student_id}", response_model=AdminStudentListItem)
 def get_student_details(
     student_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     _admin: Admin = Depends(get_current_admin)
 ):
     """Get detailed information about a specific student"""
@@ -117,7 +117,7 @@ def get_student_details(
 @router.get("/students/{student_id}/progress", response_model=AdminStudentProgressResponse)
 def get_student_progress(
     student_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     _admin: Admin = Depends(get_current_admin)
 ):
     """Get progress overview for a specific student"""
@@ -184,7 +184,7 @@ def get_student_progress(
 @router.get("/students/{student_id}/diagnostic")
 def get_student_diagnostic(
     student_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     _admin: Admin = Depends(get_current_admin)
 ):
     """Get diagnostic test results for a specific student"""
@@ -230,7 +230,7 @@ def get_student_exercises(
     student_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     _admin: Admin = Depends(get_current_admin)
 ):
     """Get exercise submissions for a specific student"""
@@ -10,7 +10,7 @@ from sqlalchemy.orm import Session
 from ..database import get_db
 from ..models import Admin
 from ..schemas import AdminToken, AdminRead
-from ..security import verify_password, create_access_token
+from ..security import PasswordHasherBusy, verify_password_async, create_access_token
 from ..dependencies import get_current_admin
 from ..config import settings
 
@@ -18,7 +18,7 @@ router = APIRouter(prefix="/admin/auth", tags=["admin-auth"])
 
 
 @router.post("/login", response_model=AdminToken)
-def admin_login(
+async def admin_login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db),
 ):
@@ -28,8 +28,17 @@ def admin_login(
     """
     # Find admin by email
     admin = db.query(Admin).filter(Admin.email == form_data.username).first()
-    
-    if not admin or not verify_password(form_data.password, admin.password_hash):
+    # Hand the connection back while bcrypt runs (see auth.register)
+    db.close()
+    try:
+        valid = admin is not None and await verify_password_async(form_data.password, admin.password_hash)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-ins right now, please retry in a moment",
+            headers={"Retry-After": "1"},
+        )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -38,14 +47,16 @@ def admin_login(
     
     # Update last login
     from datetime import datetime
+    db.add(admin)
     admin.last_login = datetime.utcnow()
     db.commit()
     
     # Create token with user_type="admin"
     access_token = create_access_token(
-        subject=admin.email,
+        subject=admin.id,
         expires_delta=timedelta(hours=24),
-        user_type="admin"
+        user_type="admin",
+        token_version=admin.token_version or 0,
     )
     
     return {
@@ -55,6 +66,16 @@ def admin_login(
     }
 
 
+@router.post("/logout-all", status_code=status.HTTP_204_NO_CONTENT)
+def admin_logout_all(
+    current_admin: Admin = Depends(get_current_admin),
+    db: Session = Depends(get_db),
+):
+    """Revoke every access token issued to the current admin so far"""
+    current_admin.token_version = (current_admin.token_version or 0) + 1
+    db.commit()
+
+
 @router.get("/me", response_model=AdminRead)
 def get_admin_profile(
     current_admin: Admin = Depends(get_current_admin),
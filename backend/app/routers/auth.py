@@ -3,46 +3,89 @@ from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_db
+from ..database import get_async_db
 from ..models import Student
 from ..schemas import StudentCreate, StudentRead, Token
-from ..security import hash_password, verify_password, create_access_token
+from ..security import PasswordHasherBusy, hash_password_async, verify_password_async, create_access_token
 from ..config import settings
+from ..dependencies import get_current_student
+from ..principals import PRINCIPALS, StudentPrincipal
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-ins right now, please retry in a moment",
+        headers={"Retry-After": "1"},
+    )
+
+
 @router.post("/register", response_model=StudentRead)
-def register(payload: StudentCreate, db: Session = Depends(get_db)):
+async def register(payload: StudentCreate, db: AsyncSession = Depends(get_async_db)):
     email = payload.email.lower().strip()
-    existing: Optional[Student] = db.query(Student).filter(Student.email == email).first()
+    existing: Optional[Student] = (await db.execute(select(Student).where(Student.email == email))).scalars().first()
     if existing:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
 
+    # Hand the connection back while bcrypt runs: a login storm would otherwise hold the whole
+    # pool idle and starve every other route
+    await db.close()
+    try:
+        password_hash = await hash_password_async(payload.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     student = Student(
         email=email,
-        password_hash=hash_password(payload.password),
+        password_hash=password_hash,
         full_name=payload.full_name,
     )
     db.add(student)
-    db.commit()
-    db.refresh(student)
+    await db.commit()
+    await db.refresh(student)
     return student
 
 
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     """
     Student login endpoint.
     For admin login, use /admin/auth/login
     """
     # OAuth2PasswordRequestForm uses 'username' field; we treat it as email
     email = form_data.username.lower().strip()
-    student: Optional[Student] = db.query(Student).filter(Student.email == email).first()
-    if not student or not verify_password(form_data.password, student.password_hash):
+    student: Optional[Student] = (await db.execute(select(Student).where(Student.email == email))).scalars().first()
+    await db.close()  # loaded attributes stay readable; see register
+    try:
+        valid = student is not None and await verify_password_async(form_data.password, student.password_hash)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
 
-    token = create_access_token(student.email, settings.token_expire_delta, user_type="student")
+    token = create_access_token(
+        student.id, settings.token_expire_delta, user_type="student", token_version=student.token_version or 0
+    )
     return Token(access_token=token, user_type="student")
+
+
+@router.post("/logout-all", status_code=status.HTTP_204_NO_CONTENT)
+async def logout_all(
+    current: StudentPrincipal = Depends(get_current_student),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Revoke every access token issued to the current student so far (all devices).
+
+    Takes effect at once in this worker. Other workers keep accepting a token they have cached
+    (app/principals.py) until its entry expires, i.e. for up to PRINCIPAL_CACHE_TTL_SECONDS (60 s).
+    """
+    student = await db.get(Student, current.id)
+    if student is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Student not found")
+    student.token_version = (student.token_version or 0) + 1
+    await db.commit()
+    PRINCIPALS.invalidate(student.id)
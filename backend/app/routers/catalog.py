@@ -4,7 +4,7 @@ from typing import List
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
-from ..database import get_db
+from ..database import get_read_db
 from ..models import Topic, LearningUnit
 from ..schemas import TopicRead, LearningUnitRead
 
@@ -12,13 +12,13 @@ router = APIRouter(prefix="/catalog", tags=["catalog"])
 
 
 @router.get("/topics", response_model=List[TopicRead])
-def list_topics(db: Session = Depends(get_db)):
+def list_topics(db: Session = Depends(get_read_db)):
     topics = db.query(Topic).order_by(Topic.order_index.asc(), Topic.id.asc()).all()
     return topics
 
 
 @router.get("/topics/{topic_id}/units", response_model=List[LearningUnitRead])
-def list_units(topic_id: int, db: Session = Depends(get_db)):
+def list_units(topic_id: int, db: Session = Depends(get_read_db)):
     units = (
         db.query(LearningUnit)
         .filter(LearningUnit.topic_id == topic_id)
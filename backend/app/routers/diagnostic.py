@@ -2,21 +2,24 @@ from __future__ import annotations
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_db
-from ..models import Student, DiagnosticResult, Topic
+from ..database import get_async_db
+from ..mastery import MASTERY, rebuild_mastery_async
+from ..models import DiagnosticResult, Topic
 from ..schemas import DiagnosticSubmission, DiagnosticResultRead
 from ..dependencies import get_current_student
+from ..principals import StudentPrincipal
 
 router = APIRouter(prefix="/diagnostic", tags=["diagnostic"])
 
 
 @router.post("/submit", response_model=List[DiagnosticResultRead])
-def submit_diagnostic(
+async def submit_diagnostic(
     payload: DiagnosticSubmission,
-    db: Session = Depends(get_db),
-    current: Student = Depends(get_current_student),
+    db: AsyncSession = Depends(get_async_db),
+    current: StudentPrincipal = Depends(get_current_student),
 ):
     if not payload.items:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No items provided")
@@ -38,10 +41,11 @@ def submit_diagnostic(
         percent = (it.correct / it.total_questions) * 100.0 if it.total_questions > 0 else 0.0
 
         existing: Optional[DiagnosticResult] = (
-            db.query(DiagnosticResult)
-            .filter(DiagnosticResult.student_id == current.id, DiagnosticResult.topic_id == it.topic_id)
-            .first()
-        )
+            await db.execute(
+                select(DiagnosticResult)
+                .where(DiagnosticResult.student_id == current.id, DiagnosticResult.topic_id == it.topic_id)
+            )
+        ).scalars().first()
         if existing:
             existing.total_questions = it.total_questions
             existing.correct = it.correct
@@ -59,21 +63,25 @@ def submit_diagnostic(
             db.add(dr)
             results.append(dr)
 
-    db.commit()
+    # Re-derive the mastery snapshot in the same transaction
+    mastery = await rebuild_mastery_async(db, current.id)
+    await db.commit()
+    MASTERY.put(current.id, mastery)
     for r in results:
-        db.refresh(r)
+        await db.refresh(r)
     return results
 
 
 @router.get("/results", response_model=List[DiagnosticResultRead])
-def get_results(
-    db: Session = Depends(get_db),
-    current: Student = Depends(get_current_student),
+async def get_results(
+    db: AsyncSession = Depends(get_async_db),
+    current: StudentPrincipal = Depends(get_current_student),
 ):
     res = (
-        db.query(DiagnosticResult)
-        .filter(DiagnosticResult.student_id == current.id)
-        .order_by(DiagnosticResult.created_at.desc())
-        .all()
-    )
+        await db.execute(
+            select(DiagnosticResult)
+            .where(DiagnosticResult.student_id == current.id)
+            .order_by(DiagnosticResult.created_at.desc())
+        )
+    ).scalars().all()
     return res
@@ -4,53 +4,23 @@ from typing import List, Optional
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
-from ..database import get_db
-from ..models import Student, DiagnosticResult, LearningPathItem
+from ..database import get_db, get_read_db
+from ..mastery import get_mastery
+from ..models import LearningPathItem
 from ..schemas import LearningPathItemRead
 from ..dependencies import get_current_student
+from ..principals import StudentPrincipal
 
 router = APIRouter(prefix="/learning-path", tags=["learning-path"])
 
-# Chapter names mapping (consistent with diagnostic and analysis)
-CHAPTER_NAMES = {
-    1: "Chương I: Mệnh đề và Tập hợp",
-    2: "Chương II: Bất phương trình",
-    3: "Chương III: Góc lượng giác và Hệ thức lượng",
-    4: "Chương IV: Vectơ",
-    5: "Chương V: Phương trình đường thẳng và đường tròn",
-}
-
-
-def _prioritize_chapters(db: Session, student_id: int) -> List[int]:
-    """
-    Prioritize chapters (1-5) based on diagnostic results.
-    Lower percent = higher priority (study weakest first).
-    """
-    results = (
-        db.query(DiagnosticResult)
-        .filter(DiagnosticResult.student_id == student_id)
-        .all()
-    )
-    
-    if results:
-        # Calculate priority: lower percent = higher priority
-        scored = []
-        for dr in results:
-            # Simple priority: study weakest chapters first
-            priority = 100.0 - dr.percent
-            scored.append((dr.topic_id, priority))  # topic_id is actually chapter_id 1-5
-        
-        scored.sort(key=lambda x: x[1], reverse=True)
-        return [chapter_id for chapter_id, _ in scored]
-    
-    # Fallback: default order 1-5
-    return [1, 2, 3, 4, 5]
+# Default chapter order (1-5) for students without diagnostic results
+DEFAULT_CHAPTER_ORDER = [1, 2, 3, 4, 5]
 
 
 @router.post("/generate", response_model=List[LearningPathItemRead])
 def generate_learning_path(
     db: Session = Depends(get_db),
-    current: Student = Depends(get_current_student),
+    current: StudentPrincipal = Depends(get_current_student),
 ):
     """
     Generate learning path based on diagnostic results.
@@ -59,7 +29,8 @@ def generate_learning_path(
     - Next 2 chapters → focus phase
     - Strongest chapter → review phase
     """
-    chapter_ids = _prioritize_chapters(db, current.id)
+    # Weakest chapters first (mastery snapshot priority order)
+    chapter_ids = get_mastery(db, current.id).priority or DEFAULT_CHAPTER_ORDER
     
     phases = []
     # Foundation: 2 weakest chapters
@@ -102,8 +73,8 @@ def generate_learning_path(
 
 @router.get("", response_model=List[LearningPathItemRead])
 def list_learning_path(
-    db: Session = Depends(get_db),
-    current: Student = Depends(get_current_student),
+    db: Session = Depends(get_read_db),
+    current: StudentPrincipal = Depends(get_current_student),
 ):
     items = (
         db.query(LearningPathItem)
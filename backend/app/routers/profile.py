@@ -8,12 +8,13 @@ from ..database import get_db
 from ..models import Student, Availability
 from ..schemas import StudentRead, StudentUpdate, AvailabilityIn, AvailabilityRead
 from ..dependencies import get_current_student
+from ..principals import PRINCIPALS, StudentPrincipal
 
 router = APIRouter(prefix="/students", tags=["students"])
 
 
 @router.get("/me", response_model=StudentRead)
-def get_me(current: Student = Depends(get_current_student)):
+def get_me(current: StudentPrincipal = Depends(get_current_student)):
     return current
 
 
@@ -21,26 +22,30 @@ def get_me(current: Student = Depends(get_current_student)):
 def update_me(
     payload: StudentUpdate,
     db: Session = Depends(get_db),
-    current: Student = Depends(get_current_student),
+    current: StudentPrincipal = Depends(get_current_student),
 ):
+    student = db.get(Student, current.id)
+    if student is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Student not found")
     if payload.full_name is not None:
-        current.full_name = payload.full_name
+        student.full_name = payload.full_name
     if payload.school is not None:
-        current.school = payload.school
+        student.school = payload.school
     if payload.grade is not None:
-        current.grade = payload.grade
+        student.grade = payload.grade
     if payload.goal_score is not None:
-        current.goal_score = payload.goal_score
+        student.goal_score = payload.goal_score
 
-    db.add(current)
+    db.add(student)
     db.commit()
-    db.refresh(current)
-    return current
+    db.refresh(student)
+    PRINCIPALS.invalidate(student.id)
+    return student
 
 
 @router.get("/me/availability", response_model=List[AvailabilityRead])
 def get_availability(
-    current: Student = Depends(get_current_student),
+    current: StudentPrincipal = Depends(get_current_student),
     db: Session = Depends(get_db),
 ):
     slots = db.query(Availability).filter(Availability.student_id == current.id).all()
@@ -50,7 +55,7 @@ def get_availability(
 @router.put("/me/availability", response_model=List[AvailabilityRead])
 def set_availability(
     payload: List[AvailabilityIn],
-    current: Student = Depends(get_current_student),
+    current: StudentPrincipal = Depends(get_current_student),
     db: Session = Depends(get_db),
 ):
     # Replace existing availability with the provided list
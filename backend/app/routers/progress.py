@@ -2,30 +2,22 @@ from __future__ import annotations
 from typing import List, Dict
 
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_db
-from ..models import Student, DiagnosticResult, Performance
+from ..database import get_async_read_db
+from ..mastery import get_mastery_async
+from ..models import StudentProgress, performance_counts
 from ..schemas import ProgressOverview
 from ..dependencies import get_current_student
+from ..principals import StudentPrincipal
 
 router = APIRouter(prefix="/progress", tags=["progress"])
 
-# Chapter names mapping (consistent with other routers)
-CHAPTER_NAMES = {
-    1: "Chương I: Mệnh đề và Tập hợp",
-    2: "Chương II: Bất phương trình",
-    3: "Chương III: Góc lượng giác và Hệ thức lượng",
-    4: "Chương IV: Vectơ",
-    5: "Chương V: Phương trình đường thẳng và đường tròn",
-}
-
 
 @router.get("/overview", response_model=ProgressOverview)
-def progress_overview(
-    db: Session = Depends(get_db),
-    current: Student = Depends(get_current_student),
+async def progress_overview(
+    db: AsyncSession = Depends(get_async_read_db),
+    current: StudentPrincipal = Depends(get_current_student),
 ):
     """
     Progress overview dựa trên:
@@ -35,32 +27,22 @@ def progress_overview(
     Không còn dựa vào schedule/sessions nữa.
     """
     
-    # Get diagnostic results (chapter mastery)
-    diagnostic_results = (
-        db.query(DiagnosticResult)
-        .filter(DiagnosticResult.student_id == current.id)
-        .all()
-    )
-    
-    # Calculate topics mastered and weak topics
-    topics_mastered = sum(1 for dr in diagnostic_results if dr.percent >= 75)
-    weak_topics = sum(1 for dr in diagnostic_results if dr.percent < 60)
+    # Chapter mastery (topics mastered / weak topics counted in the snapshot)
+    mastery = await get_mastery_async(db, current.id)
     
-    # Get exercise statistics
-    # Note: Performance model doesn't have is_correct field, it uses score
-    # We'll count total exercises attempted
-    total_exercises = db.query(func.count(Performance.id))\
-        .filter(Performance.student_id == current.id).scalar() or 0
-    
-    # Count exercises with good scores (>= 70%)
-    correct_exercises = db.query(func.count(Performance.id))\
-        .filter(Performance.student_id == current.id, Performance.score >= 70.0).scalar() or 0
+    # Exercise statistics from the per-student counters (bumped on every Performance insert;
+    # score >= PASSING_SCORE counts as correct). No row (student from before the counters, until
+    # the startup upgrade or scripts/rebuild_progress_counters.py backfills it): count the table.
+    counters = await db.get(StudentProgress, current.id)
+    if counters is not None:
+        total_exercises, correct_exercises = counters.total_exercises, counters.correct_exercises
+    else:
+        total_exercises, correct_exercises = (await db.execute(performance_counts(current.id))).one()
     
     # Calculate completion based on:
     # - Has taken diagnostic test (20%)
     # - Number of exercises completed (80%)
-    has_diagnostic = len(diagnostic_results) > 0
-    diagnostic_weight = 20.0 if has_diagnostic else 0.0
+    diagnostic_weight = 20.0 if mastery.has_diagnostic else 0.0
     
     # Exercise weight: up to 80% based on number completed (target: 100 exercises)
     exercise_weight = min(80.0, (total_exercises / 100) * 80.0)
@@ -73,14 +55,14 @@ def progress_overview(
     else:
         discipline_score = 100.0  # Default if no exercises yet
     
-    # Build mastery radar from diagnostic results
+    # Build mastery radar from the snapshot's chapters
     radar: List[Dict] = [
         {
-            "topic_id": dr.topic_id,
-            "topic_name": CHAPTER_NAMES.get(dr.topic_id, f"Chương {dr.topic_id}"),
-            "percent": round(dr.percent, 2)
+            "topic_id": c["topic_id"],
+            "topic_name": c["topic_name"],
+            "percent": round(c["percent"], 2)
         } 
-        for dr in diagnostic_results
+        for c in mastery.chapters
     ]
     
     # Sort by topic_id for consistent display
@@ -92,6 +74,6 @@ def progress_overview(
         completion_percent=completion_percent,
         discipline_score=discipline_score,
         mastery_radar=radar,
-        topics_mastered=topics_mastered,
-        weak_topics=weak_topics,
+        topics_mastered=mastery.topics_mastered,
+        weak_topics=mastery.weak_topics,
     )
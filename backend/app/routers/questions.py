@@ -3,10 +3,11 @@ import json
 from typing import List, Dict
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_db
-from ..models import Student, Question, Performance
+from ..database import get_async_db
+from ..models import Question, Performance
 from ..schemas import (
     QuestionsResponse,
     QuestionReadLight,
@@ -15,24 +16,26 @@ from ..schemas import (
     QuizItemResult,
 )
 from ..dependencies import get_current_student
+from ..principals import StudentPrincipal
 
 router = APIRouter(prefix="/questions", tags=["questions"])
 
 
 @router.get("", response_model=QuestionsResponse)
-def get_questions(
+async def get_questions(
     topic_id: int = Query(..., ge=1),
     limit: int = Query(default=10, ge=1, le=50),
-    db: Session = Depends(get_db),
-    current: Student = Depends(get_current_student),
+    db: AsyncSession = Depends(get_async_db),
+    current: StudentPrincipal = Depends(get_current_student),
 ):
     rows: List[Question] = (
-        db.query(Question)
-        .filter(Question.topic_id == topic_id)
-        .order_by(Question.id.asc())
-        .limit(limit)
-        .all()
-    )
+        await db.execute(
+            select(Question)
+            .where(Question.topic_id == topic_id)
+            .order_by(Question.id.asc())
+            .limit(limit)
+        )
+    ).scalars().all()
     questions: List[QuestionReadLight] = []
     for q in rows:
         try:
@@ -52,17 +55,19 @@ def get_questions(
 
 
 @router.post("/quiz/submit", response_model=QuizSubmitResult)
-def submit_quiz(
+async def submit_quiz(
     payload: QuizSubmitIn,
-    db: Session = Depends(get_db),
-    current: Student = Depends(get_current_student),
+    db: AsyncSession = Depends(get_async_db),
+    current: StudentPrincipal = Depends(get_current_student),
 ):
     # Fetch questions by ids from provided answers
     qids = [a.question_id for a in payload.answers]
     if not qids:
         raise HTTPException(status_code=400, detail="No answers provided")
 
-    rows: Dict[int, Question] = {q.id: q for q in db.query(Question).filter(Question.id.in_(qids)).all()}
+    rows: Dict[int, Question] = {
+        q.id: q for q in (await db.execute(select(Question).where(Question.id.in_(qids)))).scalars()
+    }
 
     details: List[QuizItemResult] = []
     correct_count = 0
@@ -93,7 +98,7 @@ def submit_quiz(
         score=score_percent,
     )
     db.add(perf)
-    db.commit()
+    await db.commit()
 
     return QuizSubmitResult(
         topic_id=payload.topic_id,
@@ -6,9 +6,10 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from ..database import get_db
-from ..models import Student, Schedule, SessionLog
+from ..models import Schedule, SessionLog
 from ..schemas import ScheduleRead, SessionCompleteIn
 from ..dependencies import get_current_student
+from ..principals import StudentPrincipal
 
 router = APIRouter(prefix="/sessions", tags=["sessions"])
 
@@ -16,7 +17,7 @@ router = APIRouter(prefix="/sessions", tags=["sessions"])
 @router.get("/today", response_model=List[ScheduleRead])
 def sessions_today(
     db: Session = Depends(get_db),
-    current: Student = Depends(get_current_student),
+    current: StudentPrincipal = Depends(get_current_student),
 ):
     today = date.today()
     items = (
@@ -33,7 +34,7 @@ def complete_session(
     schedule_id: int,
     payload: SessionCompleteIn,
     db: Session = Depends(get_db),
-    current: Student = Depends(get_current_student),
+    current: StudentPrincipal = Depends(get_current_student),
 ):
     sch: Optional[Schedule] = (
         db.query(Schedule)
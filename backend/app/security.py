@@ -1,15 +1,42 @@
 from __future__ import annotations
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Optional, TypeVar
 
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 
 from .config import settings
+from . import metrics
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 ALGORITHM = "HS256"
 
+T = TypeVar("T")
+
+# bcrypt takes 100-300 ms of CPU per call. The async variants run it on a dedicated pool
+# (bcrypt releases the GIL), so a login storm queues here instead of filling the request
+# threadpool every other endpoint shares. At most PASSWORD_HASH_QUEUE calls wait behind the
+# busy workers; past that PasswordHasherBusy is raised at once and the routers answer 503.
+_HASH_WORKERS = settings.password_hash_workers or os.cpu_count() or 1
+_hash_pool = ThreadPoolExecutor(max_workers=_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = threading.BoundedSemaphore(_HASH_WORKERS + settings.password_hash_queue)
+_pending = [0]
+_pending_lock = threading.Lock()
+
+HASH_REJECTIONS = metrics.Counter("password_hash_rejections_total", "Password hash/verify calls refused because the pool was full")
+metrics.Collector(
+    "password_hash_pending", "Password hash/verify calls running or queued", "gauge", (),
+    lambda: {(): float(_pending[0])},
+)
+
+
+class PasswordHasherBusy(Exception):
+    """The password hashing pool and its queue are full; retry shortly."""
+
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -19,38 +46,71 @@ def verify_password(password: str, password_hash: str) -> bool:
     return pwd_context.verify(password, password_hash)
 
 
-def create_access_token(subject: str, expires_delta, user_type: str = "student") -> str:
+def _release_slot(_future) -> None:
+    with _pending_lock:
+        _pending[0] -= 1
+    _hash_slots.release()
+
+
+async def _offload(fn: Callable[..., T], *args) -> T:
+    if not _hash_slots.acquire(blocking=False):
+        HASH_REJECTIONS.inc()
+        raise PasswordHasherBusy()
+    with _pending_lock:
+        _pending[0] += 1
+    future = _hash_pool.submit(fn, *args)
+    # Freed when the worker is done, not when the caller stops waiting (client gone)
+    future.add_done_callback(_release_slot)
+    return await asyncio.wrap_future(future)
+
+
+async def hash_password_async(password: str) -> str:
+    """hash_password on the bounded bcrypt pool; raises PasswordHasherBusy when it is saturated."""
+    return await _offload(pwd_context.hash, password)
+
+
+async def verify_password_async(password: str, password_hash: str) -> bool:
+    """verify_password on the bounded bcrypt pool; raises PasswordHasherBusy when it is saturated."""
+    return await _offload(pwd_context.verify, password, password_hash)
+
+
+def create_access_token(subject, expires_delta, user_type: str = "student", token_version: Optional[int] = None) -> str:
     """
     Create JWT access token.
     
     Args:
-        subject: User email
+        subject: User id (tokens issued before ids were used carry the email)
         expires_delta: Token expiration time
         user_type: Either "student" or "admin"
+        token_version: The user's token_version; bumping it revokes every token issued before
     """
     to_encode = {
-        "sub": subject,
+        "sub": str(subject),
         "user_type": user_type,
         "exp": datetime.utcnow() + expires_delta,
         "scope": "access_token",
     }
+    if token_version is not None:
+        to_encode["ver"] = token_version
     return jwt.encode(to_encode, settings.secret_key, algorithm=ALGORITHM)
 
 
-def decode_access_token(token: str) -> Optional[tuple[str, str]]:
-    """
-    Decode access token and return (email, user_type) tuple.
-    
-    Returns:
-        (email, user_type) tuple or None if token is invalid
-        user_type will be either "student" or "admin"
-    """
+def decode_access_claims(token: str) -> Optional[dict]:
+    """Verified claims of an access token, or None if it is invalid, expired or not an access token."""
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[ALGORITHM])
-        if payload.get("scope") != "access_token":
-            return None
-        email = payload.get("sub")
-        user_type = payload.get("user_type", "student")
-        return (email, user_type) if email else None
     except JWTError:
         return None
+    if payload.get("scope") != "access_token" or not payload.get("sub"):
+        return None
+    return payload
+
+
+def token_subject(claims: dict) -> tuple[Optional[int], Optional[str]]:
+    """
+    (user id, None) for id tokens, (None, email) for the older email-subject tokens.
+    """
+    sub = str(claims["sub"])
+    if sub.isdigit():
+        return int(sub), None
+    return None, sub
@@ -1,101 +1,198 @@
 from __future__ import annotations
+import contextlib
+import hashlib
 import json
+import os
+import tempfile
+from sqlalchemy import insert, select, text
 from sqlalchemy.orm import Session
-from .models import Topic, LearningUnit, Question
+from .models import AppMeta, Topic, LearningUnit, Question
 
+# Seed topics for Toán 10 (matched with artifacts/input files)
+# Format: (name, difficulty, is_core, order_index)
+TOPICS = [
+    # Chương I: Mệnh đề - Tập hợp
+    ("Mệnh đề", 3, True, 1),
+    ("Tập hợp", 3, True, 2),
+    ("Mệnh đề – Tập hợp", 3, True, 3),
 
-def ensure_seed(db: Session) -> None:
-    # Seed topics for Toán 10 (matched with artifacts/input files)
-    # Format: (name, difficulty, is_core, order_index)
-    topics = [
-        # Chương I: Mệnh đề - Tập hợp
-        ("Mệnh đề", 3, True, 1),
-        ("Tập hợp", 3, True, 2),
-        ("Mệnh đề – Tập hợp", 3, True, 3),
-        
-        # Chương II: Bất phương trình
-        ("Bất phương trình", 4, True, 4),
-        ("Hệ bất phương trình", 4, True, 5),
-        
-        # Chương III: Hệ thức lượng giác
-        ("Giá trị lượng giác", 4, True, 6),
-        ("Định lý côsin", 4, True, 7),
-        ("Định lý sin", 4, True, 8),
-        ("Giải tam giác", 4, True, 9),
-        
-        # Chương IV: Vectơ
-        ("Khái niệm vectơ", 3, True, 10),
-        ("Tổng và hiệu vectơ", 3, True, 11),
-        ("Tích vectơ với số", 3, True, 12),
-        ("Tích vô hướng", 4, True, 13),
-        ("Tọa độ vectơ", 4, True, 14),
-        ("Vectơ", 3, True, 15),
-        
-        # Chương V: Thống kê
-        ("Số gần đúng và sai số", 2, True, 16),
-        ("Đo xu thế trung tâm", 2, True, 17),
-        ("Các số đặc trưng", 3, True, 18),
-        ("Thống kê – Xác suất", 2, True, 19),
-        
-        # Fallback topics
-        ("Hàm số – Đồ thị", 3, False, 20),
-        ("Giá trị tuyệt đối", 3, False, 21),
+    # Chương II: Bất phương trình
+    ("Bất phương trình", 4, True, 4),
+    ("Hệ bất phương trình", 4, True, 5),
+
+    # Chương III: Hệ thức lượng giác
+    ("Giá trị lượng giác", 4, True, 6),
+    ("Định lý côsin", 4, True, 7),
+    ("Định lý sin", 4, True, 8),
+    ("Giải tam giác", 4, True, 9),
+
+    # Chương IV: Vectơ
+    ("Khái niệm vectơ", 3, True, 10),
+    ("Tổng và hiệu vectơ", 3, True, 11),
+    ("Tích vectơ với số", 3, True, 12),
+    ("Tích vô hướng", 4, True, 13),
+    ("Tọa độ vectơ", 4, True, 14),
+    ("Vectơ", 3, True, 15),
+
+    # Chương V: Thống kê
+    ("Số gần đúng và sai số", 2, True, 16),
+    ("Đo xu thế trung tâm", 2, True, 17),
+    ("Các số đặc trưng", 3, True, 18),
+    ("Thống kê – Xác suất", 2, True, 19),
+
+    # Fallback topics
+    ("Hàm số – Đồ thị", 3, False, 20),
+    ("Giá trị tuyệt đối", 3, False, 21),
+]
+
+# Sample learning units per topic (minimal for demo): (type, title suffix, duration_min)
+UNITS = [
+    ("theory", "Lý thuyết 1", 45),
+    ("example", "Ví dụ mẫu", 30),
+    ("exercise", "Bài tập mức 1", 45),
+]
+
+# Simple question bank per topic: (text suffix, options, correct_index, difficulty)
+QUESTIONS = [
+    ("Câu hỏi 1 (cơ bản)", ["A", "B", "C", "D"], 1, 2),
+    ("Câu hỏi 2 (trung bình)", ["A", "B", "C", "D"], 2, 3),
+]
+
+SEED_VERSION_KEY = "seed_version"
+# Derived from the seed data, so editing the lists above re-runs the seed on the next start
+SEED_VERSION = hashlib.sha1(
+    json.dumps([TOPICS, UNITS, QUESTIONS], ensure_ascii=False).encode("utf-8")
+).hexdigest()[:16]
+SEED_LOCK_NAME = "ai_coach_seed"
+SEED_LOCK_KEY = int(hashlib.sha1(SEED_LOCK_NAME.encode("utf-8")).hexdigest()[:15], 16)  # pg bigint key
+
+
+def _stored_version(db: Session) -> str | None:
+    meta = db.get(AppMeta, SEED_VERSION_KEY)
+    return meta.value if meta is not None else None
+
+
+def _lock_path(db: Session) -> str:
+    url = db.get_bind().url
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+        return os.path.abspath(url.database) + ".seed.lock"
+    digest = hashlib.sha1(url.render_as_string(hide_password=True).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"ai_coach_seed_{digest}.lock")
+
+
+@contextlib.contextmanager
+def _file_lock(path: str):
+    """Exclusive advisory lock on ``path``: only one worker on this host seeds at a time."""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after ~10 s; keep waiting for the seeding worker
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextlib.contextmanager
+def _seed_lock(db: Session):
+    """Only one worker seeds at a time.
+
+    SQL Server and PostgreSQL: a lock in the database, held by ``db``'s transaction, so it
+    covers workers on every host and is released by the commit or rollback that ends the seed.
+    Other backends (SQLite is a local file): a file lock next to the database.
+    """
+    backend = db.get_bind().url.get_backend_name()
+    if backend == "mssql":
+        status = db.execute(text(
+            "SET NOCOUNT ON; DECLARE @status int; "
+            "EXEC @status = sp_getapplock @Resource = :name, @LockMode = 'Exclusive', "
+            "@LockOwner = 'Transaction', @LockTimeout = -1; SELECT @status"
+        ), {"name": SEED_LOCK_NAME}).scalar()
+        if status is None or status < 0:
+            raise RuntimeError(f"sp_getapplock({SEED_LOCK_NAME}) failed with status {status}")
+        yield
+    elif backend == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SEED_LOCK_KEY})
+        yield
+    else:
+        with _file_lock(_lock_path(db)):
+            yield
+
+
+def _apply_seed(db: Session) -> None:
+    """Insert whatever seed rows are missing, in bulk, and record SEED_VERSION (one transaction)."""
+    existing = set(db.scalars(select(Topic.name)))
+    new_topics = [
+        {"name": name, "difficulty": difficulty, "is_core": is_core, "order_index": order_index}
+        for name, difficulty, is_core, order_index in TOPICS
+        if name not in existing
+    ]
+    if new_topics:
+        db.execute(insert(Topic), new_topics)
+
+    topics = db.execute(select(Topic.id, Topic.name)).all()
+    with_units = set(db.scalars(select(LearningUnit.topic_id).distinct()))
+    with_questions = set(db.scalars(select(Question.topic_id).distinct()))
+
+    units = [
+        {"topic_id": tid, "type": utype, "title": f"{name} - {suffix}", "duration_min": duration}
+        for tid, name in topics if tid not in with_units
+        for utype, suffix, duration in UNITS
     ]
-    
+    if units:
+        db.execute(insert(LearningUnit), units)
+    questions = [
+        {
+            "topic_id": tid,
+            "text": f"{name}: {suffix}",
+            "options_json": json.dumps(options, ensure_ascii=False),
+            "correct_index": correct_index,
+            "difficulty": difficulty,
+        }
+        for tid, name in topics if tid not in with_questions
+        for suffix, options, correct_index, difficulty in QUESTIONS
+    ]
+    if questions:
+        db.execute(insert(Question), questions)
+
+    meta = db.get(AppMeta, SEED_VERSION_KEY)
+    if meta is None:
+        db.add(AppMeta(key=SEED_VERSION_KEY, value=SEED_VERSION))
+    else:
+        meta.value = SEED_VERSION
+    db.commit()
+
+
+def ensure_seed(db: Session) -> None:
+    """Seed topics, learning units and the question bank unless SEED_VERSION is already loaded.
+
+    The usual start is a single primary-key lookup. Otherwise one worker at a time (_seed_lock)
+    re-checks the version and inserts the missing rows; workers that waited find it current.
+    """
+    if _stored_version(db) == SEED_VERSION:
+        return
+    db.rollback()  # end the read transaction before waiting on the lock
     try:
-        existing = {t.name: t for t in db.query(Topic).all()}
-        for name, difficulty, is_core, order_index in topics:
-            if name not in existing:
-                t = Topic(name=name, difficulty=difficulty, is_core=is_core, order_index=order_index)
-                db.add(t)
-        db.commit()
+        with _seed_lock(db):
+            if _stored_version(db) == SEED_VERSION:
+                db.rollback()  # releases a database lock
+                return
+            _apply_seed(db)
     except Exception as e:
         db.rollback()
-        # Silently ignore - topics already exist in database
-        pass
-
-    # Seed sample learning units per topic (minimal for demo)
-    for topic in db.query(Topic).all():
-        units = db.query(LearningUnit).filter(LearningUnit.topic_id == topic.id).all()
-        if units:
-            continue
-        base_title = topic.name
-        sample_units = [
-            ("theory", f"{base_title} - Lý thuyết 1", 45),
-            ("example", f"{base_title} - Ví dụ mẫu", 30),
-            ("exercise", f"{base_title} - Bài tập mức 1", 45),
-        ]
-        for utype, title, duration in sample_units:
-            db.add(LearningUnit(topic_id=topic.id, type=utype, title=title, duration_min=duration))
-    db.commit()
-
-    # Seed simple question bank per topic if empty
-    for topic in db.query(Topic).all():
-        has_q = db.query(Question).filter(Question.topic_id == topic.id).first()
-        if has_q:
-            continue
-        sample_questions = [
-            {
-                "text": f"{topic.name}: Câu hỏi 1 (cơ bản)",
-                "options": ["A", "B", "C", "D"],
-                "correct_index": 1,
-                "difficulty": 2,
-            },
-            {
-                "text": f"{topic.name}: Câu hỏi 2 (trung bình)",
-                "options": ["A", "B", "C", "D"],
-                "correct_index": 2,
-                "difficulty": 3,
-            },
-        ]
-        for q in sample_questions:
-            db.add(
-                Question(
-                    topic_id=topic.id,
-                    text=q["text"],
-                    options_json=json.dumps(q["options"], ensure_ascii=False),
-                    correct_index=q["correct_index"],
-                    difficulty=q["difficulty"],
-                )
-            )
-    db.commit()
+        # Leave the version unset so the next start retries
+        print(f"⚠️ Seeding failed: {e}")
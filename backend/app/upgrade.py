@@ -0,0 +1,90 @@
+from __future__ import annotations
+from datetime import datetime
+
+from sqlalchemy import case, exists, func, insert, inspect, literal, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateIndex
+
+from .database import Base
+from .models import PASSING_SCORE, Performance, Student, StudentProgress  # registers every table too
+
+# Startup upgrade of an existing SQLite database (the default dev database, backend/ai_coach.db).
+#
+# create_all only creates tables that are missing; it never changes a table that already exists,
+# not even to add an index. SQL Server databases are upgraded with the scripts in migrations/;
+# SQLite databases get the same changes here, on every start, after create_all. Every step checks
+# before it writes, so a current database costs a few PRAGMA reads, and workers starting together
+# may race harmlessly.
+
+# Columns added to existing tables: (table, column, SQLite column definition). Matches migrations/.
+ADDED_COLUMNS = [
+    ("students", "token_version", "INTEGER NOT NULL DEFAULT 0"),  # 009_add_token_version.sql
+    ("admins", "token_version", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+
+def _add_missing_columns(conn) -> None:
+    inspector = inspect(conn)
+    tables = set(inspector.get_table_names())
+    for table, column, definition in ADDED_COLUMNS:
+        if table not in tables or column in {c["name"] for c in inspector.get_columns(table)}:
+            continue
+        try:
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            print(f"✅ Added {table}.{column}")
+        except OperationalError as e:
+            if "duplicate column" not in str(e).lower():  # another worker added it first
+                raise
+
+
+def _create_missing_indexes(conn) -> None:
+    inspector = inspect(conn)
+    tables = set(inspector.get_table_names())
+    analyze = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        missing = [ix for ix in table.indexes if ix.name not in existing]
+        for index in missing:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+            print(f"✅ Created index {index.name}")
+        if missing:
+            analyze.append(table.name)
+    # Fresh statistics so the planner weighs the new indexes (as after migrations/010)
+    for name in analyze:
+        conn.exec_driver_sql(f"ANALYZE {name}")
+
+
+def _create_missing_progress_counters(conn) -> None:
+    # Students from before student_progress (new ones get their row on insert); like
+    # scripts/rebuild_progress_counters.py, but only for students without a row
+    counts = (
+        select(
+            Student.id,
+            func.count(Performance.id),
+            func.coalesce(func.sum(case((Performance.score >= PASSING_SCORE, 1), else_=0)), 0),
+            literal(datetime.utcnow()),
+        )
+        .outerjoin(Performance, Performance.student_id == Student.id)
+        .where(~exists().where(StudentProgress.student_id == Student.id))
+        .group_by(Student.id)
+    )
+    created = conn.execute(
+        insert(StudentProgress)
+        .from_select(["student_id", "total_exercises", "correct_exercises", "updated_at"], counts)
+        .prefix_with("OR IGNORE")  # a row another worker or request inserted meanwhile
+    ).rowcount
+    if created:
+        print(f"✅ Created progress counters for {created} student(s)")
+
+
+def upgrade_sqlite(bind: Engine) -> None:
+    """Bring an existing SQLite database up to the models; no-op on other backends."""
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as conn:
+        _add_missing_columns(conn)
+        _create_missing_indexes(conn)
+        _create_missing_progress_counters(conn)
@@ -0,0 +1,20 @@
+-- Migration: Add token_version to students and admins
+-- Date: 2026-10-19
+-- Access tokens carry this version; logout-all bumps it to revoke every older token
+-- SQLite databases get the columns from app/upgrade.py on startup
+
+IF COL_LENGTH('students', 'token_version') IS NULL
+BEGIN
+    ALTER TABLE students ADD token_version INT NOT NULL
+        CONSTRAINT DF_students_token_version DEFAULT 0;
+    PRINT 'students.token_version added';
+END
+GO
+
+IF COL_LENGTH('admins', 'token_version') IS NULL
+BEGIN
+    ALTER TABLE admins ADD token_version INT NOT NULL
+        CONSTRAINT DF_admins_token_version DEFAULT 0;
+    PRINT 'admins.token_version added';
+END
+GO
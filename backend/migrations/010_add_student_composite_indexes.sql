@@ -0,0 +1,49 @@
+-- Migration: Composite indexes for per-student access paths
+-- Date: 2026-10-19
+-- Per-student queries seek in index order (checked by scripts/test_query_plans.py)
+-- SQLite databases get the indexes from app/upgrade.py on startup
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'ix_performances_student_taken')
+BEGIN
+    CREATE INDEX ix_performances_student_taken ON performances (student_id, taken_at)
+        INCLUDE (topic_id, score_type, score);
+    PRINT 'ix_performances_student_taken created';
+END
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'ix_performances_student_score')
+BEGIN
+    CREATE INDEX ix_performances_student_score ON performances (student_id, score);
+    PRINT 'ix_performances_student_score created';
+END
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'ix_schedules_student_date_start')
+BEGIN
+    CREATE INDEX ix_schedules_student_date_start ON schedules (student_id, date, start_time)
+        INCLUDE (end_time, topic_id, learning_unit_id, status);
+    PRINT 'ix_schedules_student_date_start created';
+END
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'ix_placement_test_results_student_taken')
+BEGIN
+    CREATE INDEX ix_placement_test_results_student_taken ON placement_test_results (student_id, taken_at DESC);
+    PRINT 'ix_placement_test_results_student_taken created';
+END
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'ix_diagnostic_results_student_created')
+BEGIN
+    CREATE INDEX ix_diagnostic_results_student_created ON diagnostic_results (student_id, created_at);
+    PRINT 'ix_diagnostic_results_student_created created';
+END
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'ix_learning_path_items_student_rank')
+BEGIN
+    CREATE INDEX ix_learning_path_items_student_rank ON learning_path_items (student_id, priority_rank)
+        INCLUDE (topic_id, phase);
+    PRINT 'ix_learning_path_items_student_rank created';
+END
+GO
@@ -0,0 +1,15 @@
+-- Migration: Create app_meta key/value table
+-- Date: 2026-10-19
+-- Holds the loaded seed version (app.seed.SEED_VERSION)
+
+IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'app_meta')
+BEGIN
+    CREATE TABLE app_meta (
+        [key] NVARCHAR(100) NOT NULL,
+        value NVARCHAR(255) NOT NULL,
+        updated_at DATETIME2 NOT NULL DEFAULT GETUTCDATE(),
+        CONSTRAINT PK_app_meta PRIMARY KEY CLUSTERED ([key] ASC)
+    );
+    PRINT 'app_meta table created';
+END
+GO
@@ -0,0 +1,18 @@
+-- Migration: Create student_mastery snapshot table
+-- Date: 2026-10-19
+-- Per-student mastery snapshot derived from diagnostic_results (app/mastery.py)
+
+IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'student_mastery')
+BEGIN
+    CREATE TABLE student_mastery (
+        student_id INT NOT NULL,
+        data NVARCHAR(MAX) NOT NULL,
+        version INT NOT NULL DEFAULT 1,
+        updated_at DATETIME2 NOT NULL DEFAULT GETUTCDATE(),
+        CONSTRAINT PK_student_mastery PRIMARY KEY CLUSTERED (student_id ASC),
+        CONSTRAINT FK_student_mastery_students FOREIGN KEY (student_id)
+            REFERENCES students (id) ON DELETE CASCADE
+    );
+    PRINT 'student_mastery table created';
+END
+GO
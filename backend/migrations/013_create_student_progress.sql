@@ -0,0 +1,19 @@
+-- Migration: Create student_progress counters table
+-- Date: 2026-10-19
+-- Per-student Performance counters for /progress/overview; backfill with scripts/rebuild_progress_counters.py
+-- SQLite databases get rows for existing students from app/upgrade.py on startup
+
+IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'student_progress')
+BEGIN
+    CREATE TABLE student_progress (
+        student_id INT NOT NULL,
+        total_exercises INT NOT NULL DEFAULT 0,
+        correct_exercises INT NOT NULL DEFAULT 0,
+        updated_at DATETIME2 NOT NULL DEFAULT GETUTCDATE(),
+        CONSTRAINT PK_student_progress PRIMARY KEY CLUSTERED (student_id ASC),
+        CONSTRAINT FK_student_progress_students FOREIGN KEY (student_id)
+            REFERENCES students (id) ON DELETE CASCADE
+    );
+    PRINT 'student_progress table created';
+END
+GO
@@ -0,0 +1,152 @@
+"""
+Throughput of sync (threadpool) vs async (AsyncSession) handlers at high concurrency
+So sánh thông lượng handler đồng bộ (threadpool) và bất đồng bộ (AsyncSession) khi có 500+ kết nối
+
+Starts a scratch backend in a subprocess with two versions of the progress overview handler:
+    GET /sync/overview    def + Session: the old router shape, run on Starlette's 40-thread pool
+    GET /async/overview   the real app.routers.progress handler (async def + AsyncSession)
+Both can wait --wait-ms before answering, standing in for an upstream call (LLM, another DB)
+that the handler awaits. Then --concurrency clients hit each route and the script reports
+throughput and latency percentiles.
+
+Usage:
+    python backend/scripts/bench_async_db.py [--concurrency 500] [--requests 5000] [--wait-ms 50]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+
+PORT = 8391
+
+
+def serve(port: int, wait_ms: float) -> None:
+    """Scratch backend (runs in the subprocess; DATABASE_URL is already set)."""
+    import types
+    import uvicorn
+    from fastapi import Depends, FastAPI
+    from sqlalchemy import func
+    from sqlalchemy.orm import Session
+
+    from app.database import Base, SessionLocal, dispose_async_engines, engine, get_read_db
+    from app.dependencies import get_current_student
+    from app.models import DiagnosticResult, Performance, Student
+    from app.routers import progress
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add(Student(id=1, email="bench@example.com", password_hash="x"))
+        for t in range(1, 6):
+            db.add(DiagnosticResult(student_id=1, topic_id=t, total_questions=10, correct=t * 2, percent=t * 20.0))
+        for i in range(200):
+            db.add(Performance(student_id=1, topic_id=1 + i % 5, score_type="quiz", score=float(i % 11) * 10))
+        db.commit()
+
+    app = FastAPI()
+    student = types.SimpleNamespace(id=1, full_name="Bench", goal_score=8)
+    app.dependency_overrides[get_current_student] = lambda: student
+
+    @app.get("/sync/overview")
+    def sync_overview(db: Session = Depends(get_read_db)):
+        results = db.query(DiagnosticResult).filter(DiagnosticResult.student_id == 1).all()
+        total = db.query(func.count(Performance.id)).filter(Performance.student_id == 1).scalar() or 0
+        good = db.query(func.count(Performance.id)).filter(Performance.student_id == 1, Performance.score >= 70.0).scalar() or 0
+        if wait_ms:
+            time.sleep(wait_ms / 1000.0)
+        return {"results": len(results), "total": total, "good": good}
+
+    @app.get("/async/overview")
+    async def async_overview(overview=Depends(progress.progress_overview)):
+        if wait_ms:
+            await asyncio.sleep(wait_ms / 1000.0)
+        return overview
+
+    @app.on_event("shutdown")
+    async def close():
+        await dispose_async_engines()
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+
+
+def _pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * (len(values) - 1) + 0.5))] if values else 0.0
+
+
+async def _run(client: httpx.AsyncClient, path: str, total: int, concurrency: int):
+    latencies, errors = [], 0
+    remaining = [total]
+
+    async def worker():
+        nonlocal errors
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            t0 = time.perf_counter()
+            try:
+                r = await client.get(path)
+                r.raise_for_status()
+                latencies.append((time.perf_counter() - t0) * 1000)
+            except httpx.HTTPError:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - t0
+
+
+async def bench(args) -> None:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=120, limits=limits) as client:
+        for _ in range(100):
+            try:
+                await client.get("/docs")
+                break
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+        print(f"{args.concurrency} concurrent connections, {args.requests} requests per route, wait {args.wait_ms:g} ms")
+        print(f"\n{'route':<18} {'ok':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for path in ("/sync/overview", "/async/overview"):
+            await _run(client, path, min(args.concurrency, args.requests), args.concurrency)  # warm up pools
+            lat, errors, elapsed = await _run(client, path, args.requests, args.concurrency)
+            print(f"{path:<18} {len(lat):>6} {errors:>6} {len(lat) / elapsed:>8.1f} "
+                  f"{_pct(lat, .5):>8.1f} {_pct(lat, .95):>8.1f} {_pct(lat, .99):>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sync vs async DB handlers")
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=5000, help="Requests per route")
+    parser.add_argument("--wait-ms", type=float, default=50.0, help="Simulated upstream wait inside each handler")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.wait_ms)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench_async_")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(args.port), "--wait-ms", str(args.wait_ms)],
+        env=env,
+    )
+    try:
+        asyncio.run(bench(args))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Interactive LLM latency with and without concurrent batch work
+Đo độ trễ yêu cầu tương tác khi có/không có tác vụ batch chạy song song (bộ lập lịch LLM)
+
+Needs the fake LLM server (no quota used):
+    python backend/scripts/fake_llm_server.py --ttft-ms 300 --tokens-per-sec 200 &
+    LLM_FAKE_URL=http://127.0.0.1:8300 LLM_MAX_INFLIGHT=8 python backend/scripts/bench_llm_scheduler.py
+
+Phase 1 sends interactive requests alone; phase 2 sends the same stream of interactive requests
+while --batch-workers loop on batch calls. With the scheduler, interactive p99 should stay close
+to phase 1 (batch is deferred, capped to LLM_BATCH_SHARE of the slots and preempted when
+interactive requests queue).
+
+Usage:
+    python backend/scripts/bench_llm_scheduler.py [--interactive 200] [--rate 10] [--batch-workers 32]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import llm
+from app.llm.scheduler import SCHEDULER, PREEMPTIONS
+
+
+def _pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * (len(values) - 1) + 0.5))] if values else 0.0
+
+
+async def _interactive(n: int, rate: float, rng: random.Random):
+    latencies, failures = [], 0
+
+    async def one(i: int):
+        nonlocal failures
+        t0 = time.perf_counter()
+        try:
+            await llm.generate(f"Giải phương trình {i}x + {rng.randint(1, 99)} = 0", endpoint="bench.interactive")
+            latencies.append((time.perf_counter() - t0) * 1000)
+        except llm.LLMUnavailable:
+            failures += 1
+
+    tasks = []
+    for i in range(n):
+        tasks.append(asyncio.ensure_future(one(i)))
+        await asyncio.sleep(rng.expovariate(rate))  # Poisson arrivals
+    await asyncio.gather(*tasks)
+    return latencies, failures
+
+
+async def _batch_worker(stop: asyncio.Event, done: list, k: int):
+    i = 0
+    while not stop.is_set():
+        i += 1
+        try:
+            await llm.generate(f"Bổ sung lời giải cho câu hỏi {k}-{i}", endpoint="bench.batch", priority="batch", timeout=600)
+            done[0] += 1
+        except llm.LLMUnavailable:
+            pass
+
+
+async def main_async(args):
+    if not llm.available():
+        print("❌ No LLM provider configured. Start scripts/fake_llm_server.py and set LLM_FAKE_URL.")
+        sys.exit(1)
+    print(f"Scheduler: {SCHEDULER.max_inflight} slots, {SCHEDULER.batch_slots} for batch")
+    rng = random.Random(args.seed)
+
+    print(f"\n{'phase':<22} {'n':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'failed':>7} {'batch done':>11}")
+    lat, failed = await _interactive(args.interactive, args.rate, rng)
+    print(f"{'interactive only':<22} {len(lat):>5} {_pct(lat, .5):>8.0f} {_pct(lat, .95):>8.0f} {_pct(lat, .99):>8.0f} {failed:>7} {'-':>11}")
+
+    stop, done = asyncio.Event(), [0]
+    workers = [asyncio.ensure_future(_batch_worker(stop, done, k)) for k in range(args.batch_workers)]
+    await asyncio.sleep(1.0)  # let batch fill its slots
+    before = PREEMPTIONS.value()
+    lat, failed = await _interactive(args.interactive, args.rate, rng)
+    stop.set()
+    await asyncio.gather(*workers)
+    preempted = PREEMPTIONS.value() - before
+    print(f"{'with batch load':<22} {len(lat):>5} {_pct(lat, .5):>8.0f} {_pct(lat, .95):>8.0f} {_pct(lat, .99):>8.0f} {failed:>7} {done[0]:>11}")
+    print(f"\nBatch calls preempted: {preempted:g}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LLM scheduler")
+    parser.add_argument("--interactive", type=int, default=200, help="Interactive requests per phase")
+    parser.add_argument("--rate", type=float, default=10.0, help="Interactive arrivals per second")
+    parser.add_argument("--batch-workers", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+    try:
+        asyncio.run(main_async(args))
+    finally:
+        llm.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Login throughput and its effect on the rest of the API
+Đo thông lượng đăng nhập và độ trễ các API khác khi nhiều học sinh đăng nhập cùng lúc
+
+Run against a started backend:
+    uvicorn app.main:app --port 8000 &
+    python backend/scripts/bench_login.py --base-url http://127.0.0.1:8000 --concurrency 64 --logins 300
+
+Phase 1 probes a cheap authenticated endpoint (GET /students/me) alone. Phase 2 sends --logins
+password logins from --concurrency clients (a class period starting) while the same probe keeps
+running. bcrypt runs on its own bounded pool (PASSWORD_HASH_WORKERS / PASSWORD_HASH_QUEUE), so
+logins beyond the queue get fast 503s and the probe latency should stay close to phase 1.
+
+Usage:
+    python backend/scripts/bench_login.py [--concurrency 64] [--logins 300] [--probe-rate 20]
+        [--email loadtest@example.com] [--password loadtest123]
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+import httpx
+
+
+def _pct(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * (len(values) - 1) + 0.5))] if values else 0.0
+
+
+async def _login(client: httpx.AsyncClient, email: str, password: str) -> httpx.Response:
+    return await client.post("/auth/login", data={"username": email, "password": password})
+
+
+async def _token(client: httpx.AsyncClient, email: str, password: str) -> str:
+    r = await _login(client, email, password)
+    if r.status_code == 401:
+        await client.post("/auth/register", json={"email": email, "password": password, "full_name": "Load Test"})
+        r = await _login(client, email, password)
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+
+async def _probe(client: httpx.AsyncClient, token: str, rate: float, stop: asyncio.Event) -> list:
+    latencies = []
+    headers = {"Authorization": f"Bearer {token}"}
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        try:
+            await client.get("/students/me", headers=headers)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(1.0 / rate)
+    return latencies
+
+
+async def _storm(client: httpx.AsyncClient, args) -> tuple:
+    remaining = [args.logins]
+    latencies, statuses = [], {}
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            t0 = time.perf_counter()
+            try:
+                code = (await _login(client, args.email, args.password)).status_code
+            except httpx.HTTPError as e:
+                code = type(e).__name__
+            latencies.append((time.perf_counter() - t0) * 1000)
+            statuses[code] = statuses.get(code, 0) + 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return latencies, statuses, time.perf_counter() - t0
+
+
+async def main_async(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 4, max_keepalive_connections=args.concurrency + 4)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        token = await _token(client, args.email, args.password)
+
+        stop = asyncio.Event()
+        probe = asyncio.ensure_future(_probe(client, token, args.probe_rate, stop))
+        await asyncio.sleep(args.baseline_seconds)
+        stop.set()
+        baseline = await probe
+
+        stop = asyncio.Event()
+        probe = asyncio.ensure_future(_probe(client, token, args.probe_rate, stop))
+        lat, statuses, elapsed = await _storm(client, args)
+        stop.set()
+        during = await probe
+
+    ok = statuses.get(200, 0)
+    print(f"Logins: {len(lat)} in {elapsed:.1f}s, {ok / elapsed:.1f} successful/s, statuses {statuses}")
+    print(f"Login latency ms: p50 {_pct(lat, .5):.0f}  p95 {_pct(lat, .95):.0f}  p99 {_pct(lat, .99):.0f}")
+    print(f"\n{'GET /students/me':<22} {'n':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, values in (("alone", baseline), ("during login storm", during)):
+        print(f"{name:<22} {len(values):>5} {_pct(values, .5):>8.1f} {_pct(values, .95):>8.1f} "
+              f"{_pct(values, .99):>8.1f} {max(values, default=0):>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark login throughput")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=64, help="Parallel login clients")
+    parser.add_argument("--logins", type=int, default=300)
+    parser.add_argument("--probe-rate", type=float, default=20.0, help="GET /students/me per second")
+    parser.add_argument("--baseline-seconds", type=float, default=5.0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--email", default="loadtest@example.com")
+    parser.add_argument("--password", default="loadtest123")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main_async(args))
+    except httpx.HTTPError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
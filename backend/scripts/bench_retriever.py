@@ -0,0 +1,145 @@
+"""
+Benchmark lexical vs semantic (TF-IDF/LSA) retrieval: quality and latency
+So sánh chế độ truy xuất lexical và semantic về chất lượng (recall@k, MRR) và độ trễ
+
+Queries are generated from the indexed chunks themselves (a line is "relevant" to every chunk
+containing it), in three variants:
+- exact   : the line verbatim
+- folded  : the line typed without diacritics
+- partial : ~60% of the line's words, shuffled
+plus a few hand-written paraphrases checked by a keyword that must appear in the hit.
+
+Usage:
+    python backend/scripts/bench_retriever.py [--root backend/artifacts/json] [--n 200] [--top-k 4]
+    python backend/scripts/bench_retriever.py --throughput 1,2,4,8   # lexical QPS per thread/process count
+"""
+import argparse
+import os
+import multiprocessing
+import random
+import statistics
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.chat import retriever, semantic
+
+# (query, keyword expected in a relevant chunk, case-insensitive)
+PARAPHRASES = [
+    ("định lý hàm số cos", "côsin"),
+    ("định lí cosin trong tam giác", "côsin"),
+    ("tich vo huong hai vecto", "vô hướng"),
+    ("giao cua hai tap hop", "giao"),
+    ("bat phuong trinh bac nhat hai an", "bất phương trình"),
+]
+
+
+def _make_queries(docs, n, rng):
+    lines = []
+    for doc in docs:
+        if doc is None:
+            continue
+        for line in doc["text"].splitlines():
+            if len(retriever._tokenize(line)) >= 5:
+                lines.append(line.strip())
+    rng.shuffle(lines)
+    sets = {"exact": [], "folded": [], "partial": []}
+    for line in lines[:n]:
+        relevant = {d for d, doc in enumerate(docs) if doc is not None and line in doc["text"]}
+        words = line.split()
+        part = rng.sample(words, max(2, int(len(words) * 0.6)))
+        sets["exact"].append((line, relevant))
+        sets["folded"].append((semantic.fold(line), relevant))
+        sets["partial"].append((" ".join(part), relevant))
+    return sets
+
+
+def _evaluate(queries, mode, top_k, doc_number):
+    hits, rr, lat = 0, 0.0, []
+    for q, relevant in queries:
+        t0 = time.perf_counter()
+        res = retriever.retrieve(q, top_k=top_k, mode=mode)
+        lat.append((time.perf_counter() - t0) * 1000)
+        ranks = [i for i, it in enumerate(res, start=1) if doc_number[it["id"]] in relevant]
+        if ranks:
+            hits += 1
+            rr += 1.0 / ranks[0]
+    n = max(1, len(queries))
+    lat.sort()
+    return {
+        "recall": hits / n,
+        "mrr": rr / n,
+        "p50": statistics.median(lat) if lat else 0.0,
+        "p95": lat[int(0.95 * (len(lat) - 1))] if lat else 0.0,
+    }
+
+
+def _hammer(args):
+    root, queries, seconds = args
+    retriever.ensure_index(root)
+    done, deadline = 0, time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        retriever.retrieve(queries[done % len(queries)], top_k=4)
+        done += 1
+    return done
+
+
+def _throughput(root, queries, counts, seconds=2.0):
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+    print(f"\n{'workers':>7} {'threads QPS':>12} {'processes QPS':>14}")
+    for n in counts:
+        row = []
+        for pool_cls in (ThreadPoolExecutor, ProcessPoolExecutor):
+            kwargs = {"mp_context": multiprocessing.get_context("spawn")} if pool_cls is ProcessPoolExecutor else {}
+            with pool_cls(max_workers=n, **kwargs) as pool:
+                if pool_cls is ProcessPoolExecutor:
+                    list(pool.map(_hammer, [(root, queries, 0.0)] * n))  # warm up workers
+                total = sum(pool.map(_hammer, [(root, queries, seconds)] * n))
+            row.append(total / seconds)
+        print(f"{n:>7} {row[0]:>12.0f} {row[1]:>14.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval modes")
+    parser.add_argument("--root", default=None, help="Artifacts root (default: ARTIFACTS_ROOT or backend/artifacts/json)")
+    parser.add_argument("--n", type=int, default=200, help="Generated queries per variant")
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--throughput", default=None, help="Comma-separated worker counts for a lexical QPS run")
+    args = parser.parse_args()
+
+    index = retriever.ensure_index(args.root)
+    if not index.docs:
+        print("❌ No chunks indexed. Run ingest/ingest_dataset.py first.")
+        sys.exit(1)
+    if not semantic.HAVE_NUMPY:
+        print("⚠️ numpy not installed: semantic mode will fall back to lexical")
+
+    t0 = time.perf_counter()
+    retriever._dense_model(index)
+    print(f"Corpus: {retriever.index_stats()['chunks']} chunks | semantic build: {time.perf_counter() - t0:.2f}s")
+    print(f"Semantic model: {semantic.stats(index.dense)}\n")
+
+    doc_number = {doc["id"]: d for d, doc in enumerate(index.docs) if doc is not None}
+    sets = _make_queries(index.docs, args.n, random.Random(args.seed))
+    sets["paraphrase"] = [
+        (q, {d for d, doc in enumerate(index.docs) if doc is not None and kw in doc["text"].lower()})
+        for q, kw in PARAPHRASES
+    ]
+
+    print(f"{'queries':<11} {'mode':<9} {'recall@' + str(args.top_k):>9} {'MRR':>6} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, queries in sets.items():
+        for mode in retriever.RETRIEVAL_MODES:
+            r = _evaluate(queries, mode, args.top_k, doc_number)
+            print(f"{name:<11} {mode:<9} {r['recall']:>9.3f} {r['mrr']:>6.3f} {r['p50']:>8.2f} {r['p95']:>8.2f}")
+
+    if args.throughput:
+        counts = [int(x) for x in args.throughput.split(",") if x.strip()]
+        _throughput(index.root, [q for q, _ in sets["exact"]], counts)
+
+
+if __name__ == "__main__":
+    main()
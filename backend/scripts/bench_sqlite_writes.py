@@ -0,0 +1,134 @@
+"""
+SQLite write contention: bare connections vs the configured profile
+Đo khả năng ghi đồng thời vào SQLite (nộp bài quiz) với cấu hình mặc định và cấu hình WAL/pragma
+
+Each writer repeats what POST /questions/quiz/submit does: read the quiz questions, insert one
+Performance row, commit. --processes worker processes (like uvicorn --workers) each run
+--threads writers against one scratch database file, first with bare connections (rollback
+journal, synchronous=FULL, what app/database.py used to do), then with the profile from
+app/database.py (SQLITE_* settings, WAL, lock retries).
+
+Usage:
+    python backend/scripts/bench_sqlite_writes.py [--processes 4] [--threads 16] [--submissions 50]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, install_sqlite_profile, sqlite_pragmas
+from app.config import settings
+from app.models import Performance, Question, Student, Topic
+
+QUESTIONS_PER_QUIZ = 10
+
+
+def _engine(path: str, profile: str, pool_size: int):
+    engine = create_engine(
+        f"sqlite:///{path}", connect_args={"check_same_thread": False},
+        pool_size=pool_size, max_overflow=0, future=True,
+    )
+    if profile == "tuned":
+        install_sqlite_profile(engine, sqlite_pragmas(), settings.db_lock_retries)
+    else:
+        install_sqlite_profile(engine, {"journal_mode": "DELETE"})
+    return engine
+
+
+def _prepare(path: str) -> None:
+    engine = _engine(path, "bare", 1)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add(Student(id=1, email="bench@example.com", password_hash="x"))
+        db.add(Topic(id=1, name="Bench"))
+        for i in range(1, 101):
+            db.add(Question(id=i, topic_id=1, text=f"Q{i}", options_json='["a","b","c","d"]', correct_index=i % 4))
+        db.commit()
+    engine.dispose()
+
+
+def _process(args) -> tuple:
+    """One worker process: ``threads`` writers; returns (latencies ms, errors, seconds)."""
+    path, profile, threads, submissions = args
+    engine = _engine(path, profile, threads)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def writer(k: int):
+        for i in range(submissions):
+            qids = [(k * 7 + i * 3 + j) % 100 + 1 for j in range(QUESTIONS_PER_QUIZ)]
+            t0 = time.perf_counter()
+            try:
+                with Session() as db:
+                    db.query(Question).filter(Question.id.in_(qids)).all()
+                    db.add(Performance(student_id=1, topic_id=1, score_type="quiz", score=float(i % 11) * 10))
+                    db.commit()
+                with lock:
+                    latencies.append((time.perf_counter() - t0) * 1000)
+            except (OperationalError, sqlite3.OperationalError):
+                with lock:
+                    errors[0] += 1
+
+    t0 = time.perf_counter()
+    workers = [threading.Thread(target=writer, args=(k,)) for k in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+    engine.dispose()
+    return latencies, errors[0], elapsed
+
+
+def _pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * (len(values) - 1) + 0.5))] if values else 0.0
+
+
+def run(profile: str, args, workdir: str) -> None:
+    path = os.path.join(workdir, f"{profile}.db")
+    _prepare(path)
+    t0 = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.map(_process, [(path, profile, args.threads, args.submissions)] * args.processes)
+    elapsed = time.perf_counter() - t0
+    latencies = [x for r in results for x in r[0]]
+    errors = sum(r[1] for r in results)
+    print(f"{profile:<7} {len(latencies):>7} {errors:>7} {len(latencies) / elapsed:>9.1f} "
+          f"{_pct(latencies, .5):>8.1f} {_pct(latencies, .95):>8.1f} {_pct(latencies, .99):>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent SQLite writers")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=16, help="Writers per process")
+    parser.add_argument("--submissions", type=int, default=50, help="Quiz submissions per writer")
+    parser.add_argument("--profiles", default="bare,tuned")
+    args = parser.parse_args()
+
+    print(f"{args.processes * args.threads} writers x {args.submissions} submissions; tuned profile: {sqlite_pragmas()}")
+    print(f"\n{'profile':<7} {'commits':>7} {'errors':>7} {'commits/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    workdir = tempfile.mkdtemp(prefix="bench_sqlite_")
+    try:
+        for profile in [p.strip() for p in args.profiles.split(",") if p.strip()]:
+            run(profile, args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
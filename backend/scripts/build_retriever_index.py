@@ -0,0 +1,56 @@
+"""
+Build the persisted retriever index snapshot
+Tạo file chỉ mục (snapshot) cho retriever để API không phải dựng chỉ mục lúc nhận request đầu tiên
+
+Usage:
+    python backend/scripts/build_retriever_index.py [--root backend/artifacts/json] [--out PATH]
+    python backend/scripts/build_retriever_index.py --check
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.chat import retriever, index_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build/check the retriever index snapshot")
+    parser.add_argument("--root", default=None, help="Artifacts root (default: ARTIFACTS_ROOT or backend/artifacts/json)")
+    parser.add_argument("--out", default=None, help="Snapshot path (default: RETRIEVER_SNAPSHOT or backend/artifacts/retriever_index.snap)")
+    parser.add_argument("--check", action="store_true", help="Only verify checksum and freshness; exit 1 if rebuild is needed")
+    args = parser.parse_args()
+
+    path = os.path.abspath(args.out or index_snapshot.default_snapshot_path())
+    root = os.path.abspath(args.root or retriever._default_artifacts_root())
+
+    if args.check:
+        snap = index_snapshot.read_snapshot(path)
+        if snap is None:
+            print(f"❌ Snapshot missing, corrupt or from another format version: {path}")
+            sys.exit(1)
+        if snap["root"] != root:
+            print(f"⚠️ Snapshot was built for another root: {snap['root']}")
+            sys.exit(1)
+        changed, removed, _ = retriever._diff_sources(snap["files"], root)
+        if changed or removed:
+            print(f"⚠️ Snapshot is stale for {root}: {len(changed)} changed/new, {len(removed)} removed files")
+            sys.exit(1)
+        chunks = sum(1 for doc in snap["docs"] if doc is not None)
+        print(f"✅ Snapshot is current: {chunks} chunks, {len(snap['postings'])} terms")
+        return
+
+    started = time.perf_counter()
+    retriever.save_snapshot(path, root)
+    elapsed = time.perf_counter() - started
+    snap = index_snapshot.read_snapshot(path)
+    print(f"✅ Wrote {path}")
+    print(f"  Chunks: {sum(1 for doc in snap['docs'] if doc is not None)}  Terms: {len(snap['postings'])}  Size: {os.path.getsize(path)} bytes")
+    print(f"  Build time: {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Local stand-in for the Gemini and OpenAI APIs, for offline load testing of the AI endpoints
+Server giả lập Gemini/OpenAI để load test các endpoint AI khi không có mạng / không tốn quota
+
+Implements the subset the LLM gateway uses:
+- Gemini REST  : POST /v1beta/models/{model}:generateContent and :streamGenerateContent
+- OpenAI       : POST /v1/chat/completions (stream=true sends SSE chunks and a final usage chunk)
+
+Latency model: time to first token is lognormal (median --ttft-ms, spread --ttft-sigma), then
+text is produced at --tokens-per-sec (one "token" = one word here). A non-streaming call waits
+for the whole answer before replying, like the real APIs.
+
+Answers: with --replay, prompts recorded by the app (LLM_RECORD_PATH=...jsonl) get their recorded
+text back; unknown prompts, or runs without --replay, get canned answers shaped for the caller
+(JSON exercises for the generator, JSON insights for /analysis/insights, a step-by-step
+explanation otherwise).
+
+Usage:
+    python backend/scripts/fake_llm_server.py [--port 8300] [--ttft-ms 800] [--tokens-per-sec 40]
+        [--error-rate 0.02] [--error-status 503] [--replay backend/llm_recordings.jsonl]
+    # then start the backend against it:
+    LLM_FAKE_URL=http://127.0.0.1:8300 uvicorn app.main:app
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHUNK_WORDS = 4
+
+EXPLAIN_STEPS = [
+    "Bước 1: Đọc kỹ đề bài, xác định dữ kiện đã cho và đại lượng cần tìm.",
+    "Bước 2: Chọn công thức hoặc định lý phù hợp với chủ đề của bài toán.",
+    "Bước 3: Thay số và biến đổi từng bước, kiểm tra điều kiện xác định.",
+    "Bước 4: Tính toán cẩn thận, rút gọn kết quả cuối cùng.",
+    "Bước 5: Kết luận đáp án và đối chiếu lại với yêu cầu của đề.",
+]
+
+
+class Config:
+    def __init__(self, args):
+        self.ttft = args.ttft_ms / 1000.0
+        self.sigma = args.ttft_sigma
+        self.tps = args.tokens_per_sec
+        self.answer_words = args.answer_words
+        self.error_rate = args.error_rate
+        self.error_status = args.error_status
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.replay = _load_replay(args.replay) if args.replay else {}
+        self.stats = {"requests": 0, "errors": 0, "replayed": 0}
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.stats[key] += 1
+
+    def draw_ttft(self) -> float:
+        with self.lock:
+            return self.ttft * math.exp(self.rng.gauss(0.0, self.sigma)) if self.sigma > 0 else self.ttft
+
+    def draw_error(self) -> bool:
+        with self.lock:
+            return self.rng.random() < self.error_rate
+
+
+def _replay_key(system, prompt) -> str:
+    return (system or "").strip() + "\x00" + re.sub(r"\s+", " ", prompt or "").strip()
+
+
+def _load_replay(path: str):
+    table = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            table[_replay_key(rec.get("system"), rec.get("prompt"))] = rec["text"]
+    print(f"Loaded {len(table)} recorded answers from {path}")
+    return table
+
+
+def _canned_answer(cfg: Config, prompt: str) -> str:
+    if "JSON THUẦN" in prompt:  # exercise generator
+        m = re.search(r"Số lượng:\s*(\d+)", prompt)
+        n = int(m.group(1)) if m else 5
+        items = [
+            {
+                "question": f"Câu {i + 1}: Cho tam giác ABC có AB = {3 + i}, AC = {4 + i}, góc A = 60°. Tính BC.",
+                "type": "mcq",
+                "difficulty": 3,
+                "options": ["A. 5", "B. 6", "C. 7", "D. 8"],
+                "correct_index": 0,
+                "solution": "Áp dụng định lý côsin: BC² = AB² + AC² - 2·AB·AC·cos A.",
+            }
+            for i in range(n)
+        ]
+        return "```json\n" + json.dumps(items, ensure_ascii=False, indent=2) + "\n```"
+    if "Format as JSON" in prompt:  # analysis insights
+        return "```json\n" + json.dumps({
+            "overall_assessment": "Bạn đã nắm khá vững phần lớn kiến thức; cần củng cố một vài chủ đề yếu.",
+            "priority_reasoning": "Các chủ đề ưu tiên có điểm thành thạo thấp và trọng số cao trong đề thi.",
+            "recommendations": ["Ôn lại lý thuyết chủ đề yếu", "Luyện 10 bài mỗi ngày", "Làm đề tổng hợp cuối tuần"],
+            "encouragement": "Cố gắng đều đặn mỗi ngày, bạn sẽ tiến bộ nhanh!",
+            "estimated_weeks": 4,
+        }, ensure_ascii=False, indent=2) + "\n```"
+    words = []
+    while len(words) < cfg.answer_words:
+        for step in EXPLAIN_STEPS:
+            words.extend(step.split())
+    return " ".join(words[:cfg.answer_words])
+
+
+def _answer(cfg: Config, system, prompt: str) -> str:
+    text = cfg.replay.get(_replay_key(system, prompt))
+    if text is not None:
+        cfg.count("replayed")
+        return text
+    return _canned_answer(cfg, prompt)
+
+
+def _chunks(text: str):
+    # Split on word boundaries but keep the original spacing, so joined chunks == text
+    parts = re.findall(r"\S+\s*|\s+", text)
+    for i in range(0, len(parts), CHUNK_WORDS):
+        yield "".join(parts[i:i + CHUNK_WORDS])
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text.split()))
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+    cfg: Config = None  # set in main()
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send_json(self, status: int, payload) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_chunked(self, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data: str) -> None:
+        raw = data.encode("utf-8")
+        self.wfile.write(f"{len(raw):x}\r\n".encode() + raw + b"\r\n")
+        self.wfile.flush()
+
+    def _end_chunked(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        cfg = self.cfg
+        cfg.count("requests")
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        path = self.path.split("?", 1)[0]
+
+        if path == "/v1/chat/completions":
+            messages = body.get("messages") or []
+            system = next((m["content"] for m in messages if m.get("role") == "system"), None)
+            prompt = "\n".join(m["content"] for m in messages if m.get("role") == "user")
+            handler = self._openai
+        else:
+            m = re.fullmatch(r"/v1beta/models/([^:/]+):(generateContent|streamGenerateContent)", path)
+            if not m:
+                self._send_json(404, {"error": {"message": f"unknown path {path}"}})
+                return
+            system = " ".join(p.get("text", "") for p in (body.get("systemInstruction") or {}).get("parts", [])) or None
+            prompt = "\n".join(p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", []))
+            body["stream"] = m.group(2) == "streamGenerateContent"
+            body["model"] = m.group(1)
+            handler = self._gemini
+
+        time.sleep(cfg.draw_ttft())
+        if cfg.draw_error():
+            cfg.count("errors")
+            self._send_json(cfg.error_status, {"error": {"code": cfg.error_status, "message": "injected error", "status": "UNAVAILABLE"}})
+            return
+        text = _answer(cfg, system, prompt)
+        handler(body, prompt, text)
+
+    def _pace(self, chunk: str) -> None:
+        if self.cfg.tps > 0:
+            time.sleep(_tokens(chunk) / self.cfg.tps)
+
+    # ---- OpenAI chat completions ----
+
+    def _openai(self, body, prompt: str, text: str) -> None:
+        usage = {"prompt_tokens": _tokens(prompt), "completion_tokens": _tokens(text), "total_tokens": _tokens(prompt) + _tokens(text)}
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model", "fake")}
+        if not body.get("stream"):
+            for chunk in _chunks(text):
+                self._pace(chunk)
+            self._send_json(200, {
+                **base, "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+        self._start_chunked("text/event-stream")
+        for chunk in _chunks(text):
+            self._pace(chunk)
+            ev = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}]}
+            self._write_chunk(f"data: {json.dumps(ev, ensure_ascii=False)}\n\n")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self._write_chunk(f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self._end_chunked()
+
+    # ---- Gemini generateContent ----
+
+    @staticmethod
+    def _gemini_response(text: str, prompt: str, output_text: str, finished: bool):
+        cand = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+        if finished:
+            cand["finishReason"] = "STOP"
+        return {
+            "candidates": [cand],
+            "usageMetadata": {"promptTokenCount": _tokens(prompt), "candidatesTokenCount": _tokens(output_text)},
+        }
+
+    def _gemini(self, body, prompt: str, text: str) -> None:
+        if not body.get("stream"):
+            for chunk in _chunks(text):
+                self._pace(chunk)
+            self._send_json(200, self._gemini_response(text, prompt, text, True))
+            return
+        # REST streaming without alt=sse is one JSON array written element by element
+        self._start_chunked("application/json")
+        chunks = list(_chunks(text)) or [""]
+        sent = ""
+        for i, chunk in enumerate(chunks):
+            self._pace(chunk)
+            sent += chunk
+            last = i == len(chunks) - 1
+            payload = json.dumps(self._gemini_response(chunk, prompt, sent, last), ensure_ascii=False)
+            self._write_chunk(("[" if i == 0 else ",\r\n") + payload + ("]" if last else ""))
+        self._end_chunked()
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, self.cfg.stats)
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Gemini/OpenAI server for offline load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8300)
+    parser.add_argument("--ttft-ms", type=float, default=800.0, help="Median time to first token")
+    parser.add_argument("--ttft-sigma", type=float, default=0.5, help="Lognormal spread of the time to first token (0 = fixed)")
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0, help="Output speed after the first token (0 = instant)")
+    parser.add_argument("--answer-words", type=int, default=150, help="Length of the canned explanation")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--replay", default=None, help="JSONL recorded with LLM_RECORD_PATH")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    Handler.cfg = Config(args)
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print(f"Fake LLM server on http://{args.host}:{args.port} "
+          f"(ttft median {args.ttft_ms:.0f} ms, {args.tokens_per_sec:g} tok/s, error rate {args.error_rate:g})")
+    print(f"Start the backend with LLM_FAKE_URL=http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Stats: {Handler.cfg.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Load test the AI endpoints against a running backend
+Kiểm thử tải các endpoint AI (dùng cùng scripts/fake_llm_server.py để không tốn quota)
+
+Typical offline run:
+    python backend/scripts/fake_llm_server.py --ttft-ms 800 --tokens-per-sec 40 &
+    # one student sends everything, so lift the per-student quotas (app/ratelimit.py) for the run
+    LLM_FAKE_URL=http://127.0.0.1:8300 RATE_LIMIT_ENABLED=0 uvicorn app.main:app --port 8000 &
+    python backend/scripts/load_test_llm.py --base-url http://127.0.0.1:8000 --concurrency 16 --requests 200
+
+Registers (or logs in) a load-test student, then drives each endpoint with --concurrency parallel
+clients and reports throughput and latency percentiles. Problems are drawn from a small pool with
+--repeat-ratio duplicates, so the answer cache and request coalescing see realistic traffic.
+The LLM-side view (upstream latency, fallbacks) is read from the backend's GET /metrics.
+
+Usage:
+    python backend/scripts/load_test_llm.py [--endpoints explain,chat,generate,insights] [--concurrency 8]
+        [--requests 100] [--repeat-ratio 0.3] [--email loadtest@example.com] [--password loadtest123]
+"""
+import argparse
+import asyncio
+import random
+import re
+import statistics
+import sys
+import time
+
+import httpx
+
+PROBLEMS = [
+    "Giải phương trình {a}x + {b} = {c}",
+    "Tìm tập nghiệm của bất phương trình {a}x - {b} > {c}",
+    "Cho tam giác ABC có AB = {a}, AC = {b}, góc A = 60°. Tính BC",
+    "Tính tích vô hướng của hai vectơ u = ({a}; {b}) và v = ({c}; 1)",
+    "Cho tập A = {{1; {a}; {b}}} và B = {{{b}; {c}}}. Tìm A ∩ B",
+]
+TOPICS = ["Hệ thức lượng trong tam giác", "Tích vô hướng", "Bất phương trình bậc nhất hai ẩn", "Mệnh đề"]
+
+
+def _problem(rng: random.Random, repeat_ratio: float, seen: list) -> str:
+    if seen and rng.random() < repeat_ratio:
+        return rng.choice(seen)
+    p = rng.choice(PROBLEMS).format(a=rng.randint(2, 9), b=rng.randint(1, 20), c=rng.randint(1, 30))
+    seen.append(p)
+    return p
+
+
+def _request_factory(name: str, rng: random.Random, repeat_ratio: float):
+    seen: list = []
+    if name == "explain":
+        return lambda: ("POST", "/assistant/explain", {"problem": _problem(rng, repeat_ratio, seen)})
+    if name == "chat":
+        return lambda: ("POST", "/chat/explain", {"problem": _problem(rng, repeat_ratio, seen), "top_k": 4})
+    if name == "generate":
+        # Topics without artifacts force the LLM path; n kept small like the UI
+        return lambda: ("POST", "/ai/generate-exercises", {"topic": rng.choice(TOPICS) + " (tổng hợp)", "n": 3, "format": "mcq"})
+    if name == "insights":
+        return lambda: ("GET", "/analysis/insights", None)
+    raise SystemExit(f"unknown endpoint {name}")
+
+
+async def _login(client: httpx.AsyncClient, email: str, password: str) -> str:
+    r = await client.post("/auth/login", data={"username": email, "password": password})
+    if r.status_code == 401:
+        await client.post("/auth/register", json={"email": email, "password": password, "full_name": "Load Test"})
+        r = await client.post("/auth/login", data={"username": email, "password": password})
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+
+async def _scrape(client: httpx.AsyncClient) -> dict:
+    """Sum of each llm_* sample in /metrics, keyed by metric name + labels."""
+    try:
+        r = await client.get("/metrics")
+    except httpx.HTTPError:
+        return {}
+    out = {}
+    for line in r.text.splitlines():
+        m = re.match(r"^(llm_\w+?)(\{[^}]*\})? ([0-9.e+-]+)$", line)
+        if m and not m.group(1).endswith("_bucket"):
+            out[m.group(1) + (m.group(2) or "")] = float(m.group(3))
+    return out
+
+
+async def _run(client: httpx.AsyncClient, make, total: int, concurrency: int):
+    latencies, statuses = [], {}
+    remaining = [total]
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            method, path, body = make()
+            t0 = time.perf_counter()
+            try:
+                r = await client.request(method, path, json=body)
+                code = r.status_code
+            except httpx.HTTPError as e:
+                code = type(e).__name__
+            latencies.append(time.perf_counter() - t0)
+            statuses[code] = statuses.get(code, 0) + 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - t0
+
+
+def _pct(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * (len(values) - 1) + 0.5))] if values else 0.0
+
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        token = await _login(client, args.email, args.password)
+        client.headers["Authorization"] = f"Bearer {token}"
+        before = await _scrape(client)
+
+        print(f"{'endpoint':<10} {'req':>5} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}  status")
+        for name in [e.strip() for e in args.endpoints.split(",") if e.strip()]:
+            make = _request_factory(name, rng, args.repeat_ratio)
+            lat, statuses, elapsed = await _run(client, make, args.requests, args.concurrency)
+            ms = [x * 1000 for x in lat]
+            print(f"{name:<10} {len(lat):>5} {len(lat) / elapsed:>7.1f} {statistics.median(ms):>8.0f} "
+                  f"{_pct(ms, 0.95):>8.0f} {_pct(ms, 0.99):>8.0f} {max(ms):>8.0f}  {statuses}")
+
+        after = await _scrape(client)
+        if after:
+            print("\nLLM metrics during the run:")
+            for key in sorted(after):
+                delta = after[key] - before.get(key, 0.0)
+                if delta and (key.startswith(("llm_fallbacks_total", "llm_flights_total", "llm_answer_cache_requests_total"))
+                              or "_count{" in key):
+                    print(f"  {key} +{delta:g}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test AI endpoints")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoints", default="explain,chat,generate,insights")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint")
+    parser.add_argument("--repeat-ratio", type=float, default=0.3, help="Share of problems repeated from earlier requests")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--email", default="loadtest@example.com")
+    parser.add_argument("--password", default="loadtest123")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    try:
+        asyncio.run(main_async(args))
+    except httpx.HTTPError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Rebuild the per-student progress counters (student_progress) from the performances table
+Tính lại bộ đếm tiến độ của học sinh (student_progress) từ bảng performances
+
+The counters are bumped on every ORM Performance insert. Run this after deploying them
+(backfill), after rows were written around the ORM (bulk imports, manual SQL), or to check them:
+    python backend/scripts/rebuild_progress_counters.py --check      # report drift, exit 1 if any
+    python backend/scripts/rebuild_progress_counters.py              # rebuild every student
+    python backend/scripts/rebuild_progress_counters.py --student-id 42
+
+Usage:
+    python backend/scripts/rebuild_progress_counters.py [--student-id ID] [--check]
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import case, delete, func, insert, literal, select
+
+from app.database import Base, SessionLocal, engine
+from app.models import PASSING_SCORE, Performance, Student, StudentProgress
+
+
+def _counts(student_id=None):
+    # Every student, with zeros for those without performances, so none is left without a row
+    stmt = select(
+        Student.id.label("student_id"),
+        func.count(Performance.id).label("total"),
+        func.coalesce(func.sum(case((Performance.score >= PASSING_SCORE, 1), else_=0)), 0).label("correct"),
+    ).outerjoin(Performance, Performance.student_id == Student.id).group_by(Student.id)
+    if student_id is not None:
+        stmt = stmt.where(Student.id == student_id)
+    return stmt
+
+
+def check(db, student_id=None) -> int:
+    """Print students whose counters differ from the table; returns how many."""
+    actual = {sid: (total, correct) for sid, total, correct in db.execute(_counts(student_id))}
+    stmt = select(StudentProgress.student_id, StudentProgress.total_exercises, StudentProgress.correct_exercises)
+    if student_id is not None:
+        stmt = stmt.where(StudentProgress.student_id == student_id)
+    stored = {sid: (total, correct) for sid, total, correct in db.execute(stmt)}
+    drift = 0
+    for sid in sorted(set(actual) | set(stored)):
+        want, have = actual.get(sid, (0, 0)), stored.get(sid)
+        if have is None:
+            print(f"  student {sid}: no counters row (table has {want[0]} total, {want[1]} correct)")
+            drift += 1
+        elif have != want:
+            print(f"  student {sid}: counters {have[0]} total, {have[1]} correct; table {want[0]}, {want[1]}")
+            drift += 1
+    return drift
+
+
+def rebuild(db, student_id=None) -> int:
+    """Replace the counters with fresh counts in one transaction; returns rows written."""
+    clear = delete(StudentProgress)
+    if student_id is not None:
+        clear = clear.where(StudentProgress.student_id == student_id)
+    db.execute(clear)
+    counts = _counts(student_id).subquery()
+    written = db.execute(
+        insert(StudentProgress).from_select(
+            ["student_id", "total_exercises", "correct_exercises", "updated_at"],
+            select(counts.c.student_id, counts.c.total, counts.c.correct, literal(datetime.utcnow())),
+        )
+    ).rowcount
+    db.commit()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild student_progress counters")
+    parser.add_argument("--student-id", type=int, default=None, help="Only this student (default: all)")
+    parser.add_argument("--check", action="store_true", help="Report drift without writing")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine, tables=[StudentProgress.__table__])
+    db = SessionLocal()
+    try:
+        if args.check:
+            drift = check(db, args.student_id)
+            if drift:
+                print(f"❌ {drift} student(s) with stale counters; run without --check to rebuild")
+                sys.exit(1)
+            print("✅ Counters match the performances table")
+            return
+        written = rebuild(db, args.student_id)
+        print(f"✅ Rebuilt counters for {written} student(s)")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
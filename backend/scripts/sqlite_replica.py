@@ -0,0 +1,87 @@
+"""
+Keep a local read replica of the SQLite database with the online backup API
+Tạo/cập nhật bản sao chỉ-đọc của cơ sở dữ liệu SQLite (dùng cho READ_DATABASE_URL)
+
+The backup copies a consistent snapshot while the app keeps writing. Point the read-only routes
+at the copy:
+    python backend/scripts/sqlite_replica.py --dest backend/ai_coach_replica.db --interval 5 &
+    READ_DATABASE_URL=sqlite:///backend/ai_coach_replica.db uvicorn app.main:app
+
+Reads through get_read_db then lag the primary by up to --interval seconds plus the copy time.
+Without --interval the copy is made once.
+
+Usage:
+    python backend/scripts/sqlite_replica.py [--source PATH] [--dest PATH] [--interval SECONDS] [--pages 1024]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy.engine import make_url
+
+from app.config import settings
+
+
+def _default_source() -> str:
+    url = make_url(settings.database_url)
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+        print(f"❌ DATABASE_URL is not a SQLite file: {settings.database_url}")
+        sys.exit(1)
+    return url.database
+
+
+def _busy_seconds() -> float:
+    try:
+        return max(1.0, float(settings.sqlite_busy_timeout_ms) / 1000.0)
+    except ValueError:
+        return 5.0
+
+
+def copy_once(source: str, dest: str, pages: int) -> float:
+    """Back up ``source`` into ``dest`` in steps of ``pages`` pages; returns seconds taken.
+
+    Copying in steps lets the app's writers in between steps; a step that races a write
+    restarts the copy, so the result is always one consistent snapshot.
+    """
+    t0 = time.perf_counter()
+    src = sqlite3.connect(source, timeout=_busy_seconds())
+    dst = sqlite3.connect(dest, timeout=_busy_seconds())
+    try:
+        src.backup(dst, pages=pages, sleep=0.01)
+    finally:
+        dst.close()
+        src.close()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh a local SQLite read replica")
+    parser.add_argument("--source", default=None, help="Primary database file (default: from DATABASE_URL)")
+    parser.add_argument("--dest", default=os.path.join(os.path.dirname(__file__), "..", "ai_coach_replica.db"))
+    parser.add_argument("--interval", type=float, default=0.0, help="Refresh every N seconds (0 = once)")
+    parser.add_argument("--pages", type=int, default=1024, help="Pages copied per backup step")
+    args = parser.parse_args()
+
+    source = args.source or _default_source()
+    if not os.path.exists(source):
+        print(f"❌ Source database not found: {source}")
+        sys.exit(1)
+    dest = os.path.abspath(args.dest)
+
+    while True:
+        seconds = copy_once(source, dest, args.pages)
+        size_mb = os.path.getsize(dest) / 1e6
+        print(f"✅ {time.strftime('%H:%M:%S')} replica {dest} refreshed ({size_mb:.1f} MB, {seconds * 1000:.0f} ms)")
+        if args.interval <= 0:
+            break
+        time.sleep(args.interval)
+    print(f"💡 READ_DATABASE_URL=sqlite:///{dest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Check the per-student progress counters (student_progress) against the performances table
+Kiểm tra bộ đếm tiến độ (student_progress) so với số liệu thật trong bảng performances
+
+Runs against a scratch SQLite database and covers the ways Performance rows are written:
+one row per flush, several rows for one student in one flush (with and without an existing
+counters row), several students in one flush, rows written before the counters existed, a
+rolled-back flush, and the async session used by POST /questions/quiz/submit.
+Exits 1 if any case disagrees with COUNT(*) over performances.
+
+Usage:
+    python backend/scripts/test_progress_counters.py
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import Performance, Student, StudentProgress, performance_counts
+
+failures = 0
+
+
+def _perf(student_id: int, score: float) -> Performance:
+    return Performance(student_id=student_id, topic_id=1, score_type="quiz", score=score)
+
+
+def expect(db, student_id: int, case: str) -> None:
+    global failures
+    db.expire_all()
+    row = db.get(StudentProgress, student_id)
+    stored = (row.total_exercises, row.correct_exercises) if row is not None else None
+    actual = tuple(db.execute(performance_counts(student_id)).one())
+    ok = stored == actual
+    failures += not ok
+    print(f"{'✅' if ok else '❌'} {case:<58} counters {stored}  table {actual}")
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="progress_counters_")
+    path = os.path.join(workdir, "counters.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Session = sessionmaker(bind=engine, autoflush=False)
+    try:
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO topics (id, name, difficulty, is_core, order_index) VALUES (1, 'T', 3, 1, 1)"))
+            # Students 2 and 3 are created around the ORM: no counters row
+            conn.execute(insert(Student.__table__), [
+                {"id": 2, "email": "raw2@example.com", "password_hash": "x"},
+                {"id": 3, "email": "raw3@example.com", "password_hash": "x"},
+            ])
+            # Student 3 has history from before the counters existed
+            conn.execute(insert(Performance.__table__), [
+                {"student_id": 3, "topic_id": 1, "score_type": "quiz", "score": s} for s in (90.0, 10.0)
+            ])
+
+        with Session() as db:
+            db.add(Student(id=1, email="orm@example.com", password_hash="x"))
+            db.commit()
+            expect(db, 1, "ORM-created student starts at zero")
+
+            db.add(_perf(1, 80.0))
+            db.commit()
+            expect(db, 1, "one row per flush")
+
+            db.add_all([_perf(2, 80.0), _perf(2, 80.0), _perf(2, 80.0)])
+            db.commit()
+            expect(db, 2, "three rows in one flush, no counters row yet")
+
+            db.add_all([_perf(3, 75.0), _perf(3, 40.0), _perf(3, 70.0)])
+            db.commit()
+            expect(db, 3, "three rows in one flush, older rows, no counters row")
+
+            db.add_all([_perf(1, 100.0), _perf(2, 0.0), _perf(1, 69.9), _perf(2, 70.0)])
+            db.commit()
+            expect(db, 1, "two students in one flush (student 1)")
+            expect(db, 2, "two students in one flush (student 2)")
+
+            db.add_all([_perf(1, 100.0), _perf(1, 100.0)])
+            db.flush()
+            db.rollback()
+            expect(db, 1, "rolled-back flush")
+
+        async def async_flush():
+            async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+            try:
+                async with async_sessionmaker(bind=async_engine, autoflush=False)() as adb:
+                    adb.add_all([_perf(2, 95.0), _perf(2, 5.0)])
+                    await adb.commit()
+            finally:
+                await async_engine.dispose()
+
+        asyncio.run(async_flush())
+        with Session() as db:
+            expect(db, 2, "two rows in one AsyncSession flush")
+    finally:
+        engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print()
+    if failures:
+        print(f"❌ {failures} case(s) with wrong counters")
+        sys.exit(1)
+    print("✅ Counters match the performances table in every case")
+
+
+if __name__ == "__main__":
+    main()
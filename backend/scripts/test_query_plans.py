@@ -0,0 +1,214 @@
+"""
+Query-plan regression check for the per-student hot queries
+Kiểm tra kế hoạch truy vấn (EXPLAIN QUERY PLAN) của các truy vấn theo học sinh trên CSDL lớn
+
+Builds a scratch SQLite database from app.models (so it has exactly the indexes the models
+declare), fills it with --students synthetic students and their performances, schedules,
+placement tests, diagnostics and learning path, runs ANALYZE, then asks SQLite for the plan
+of each query the student endpoints run. A query fails the check if its plan scans a table
+or sorts in a temp B-tree instead of seeking through an index; the script exits 1 then.
+
+Per-student endpoints should stay O(log n) as tables grow, so run it at realistic sizes:
+    python backend/scripts/test_query_plans.py --students 20000 --rows 50   # 1M performances
+
+Usage:
+    python backend/scripts/test_query_plans.py [--students 2000] [--rows 50] [--repeat 200] [--keep PATH]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.engine import Engine
+
+from app.database import Base
+from app.models import (
+    Availability,
+    DiagnosticResult,
+    LearningPathItem,
+    Performance,
+    PlacementTestResult,
+    Schedule,
+    StudentProgress,
+    performance_counts,
+)
+
+TOPICS = 10
+
+
+def hot_queries(student_id: int) -> dict:
+    """The statements the student endpoints run, keyed by route.
+
+    performance_counts is the model's own builder; the routers build the others inline, so
+    these are copies of them and have to follow when a router's query changes.
+    """
+    today = date.today()
+    return {
+        "GET /progress/overview": select(StudentProgress).where(StudentProgress.student_id == student_id),
+        "GET /progress/overview (no counters row)": performance_counts(student_id),
+        "GET /admin/students/{id}/exercises": select(Performance)
+            .where(Performance.student_id == student_id)
+            .order_by(Performance.taken_at.desc())
+            .offset(0).limit(20),
+        "GET /admin/students/{id}/exercises (total)": select(func.count(Performance.id))
+            .where(Performance.student_id == student_id),
+        "GET /admin/students/{id}/exercises (correct)": select(func.count(Performance.id))
+            .where(Performance.student_id == student_id, Performance.score >= 70.0),
+        "GET /sessions/today": select(Schedule)
+            .where(Schedule.student_id == student_id, Schedule.date == today)
+            .order_by(Schedule.start_time.asc()),
+        "GET /ai/placement-test/status": select(PlacementTestResult)
+            .where(PlacementTestResult.student_id == student_id)
+            .order_by(PlacementTestResult.taken_at.desc())
+            .limit(1),
+        "GET /diagnostic/results": select(DiagnosticResult)
+            .where(DiagnosticResult.student_id == student_id)
+            .order_by(DiagnosticResult.created_at.desc()),
+        "GET /learning-path": select(LearningPathItem)
+            .where(LearningPathItem.student_id == student_id)
+            .order_by(LearningPathItem.priority_rank.asc()),
+        "GET /students/me/availability": select(Availability).where(Availability.student_id == student_id),
+    }
+
+
+def populate(engine: Engine, students: int, rows: int) -> None:
+    """Bulk-fill the scratch database (raw executemany; the ORM would take minutes)."""
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1)
+    today = date.today()
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.executemany(
+            "INSERT INTO topics (id, name, difficulty, is_core, order_index) VALUES (?, ?, 3, 1, ?)",
+            [(t, f"Topic {t}", t) for t in range(1, TOPICS + 1)],
+        )
+        cur.executemany(
+            "INSERT INTO students (id, email, password_hash, created_at) VALUES (?, ?, 'x', ?)",
+            [(s, f"s{s}@example.com", start.isoformat(" ")) for s in range(1, students + 1)],
+        )
+        for first in range(1, students + 1, 1000):
+            batch = range(first, min(students, first + 999) + 1)
+            cur.executemany(
+                "INSERT INTO performances (student_id, topic_id, score_type, score, taken_at) VALUES (?, ?, 'quiz', ?, ?)",
+                [
+                    (s, rng.randint(1, TOPICS), float(rng.randint(0, 100)),
+                     (start + timedelta(minutes=rng.randint(0, 400000))).isoformat(" "))
+                    for s in batch for _ in range(rows)
+                ],
+            )
+            cur.executemany(
+                "INSERT INTO schedules (student_id, date, start_time, end_time, topic_id, status) "
+                "VALUES (?, ?, ?, ?, ?, 'planned')",
+                [
+                    (s, (today + timedelta(days=d - 14)).isoformat(), f"{8 + k * 2:02d}:00:00.000000",
+                     f"{9 + k * 2:02d}:00:00.000000", rng.randint(1, TOPICS))
+                    for s in batch for d in range(28) for k in range(2)
+                ],
+            )
+            cur.executemany(
+                "INSERT INTO placement_test_results (student_id, test_id, total_questions, correct_count, score, "
+                "level, level_name, taken_at) VALUES (?, ?, 20, ?, ?, 'intermediate', 'Trung bình', ?)",
+                [
+                    (s, f"pt-{s}-{k}", c, c * 5.0, (start + timedelta(days=k * 30)).isoformat(" "))
+                    for s in batch for k in range(3) for c in (rng.randint(0, 20),)
+                ],
+            )
+            cur.executemany(
+                "INSERT INTO diagnostic_results (student_id, topic_id, total_questions, correct, percent, created_at) "
+                "VALUES (?, ?, 10, ?, ?, ?)",
+                [(s, t, c, c * 10.0, start.isoformat(" ")) for s in batch for t in range(1, TOPICS + 1)
+                 for c in (rng.randint(0, 10),)],
+            )
+            cur.executemany(
+                "INSERT INTO learning_path_items (student_id, topic_id, phase, priority_rank) VALUES (?, ?, 'focus', ?)",
+                [(s, t, t) for s in batch for t in range(1, TOPICS + 1)],
+            )
+            cur.executemany(
+                "INSERT INTO availability (student_id, weekday, start_time, end_time) VALUES (?, ?, '18:00:00.000000', '20:00:00.000000')",
+                [(s, w) for s in batch for w in range(5)],
+            )
+        raw.commit()
+        cur.execute("ANALYZE")
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def explain(engine: Engine, stmt) -> tuple:
+    """Returns (plan detail lines, compiled SQL, positional params)."""
+    compiled = stmt.compile(dialect=engine.dialect)
+    params = tuple(compiled.params[k] for k in compiled.positiontup)
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+    return [r[-1] for r in rows], str(compiled), params
+
+
+def bad_steps(plan: list) -> list:
+    return [
+        step for step in plan
+        if (step.startswith("SCAN") and "CONSTANT ROW" not in step) or "TEMP B-TREE" in step
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check query plans of per-student queries")
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=50, help="Performances per student")
+    parser.add_argument("--repeat", type=int, default=200, help="Timed runs per query")
+    parser.add_argument("--keep", default=None, help="Keep the synthetic database at this path")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="query_plans_")
+    path = args.keep or os.path.join(workdir, "plans.db")
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        Base.metadata.create_all(bind=engine)
+        t0 = time.perf_counter()
+        populate(engine, args.students, args.rows)
+        print(f"📦 {args.students} students, {args.students * args.rows} performances "
+              f"({time.perf_counter() - t0:.1f}s to build)\n")
+
+        failures = 0
+        rng = random.Random(7)
+        for name, stmt in hot_queries(args.students // 2).items():
+            plan, sql, params = explain(engine, stmt)
+            bad = bad_steps(plan)
+            failures += bool(bad)
+
+            compiled = stmt.compile(dialect=engine.dialect)
+            with engine.connect() as conn:
+                t0 = time.perf_counter()
+                for _ in range(args.repeat):
+                    sid = rng.randint(1, args.students)
+                    values = tuple(sid if k.startswith("student_id") else compiled.params[k] for k in compiled.positiontup)
+                    conn.exec_driver_sql(str(compiled), values).all()
+                avg_ms = (time.perf_counter() - t0) * 1000 / args.repeat
+
+            print(f"{'❌' if bad else '✅'} {name:<46} {avg_ms:7.3f} ms")
+            for step in plan:
+                print(f"      {step}")
+            if bad:
+                print(f"      SQL: {sql}")
+        print()
+        if failures:
+            print(f"❌ {failures} quer{'y' if failures == 1 else 'ies'} scan or sort; see migrations/010_add_student_composite_indexes.sql")
+            sys.exit(1)
+        print("✅ All per-student queries seek through an index")
+    finally:
+        engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()